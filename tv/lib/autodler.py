@@ -39,10 +39,23 @@ def _key_for_feed(feed):
     the search downloads feed gets combined with the search feed
     (ss #11778)
     """
-    if feed.origURL == u'dtv:searchDownloads':
+    return _key_for_url(feed.origURL)
+
+def _key_for_url(url):
+    if url == u'dtv:searchDownloads':
         return u"dtv:search"
 
-    return feed.origURL
+    return url
+
+def _feed_keys_for_view(view):
+    """Get the _key_for_feed() value for each item in a view.
+
+    This only selects the columns we need, so we don't have to restore all
+    the Item and Feed objects at startup.
+    """
+    feed_keys = dict((feed_id, _key_for_url(url)) for feed_id, url in
+            models.Feed.make_view().select('id', 'origURL'))
+    return [feed_keys[feed_id] for (feed_id,) in view.select('feed_id')]
 
 class Downloader:
     def __init__(self, is_auto):
@@ -63,10 +76,10 @@ class Downloader:
             running_items = models.Item.manual_downloads_view()
             self.MAX = app.config.get(prefs.MAX_MANUAL_DOWNLOADS)
 
-        for item in pending_items:
-            self.pending_on_add(None, item)
-        for item in running_items:
-            self.running_on_add(None, item)
+        for key in _feed_keys_for_view(pending_items):
+            self._pending_added(key)
+        for key in _feed_keys_for_view(running_items):
+            self._running_added(key)
 
         self.pending_items_tracker = pending_items.make_tracker()
         self.pending_items_tracker.connect('added', self.pending_on_add)
@@ -80,8 +93,8 @@ class Downloader:
             self.new_count = 0
             self.feed_new_count = {}
             new_items = models.Item.unwatched_downloaded_items()
-            for item in new_items:
-                self.new_on_add(None, item)
+            for key in _feed_keys_for_view(new_items):
+                self._new_added(key)
             self.new_items_tracker = new_items.make_tracker()
             self.new_items_tracker.connect('added', self.new_on_add)
             self.new_items_tracker.connect('removed', self.new_on_remove)
@@ -104,7 +117,10 @@ class Downloader:
                and self.pending_count != last_count):
             last_count = self.pending_count
             candidate_feeds = []
-            for feed in models.Feed.make_view():
+            feeds = list(models.Feed.make_view())
+            if self.is_auto:
+                models.Feed.cache_counts(feeds)
+            for feed in feeds:
                 key = _key_for_feed(feed)
                 if self.is_auto:
                     max_new = feed.get_max_new()
@@ -138,8 +154,9 @@ class Downloader:
                                      "Start Downloads")
 
     def pending_on_add(self, tracker, obj):
-        feed = obj.get_feed()
-        key = _key_for_feed(feed)
+        self._pending_added(_key_for_feed(obj.get_feed()))
+
+    def _pending_added(self, key):
         self.pending_count = self.pending_count + 1
         self.feed_pending_count[key] = self.feed_pending_count.get(key, 0) + 1
         self.start_downloads()
@@ -151,8 +168,9 @@ class Downloader:
         self.feed_pending_count[key] = self.feed_pending_count.get(key, 0) - 1
 
     def running_on_add(self, tracker, obj):
-        feed = obj.get_feed()
-        key = _key_for_feed(feed)
+        self._running_added(_key_for_feed(obj.get_feed()))
+
+    def _running_added(self, key):
         self.running_count = self.running_count + 1
         self.feed_running_count[key] = self.feed_running_count.get(key, 0) + 1
 
@@ -164,8 +182,9 @@ class Downloader:
         self.start_downloads()
 
     def new_on_add(self, tracker, obj):
-        feed = obj.get_feed()
-        key = _key_for_feed(feed)
+        self._new_added(_key_for_feed(obj.get_feed()))
+
+    def _new_added(self, key):
         self.new_count = self.new_count + 1
         self.feed_new_count[key] = self.feed_new_count.get(key, 0) + 1
 
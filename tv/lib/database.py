@@ -206,6 +206,25 @@ class View(object):
     def id_list(self):
         return self._query_ids()
 
+    def select(self, *columns):
+        """Get the values of some columns for the objects in this view.
+
+        This runs a single SELECT for just those columns and doesn't restore
+        any DDBObjects, which is much faster than iterating through the view
+        if we only need a couple of attributes.  Values are converted the same
+        way they are for DDBObject attributes.
+
+        Note: like id_list(), this only sees what's in the database, so
+        changes from signal_change() calls that BulkSQLManager hasn't
+        committed yet won't show up.
+
+        :returns: list of tuples, with one value for each column
+        """
+        columns = ['%s.%s' % (self.table_name, c) for c in columns]
+        return [tuple(row) for row in app.db.select(self.fetcher.klass,
+            columns, self.where, self.values, joins=self.joins,
+            limit=self.limit, order_by=self.order_by)]
+
     def count(self):
         return self._query_count()
 
@@ -368,19 +387,32 @@ class ViewTracker(signals.SignalEmitter):
 class BulkSQLManager(object):
     def __init__(self):
         self.active = False
+        self.batch_updates = False
         self.to_insert = {}
         self.to_remove = {}
+        self.to_update = {}
         self.pending_inserts = set()
         self.pending_removes = set()
+        self.pending_updates = set()
+        # ids of updated objects that need an UPDATE statement (as opposed
+        # to just updating the view trackers)
+        self.pending_saves = set()
 
         self.last_call = None
 
-    def start(self):
+    def start(self, batch_updates=False):
+        """Start bulk mode.
+
+        :param batch_updates: if True, signal_change() calls will also be
+            delayed until finish() is called.  Only use this if the code
+            doesn't query for changed objects while bulk mode is active.
+        """
         if self.active:
             raise ValueError(
                 "BulkSQLManager.start() called twice (previous: %s)",
                 self.last_call)
         self.active = True
+        self.batch_updates = batch_updates
         self.last_call = "".join(traceback.format_stack())
 
     def finish(self):
@@ -392,6 +424,7 @@ class BulkSQLManager(object):
             # Ensure that this flag always get set back to False even in the
             # face of any exception thrown from commit() method.
             self.active = False
+            self.batch_updates = False
 
         # Force a commit of our current transaction.
         #
@@ -404,11 +437,18 @@ class BulkSQLManager(object):
         for x in range(100):
             to_insert = self.to_insert
             to_remove = self.to_remove
+            to_update = self.to_update
+            pending_saves = self.pending_saves
             self.to_insert = {}
             self.to_remove = {}
+            self.to_update = {}
+            self.pending_updates = set()
+            self.pending_saves = set()
             self._commit_sql(to_insert, to_remove)
-            self._update_view_trackers(to_insert, to_remove)
-            if len(self.to_insert) == len(self.to_remove) == 0:
+            self._commit_updates(to_update, pending_saves)
+            self._update_view_trackers(to_insert, to_remove, to_update)
+            if (len(self.to_insert) == len(self.to_remove) ==
+                    len(self.to_update) == 0):
                 break
             # inside _commit_sql() or _update_view_trackers(), we were
             # asked to insert or remove more items, repeat the
@@ -418,8 +458,11 @@ class BulkSQLManager(object):
                     "have items to commit.  Are we in a circular loop?")
         self.to_insert = {}
         self.to_remove = {}
+        self.to_update = {}
         self.pending_inserts = set()
         self.pending_removes = set()
+        self.pending_updates = set()
+        self.pending_saves = set()
 
     def _commit_sql(self, to_insert, to_remove):
         for table_name, objects in to_insert.items():
@@ -434,19 +477,29 @@ class BulkSQLManager(object):
             for obj in objects:
                 obj.removed_from_db()
 
-    def _update_view_trackers(self, to_insert, to_remove):
+    def _commit_updates(self, to_update, pending_saves):
+        for table_name, objects in to_update.items():
+            logging.debug('bulk update: %s %s', table_name, len(objects))
+            for obj in objects:
+                if obj.id in pending_saves:
+                    app.db.update_obj(obj)
+
+    def _update_view_trackers(self, to_insert, to_remove, to_update):
         # figure out the total number of objects that have changed
         changed_objs = set()
         for table_name, objects in to_insert.items():
             changed_objs.update(objects)
         for table_name, objects in to_remove.items():
             changed_objs.update(objects)
+        for table_name, objects in to_update.items():
+            changed_objs.update(objects)
         # Figure out which strategy is fastest based on the number of objects
         # that have changed
         if len(changed_objs) < 100:
             self._update_view_trackers_by_object(changed_objs)
         else:
-            self._update_view_trackers_by_table(to_insert, to_remove)
+            self._update_view_trackers_by_table(to_insert, to_remove,
+                                                to_update)
 
     def _update_view_trackers_by_object(self, changed_objs):
         """Update view trackers by checking each changed object.
@@ -457,16 +510,18 @@ class BulkSQLManager(object):
             app.view_tracker_manager.update_view_trackers(obj)
 
 
-    def _update_view_trackers_by_table(self, to_insert, to_remove):
+    def _update_view_trackers_by_table(self, to_insert, to_remove,
+                                       to_update):
         """Update view trackers by checking each table
 
         This method is fastest when there are many changed objects
         """
-        for table_name in to_insert:
+        checked_tables = set(to_insert).union(to_update)
+        for table_name in checked_tables:
             app.view_tracker_manager.bulk_update_view_trackers(table_name)
 
         for table_name, objects in to_remove.items():
-            if table_name in to_insert:
+            if table_name in checked_tables:
                 # already updated the view above
                 continue
             app.view_tracker_manager.bulk_remove_from_view_trackers(
@@ -488,8 +543,30 @@ class BulkSQLManager(object):
     def will_remove(self, id_):
         return id_ in self.pending_removes
 
+    def add_update(self, obj, needs_save=True):
+        """Delay the UPDATE and view tracker checks for a changed object
+
+        This is used by DDBObject.signal_change() when batch_updates is set.
+        """
+        if needs_save:
+            self.pending_saves.add(obj.id)
+        if obj.id in self.pending_updates:
+            return
+        table_name = app.db.table_name(obj.__class__)
+        try:
+            updates_for_table = self.to_update[table_name]
+        except KeyError:
+            updates_for_table = []
+            self.to_update[table_name] = updates_for_table
+        updates_for_table.append(obj)
+        self.pending_updates.add(obj.id)
+
     def add_remove(self, obj):
         table_name = app.db.table_name(obj.__class__)
+        if obj.id in self.pending_updates:
+            self.to_update[table_name].remove(obj)
+            self.pending_updates.remove(obj.id)
+            self.pending_saves.discard(obj.id)
         if self.will_insert(obj.id):
             self.to_insert[table_name].remove(obj)
             self.pending_inserts.remove(obj.id)
@@ -534,6 +611,8 @@ class DDBObject(signals.SignalEmitter):
     """
     #The last ID used in this class
     lastID = 0
+    # set by signal_info_change()
+    changed_info_fields = None
 
     def __init__(self, *args, **kwargs):
         self.confirm_db_thread()
@@ -608,8 +687,10 @@ class DDBObject(signals.SignalEmitter):
         return app.db.delete(cls, where, values)
 
     @classmethod
-    def select(cls, columns, where=None, values=None, convert=True):
-        return app.db.select(cls, columns, where, values, convert=convert)
+    def select(cls, columns, where=None, values=None, convert=True,
+            joins=None, group_by=None):
+        return app.db.select(cls, columns, where, values, joins=joins,
+                convert=convert, group_by=group_by)
 
     def setup_new(self):
         """Initialize a newly created object."""
@@ -716,10 +797,34 @@ class DDBObject(signals.SignalEmitter):
             # view trackers in this case.  Both will be done when the
             # BulkSQLManager.finish() is called.
             return
+        if app.bulk_sql_manager.batch_updates:
+            app.bulk_sql_manager.add_update(self, needs_save)
+            return
         if needs_save:
             app.db.update_obj(self)
         app.view_tracker_manager.update_view_trackers(self)
 
+    def signal_info_change(self, fields):
+        """Call signal_change() for a change that only affects some fields
+        of the info objects created for this object.
+
+        While the change is being signalled, changed_info_fields is set to
+        the names of those fields.  messagehandler's ViewTrackers use this
+        to update only those fields, instead of creating a new info object
+        from scratch.  Changes signalled with signal_change() leave
+        changed_info_fields as None, which means any field could have
+        changed.
+
+        The object isn't saved, since this is for changes to values that
+        the object calculates from other objects (for example, the item
+        counts for a feed).
+        """
+        self.changed_info_fields = frozenset(fields)
+        try:
+            self.signal_change(needs_save=False)
+        finally:
+            self.changed_info_fields = None
+
     def on_signal_change(self):
         pass
 
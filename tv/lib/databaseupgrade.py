@@ -62,54 +62,94 @@ class DatabaseTooNewError(Exception):
     """
     pass
 
-def remove_column(cursor, table, column_names):
-    """Remove a column from a SQLITE table.  This was added for
-    upgrade88, but it's probably useful for other ones as well.
-
-    :param table: the table to remove the columns from
-    :param column_names: list of columns to remove
+def alter_table_columns(cursor, table, delete_columns=(),
+        rename_columns=None, new_types=None):
+    """Remove, rename and retype several columns of a SQLITE table at once.
+
+    SQLite can't drop or rename columns, so we have to rebuild the table:
+    create a new one, copy the data over with INSERT INTO ... SELECT, then
+    drop the old one.  That's slow for big tables like item, so upgrades
+    that change several columns of the same table should make a single
+    call here rather than calling remove_column() and rename_column() once
+    per column.
+
+    The indexes get recreated after the data is copied, which is much faster
+    than updating them for each row as it's inserted.  Indexes that use a
+    deleted column are dropped.  Indexes that use a renamed column are
+    recreated using the new name.
+
+    :param table: the table to change
+    :param delete_columns: list of columns to remove
+    :param rename_columns: dict mapping old column names to new ones
+    :param new_types: dict mapping new column names to new types
     """
+    if rename_columns is None:
+        rename_columns = {}
+    if new_types is None:
+        new_types = {}
     cursor.execute("PRAGMA table_info('%s')" % table)
-    columns = []
+    old_columns = []
+    new_columns = []
     columns_with_type = []
     for column_info in cursor.fetchall():
         column = column_info[1]
         col_type = column_info[2]
-        if column in column_names:
+        if column in delete_columns:
             continue
-        columns.append(column)
+        old_columns.append(column)
+        column = rename_columns.get(column, column)
+        col_type = new_types.get(column, col_type)
+        new_columns.append(column)
         if column == 'id':
             col_type += ' PRIMARY KEY'
         columns_with_type.append("%s %s" % (column, col_type))
 
     cursor.execute("PRAGMA index_list('%s')" % table)
+    index_list = cursor.fetchall()
     index_sql = []
-    for index_info in cursor.fetchall():
+    for index_info in index_list:
         name = index_info[1]
-        if name in column_names:
-            continue
         cursor.execute("SELECT sql FROM sqlite_master "
                        "WHERE name=? and type='index'", (name,))
-        index_sql.append(cursor.fetchone()[0])
+        sql = cursor.fetchone()[0]
+        if sql is None:
+            # automatic index that sqlite will recreate by itself
+            continue
+        cursor.execute("PRAGMA index_info('%s')" % name)
+        index_columns = [row[2] for row in cursor.fetchall()]
+        if [c for c in index_columns if c in delete_columns]:
+            continue
+        if [c for c in index_columns if c in rename_columns]:
+            if index_info[2]:
+                unique = 'UNIQUE '
+            else:
+                unique = ''
+            sql = "CREATE %sINDEX %s ON %s (%s)" % (unique, name, table,
+                    ', '.join(rename_columns.get(c, c)
+                        for c in index_columns))
+        index_sql.append(sql)
 
     cursor.execute("ALTER TABLE %s RENAME TO old_%s" % (table, table))
     cursor.execute("CREATE TABLE %s (%s)" %
                    (table, ', '.join(columns_with_type)))
-    cursor.execute("INSERT INTO %s SELECT %s FROM old_%s" %
-                   (table, ', '.join(columns), table))
+    cursor.execute("INSERT INTO %s(%s) SELECT %s FROM old_%s" %
+                   (table, ', '.join(new_columns), ', '.join(old_columns),
+                       table))
     cursor.execute("DROP TABLE old_%s" % table)
     for sql in index_sql:
         cursor.execute(sql)
 
-def rename_column(cursor, table, from_column, to_column, new_type=None):
-    """Renames a column in a SQLITE table.
-
-    .. Note::
+def remove_column(cursor, table, column_names):
+    """Remove a column from a SQLITE table.  This was added for
+    upgrade88, but it's probably useful for other ones as well.
 
-       This does **NOT** handle renaming the column in an index.
+    :param table: the table to remove the columns from
+    :param column_names: list of columns to remove
+    """
+    alter_table_columns(cursor, table, delete_columns=column_names)
 
-       If you're going to rename columns that are involved in indexes,
-       you'll need to add that feature.
+def rename_column(cursor, table, from_column, to_column, new_type=None):
+    """Renames a column in a SQLITE table.
 
     .. Note::
 
@@ -120,40 +160,12 @@ def rename_column(cursor, table, from_column, to_column, new_type=None):
     :param to_column: the new name
     :param new_type: new type for the column (or None to keep the old one)
     """
-    cursor.execute("PRAGMA table_info('%s')" % table)
-    old_columns = []
-    new_columns = []
-    columns_with_type = []
-    for column_info in cursor.fetchall():
-        column = column_info[1]
-        col_type = column_info[2]
-        old_columns.append(column)
-        if column == from_column:
-            column = to_column
-            if new_type is not None:
-                col_type = new_type
-        new_columns.append(column)
-        if column == 'id':
-            col_type += ' PRIMARY KEY'
-        columns_with_type.append("%s %s" % (column, col_type))
-
-    # Note: This does not fix indexes that use the old column name.
-    cursor.execute("PRAGMA index_list('%s')" % table)
-    index_sql = []
-    for index_info in cursor.fetchall():
-        name = index_info[1]
-        cursor.execute("SELECT sql FROM sqlite_master "
-                       "WHERE name=? and type='index'", (name,))
-        index_sql.append(cursor.fetchone()[0])
-
-    cursor.execute("ALTER TABLE %s RENAME TO old_%s" % (table, table))
-    cursor.execute("CREATE TABLE %s (%s)" %
-                   (table, ', '.join(columns_with_type)))
-    cursor.execute("INSERT INTO %s(%s) SELECT %s FROM old_%s" %
-                   (table, ', '.join(new_columns), ', '.join(old_columns), table))
-    cursor.execute("DROP TABLE old_%s" % table)
-    for sql in index_sql:
-        cursor.execute(sql)
+    if new_type is not None:
+        new_types = {to_column: new_type}
+    else:
+        new_types = None
+    alter_table_columns(cursor, table, rename_columns={from_column: to_column},
+            new_types=new_types)
 
 def get_object_tables(cursor):
     """Returns a list of tables that store ``DDBObject`` subclasses.
@@ -182,7 +194,7 @@ def get_upgrade_func(version):
     else:
         return globals()['upgrade%d' % version]
 
-def new_style_upgrade(cursor, saved_version, upgrade_to):
+def new_style_upgrade(cursor, saved_version, upgrade_to, step_finished=None):
     """Upgrade a database using new-style upgrade functions.
 
     This method replaces the upgrade() method.  However, we still need
@@ -197,6 +209,11 @@ def new_style_upgrade(cursor, saved_version, upgrade_to):
 
         upgrade3(cursor)
         upgrade4(cursor)
+
+    Each upgrade function runs in its own transaction.  If step_finished is
+    given, it's called with the new version number inside that transaction,
+    so that the database can record how far it got and a later run can
+    pick up from there if we get interrupted.
     """
 
     if saved_version > upgrade_to:
@@ -209,9 +226,13 @@ def new_style_upgrade(cursor, saved_version, upgrade_to):
     for version in xrange(saved_version + 1, upgrade_to + 1):
         if util.chatter:
             logging.info("upgrading database to version %s", version)
+        start = time.time()
         cursor.execute("BEGIN TRANSACTION")
         get_upgrade_func(version)(cursor)
+        if step_finished is not None:
+            step_finished(version)
         cursor.execute("COMMIT TRANSACTION")
+        dbupgradeprogress.new_style_step_time(version, time.time() - start)
         dbupgradeprogress.new_style_progress(saved_version, version,
                                              upgrade_to)
 
@@ -2405,6 +2426,7 @@ def upgrade99(cursor):
     cursor.execute("SELECT id, status from remote_downloader "
             "WHERE state in ('stopped', 'finished', 'uploading', "
             "'uploading-paused')")
+    updates = []
     for row in cursor.fetchall():
         downloader_id = row[0]
         status = eval(row[1], __builtins__,
@@ -2412,8 +2434,9 @@ def upgrade99(cursor):
         filename = status.get('filename')
         if filename:
             filename = filename_to_unicode(filename)
-            cursor.execute("UPDATE item SET filename=? WHERE downloader_id=?",
-                    (filename, downloader_id))
+            updates.append((filename, downloader_id))
+    cursor.executemany("UPDATE item SET filename=? WHERE downloader_id=?",
+            updates)
 
 class TimeModuleShadow:
     """In Python 2.6, time.struct_time is a named tuple and evals
@@ -2558,6 +2581,7 @@ def upgrade105(cursor):
     cursor.execute("ALTER TABLE remote_downloader ADD fast_resume_data BLOB")
     # move things
     cursor.execute("SELECT id, status FROM remote_downloader")
+    updates = []
     for row in cursor.fetchall():
         id, status_repr = row
         try:
@@ -2575,10 +2599,11 @@ def upgrade105(cursor):
             fast_resume_data_value = buffer(fast_resume_data)
         else:
             fast_resume_data_value = None
-        cursor.execute("UPDATE remote_downloader "
-                "SET status=?, metainfo=?, fast_resume_data=? "
-                "WHERE id=?",
-                (new_status, metainfo_value, fast_resume_data_value, id))
+        updates.append((new_status, metainfo_value, fast_resume_data_value,
+            id))
+    cursor.executemany("UPDATE remote_downloader "
+            "SET status=?, metainfo=?, fast_resume_data=? "
+            "WHERE id=?", updates)
 
 
 def upgrade106(cursor):
@@ -3083,9 +3108,8 @@ def upgrade134(cursor):
     cursor.execute("ALTER TABLE item ADD COLUMN track integer")
     cursor.execute("ALTER TABLE item ADD COLUMN year integer")
     cursor.execute("ALTER TABLE item ADD COLUMN genre text")
-    for data in items:
-        cursor.execute("UPDATE item SET album=?, artist=?, title_tag=?,"
-            "track=?, year=?, genre=? WHERE id=?", data)
+    cursor.executemany("UPDATE item SET album=?, artist=?, title_tag=?,"
+        "track=?, year=?, genre=? WHERE id=?", items)
  
 def upgrade135(cursor):
     """Basic metadata versioning
@@ -3101,9 +3125,10 @@ def upgrade136(cursor):
     ViewState; drop some orphaned DisplayState entries.
     """
     cursor.execute("DELETE FROM display_state WHERE id_ IS NULL")
-    remove_column(cursor, 'display_state', ['sort_state', 'is_list_view'])
-    rename_column(cursor, 'display_state', 'columns_enabled', 'list_view_columns')
-    rename_column(cursor, 'display_state', 'column_widths', 'list_view_widths')
+    alter_table_columns(cursor, 'display_state',
+            delete_columns=['sort_state', 'is_list_view'],
+            rename_columns={'columns_enabled': 'list_view_columns',
+                'column_widths': 'list_view_widths'})
     cursor.execute("ALTER TABLE display_state ADD COLUMN selected_view integer")
     cursor.execute("CREATE TABLE view_state (id integer PRIMARY KEY, "
         "display_type text, display_id text, view_type integer, "
@@ -3453,8 +3478,8 @@ def upgrade164(cursor):
             "display_state.id_ = view_state.display_id) "
             "WHERE view_type in (?, ?)", (LIST_VIEW, ALBUM_VIEW))
     # drop old columns
-    remove_column(cursor, 'display_state', ['list_view_columns'])
-    remove_column(cursor, 'display_state', ['list_view_widths'])
+    remove_column(cursor, 'display_state',
+            ['list_view_columns', 'list_view_widths'])
 
 def upgrade165(cursor):
     """Add lots of indexes."""
@@ -3466,3 +3491,22 @@ def upgrade165(cursor):
     ]
     for n, t, c in indices:
         cursor.execute("CREATE INDEX %s ON %s (%s)" % (n, t, c))
+
+def upgrade166(cursor):
+    """Add an index for icon cache filenames.
+
+    Icon cache files can now be shared by several IconCache objects, and we
+    look them up by filename to see if a file is still used.
+    """
+    cursor.execute("CREATE INDEX icon_cache_filename ON icon_cache (filename)")
+
+def upgrade167(cursor):
+    """Add indexes for item lookups by filename and url.
+
+    The query plan log showed that looking up items by filename (for
+    duplicate FileItems) and looking up downloaderless items by url (when a
+    download finishes) were scanning the entire item table.
+    """
+    cursor.execute("CREATE INDEX item_filename ON item (filename)")
+    cursor.execute("CREATE INDEX item_downloader_url "
+            "ON item (downloader_id, url)")
@@ -31,12 +31,15 @@
 database.
 """
 
+import logging
+
 from miro.gtcache import gettext as _
 from miro import messages
 
 _doing_20_upgrade = False
 _doing_new_style_upgrade = False
 _sent_upgrade_start = False
+_step_times = []
 
 def doing_20_upgrade():
     """Call this if we are upgrading from a 2.0-style database.
@@ -65,6 +68,11 @@ def upgrade_start():
 
 def upgrade_end():
     """Call at the end of the database upgrades."""
+    if _step_times:
+        total = sum(step_time for version, step_time in _step_times)
+        slowest = sorted(_step_times, key=lambda s: -s[1])[:5]
+        logging.timing("database upgrades took %.3f seconds (slowest: %s)",
+                total, ', '.join("upgrade%d: %.3f" % s for s in slowest))
     messages.DatabaseUpgradeEnd().send_to_frontend()
 
 def old_style_progress(start_version, current_version, end_version):
@@ -91,6 +99,23 @@ def new_style_progress(start_version, current_version, end_version):
         total = 0.05 + (0.70 * progress)
     _send_message(_('Upgrading Database'), progress, total)
 
+def new_style_step_time(version, step_time):
+    """Call after each new-style upgrade function finishes.
+
+    :param version: version that we upgraded to
+    :param step_time: how long the upgrade took, in seconds
+    """
+    _step_times.append((version, step_time))
+    if step_time > 1.0:
+        logging.timing("upgrade%d slow (%.3f seconds)", version, step_time)
+
+def get_step_times():
+    """Get the timings recorded with new_style_step_time().
+
+    :returns: list of (version, seconds) tuples
+    """
+    return list(_step_times)
+
 def infocache_progress(current_item, total_items):
     """Call while stepping through new-style upgrades"""
     progress = _calc_progress(0, current_item, total_items)
@@ -27,6 +27,7 @@
 # this exception statement from your version. If you delete this exception
 # statement from all source files in the program, then also delete it here.
 
+import datetime
 import time
 import random
 import threading
@@ -109,18 +110,81 @@ class RemoveHTTPAuthCommand(Command):
         from miro import httpauth
         httpauth.remove_by_url_and_realm(*self.args)
 
+# key in status patches that lists the keys that were removed from the
+# status dict.
+PATCH_REMOVED_KEYS = 'removed_keys'
+
 class BatchUpdateDownloadStatus(Command):
+    """Send download status to the main process.
+
+    args are (statuses, cmd_done, patches).  statuses is a list of full
+    status dicts, patches is a list of dicts that only contain the dlid
+    and the keys that changed since the last status we sent.  If keys were
+    removed, the patch lists them under PATCH_REMOVED_KEYS.
+    """
     spammy = True
     def action(self):
         from miro.downloader import RemoteDownloader
         from miro.messages import DownloaderSyncCommandComplete
 
         cmd_done = self.args[1]
-        fresh = all(RemoteDownloader.update_status(status, cmd_done=cmd_done)
-                    for status in self.args[0])
+        if len(self.args) > 2:
+            patches = self.args[2]
+        else:
+            patches = []
+        # use lists rather than generators so that every status gets
+        # applied, even after one of them turns out to be stale.
+        fresh = all([RemoteDownloader.update_status(status,
+                                                    cmd_done=cmd_done)
+                     for status in self.args[0]] +
+                    [RemoteDownloader.apply_status_patch(patch,
+                                                         cmd_done=cmd_done)
+                     for patch in patches])
         if cmd_done and fresh:
             DownloaderSyncCommandComplete().send_to_frontend()
 
+    # status dicts are the bulk of what we send to the main process, so we
+    # send them with a compact encoding rather than pickling them (see
+    # messagecodec).
+    def to_compact(self):
+        statuses = [_status_to_compact(status) for status in self.args[0]]
+        if len(self.args) > 2:
+            patches = [_status_to_compact(patch) for patch in self.args[2]]
+        else:
+            patches = []
+        return (self.command_id, self.orig, statuses, self.args[1], patches)
+
+    @classmethod
+    def from_compact(cls, data):
+        command_id, orig, statuses, cmd_done, patches = data
+        self = cls(None,
+                   [_status_from_compact(status) for status in statuses],
+                   cmd_done,
+                   [_status_from_compact(patch) for patch in patches])
+        self.command_id = command_id
+        self.orig = orig
+        return self
+
+# keys in status dicts that store datetime objects, which marshal can't
+# handle.
+_STATUS_DATETIME_KEYS = ('retryTime',)
+
+def _status_to_compact(status):
+    for key in _STATUS_DATETIME_KEYS:
+        value = status.get(key)
+        if isinstance(value, datetime.datetime):
+            status = status.copy()
+            status[key] = (value.year, value.month, value.day, value.hour,
+                           value.minute, value.second, value.microsecond)
+    return status
+
+def _status_from_compact(status):
+    for key in _STATUS_DATETIME_KEYS:
+        value = status.get(key)
+        if isinstance(value, tuple):
+            status[key] = datetime.datetime(*value)
+    return status
+
 class DownloaderErrorCommand(Command):
     def action(self):
         from miro import signals
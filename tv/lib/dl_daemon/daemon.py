@@ -38,6 +38,7 @@ from miro import prefs
 from miro import eventloop
 from miro import httpauth
 from miro import httpclient
+from miro import messagecodec
 import logging
 from miro.plat.utils import launch_download_daemon, kill_process
 from miro import signals
@@ -47,6 +48,11 @@ from miro import util
 
 SIZE_OF_INT = calcsize("I")
 
+# Codec for messages sent in both directions.  Status updates are by far
+# the most common messages, so they get the compact encoding.
+message_codec = messagecodec.MessageCodec()
+message_codec.register(command.BatchUpdateDownloadStatus, 1)
+
 class DaemonError(Exception):
     """Exception while communicating to a daemon (either controller or
     downloader).
@@ -170,9 +176,9 @@ class Daemon(ConnectionHandler):
     def on_command(self):
         if self.buffer.length >= self.size:
             try:
-                comm = cPickle.loads(self.buffer.read(self.size))
-            except cPickle.UnpicklingError:
-                logging.exception("WARNING: error unpickling command.")
+                comm = message_codec.decode(self.buffer.read(self.size))
+            except (cPickle.UnpicklingError, messagecodec.DecodeError):
+                logging.exception("WARNING: error decoding command.")
             else:
                 self.process_command(comm)
             self.change_state('ready')
@@ -192,7 +198,7 @@ class Daemon(ConnectionHandler):
         if self.state == 'initializing':
             self.queued_commands.append((comm, callback))
         else:
-            raw = cPickle.dumps(comm, cPickle.HIGHEST_PROTOCOL)
+            raw = message_codec.encode(comm)
             self.send_data(pack("I", len(raw)) + raw, callback)
 
 class DownloaderDaemon(Daemon):
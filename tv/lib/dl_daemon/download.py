@@ -404,6 +404,12 @@ class DownloadStatusUpdater(object):
     2. The update don't happen fairly infrequently (currently every 5
        seconds).
 
+    3. Once a full status dict has been sent for a downloader, we only
+       send the keys that changed since then.  Every
+       FULL_RESYNC_INTERVAL updates we send full dicts again.  The
+       daemon socket is ordered and reliable, so the main process sees
+       every patch that we send, in order.
+
     Because updates happen infrequently, DownloadStatusUpdaters should
     only be used for progress updates, not events like downloads
     starting/finishing.  For those just call update_client() since
@@ -412,10 +418,16 @@ class DownloadStatusUpdater(object):
     """
 
     UPDATE_CLIENT_INTERVAL = 1
+    # Send full status dicts instead of patches once every this many
+    # updates, so the main process can't drift from our state forever.
+    FULL_RESYNC_INTERVAL = 30
 
     def __init__(self):
         self.to_update = set()
         self.cmds_done = False
+        # maps dlid -> the last status dict that we sent for it
+        self.last_sent = {}
+        self.updates_since_resync = 0
 
     def start_updates(self):
         eventloop.add_timeout(self.UPDATE_CLIENT_INTERVAL, self.do_update,
@@ -427,14 +439,29 @@ class DownloadStatusUpdater(object):
     def do_update(self, periodic=True):
         try:
             TORRENT_SESSION.update_torrents()
+            resync = self._check_resync()
             statuses = []
+            patches = []
             for downloader in self.to_update:
-                statuses.append(downloader.get_status())
+                status = downloader.get_status()
+                if resync:
+                    patch = None
+                else:
+                    patch = self.make_patch(status)
+                if patch is None:
+                    statuses.append(status)
+                elif len(patch) > 1 or self.cmds_done:
+                    # Even an empty patch is meaningful when we're
+                    # replying to commands, since it unfreezes the
+                    # downloader in the main process.
+                    patches.append(patch)
+                self._remember_status(status)
             self.to_update = set()
-            if statuses or self.cmds_done:
+            if statuses or patches or self.cmds_done:
                 command.BatchUpdateDownloadStatus(daemon.LAST_DAEMON,
                                                   statuses,
-                                                  self.cmds_done).send()
+                                                  self.cmds_done,
+                                                  patches).send()
                 self.cmds_done = False
         finally:
             if periodic:
@@ -442,6 +469,50 @@ class DownloadStatusUpdater(object):
                                       self.do_update,
                                       "Download status update")
 
+    def _check_resync(self):
+        """Check if it's time to send full status dicts again.
+
+        When we resync, we also forget about downloaders that have
+        been removed since the last resync.
+        """
+        self.updates_since_resync += 1
+        if self.updates_since_resync < self.FULL_RESYNC_INTERVAL:
+            return False
+        self.updates_since_resync = 0
+        for dlid in self.last_sent.keys():
+            if dlid not in _downloads:
+                del self.last_sent[dlid]
+        return True
+
+    def make_patch(self, status):
+        """Calculate the changes to a status dict since we last sent it.
+
+        The patch always contains the dlid key, plus every key whose
+        value changed.  metainfo is always included if it's present,
+        since the downloader only sends it when it changes.  Keys that
+        were removed are listed under command.PATCH_REMOVED_KEYS.
+
+        :returns: a patch dict, or None if we've never sent a status
+            for that downloader and need to send the full dict.
+        """
+        try:
+            last = self.last_sent[status['dlid']]
+        except KeyError:
+            return None
+        patch = {'dlid': status['dlid']}
+        for key, value in status.iteritems():
+            if key not in last or last[key] != value:
+                patch[key] = value
+        removed = [key for key in last if key not in status]
+        if removed:
+            patch[command.PATCH_REMOVED_KEYS] = removed
+        return patch
+
+    def _remember_status(self, status):
+        last = status.copy()
+        last.pop('metainfo', None)
+        self.last_sent[status['dlid']] = last
+
     def set_cmds_done(self):
         self.cmds_done = True
 
@@ -501,11 +572,9 @@ class BGDownloader(object):
             'channelName': self.channelName}
 
     def update_client(self, now=False):
-        if not now:
-            DOWNLOAD_UPDATER.queue_update(self)
-        else:
-            command.BatchUpdateDownloadStatus(daemon.LAST_DAEMON,
-                                              [self.get_status()]).send()
+        DOWNLOAD_UPDATER.queue_update(self)
+        if now:
+            DOWNLOAD_UPDATER.flush_update()
 
     def pick_initial_filename(self, suffix=".part", torrent=False,
                               is_directory=False):
@@ -27,6 +27,7 @@
 # this exception statement from your version. If you delete this exception
 # statement from all source files in the program, then also delete it here.
 
+import collections
 import datetime
 import os
 import random
@@ -244,6 +245,7 @@ class RemoteDownloader(DDBObject):
         self._update_retry_time_dc = None
         self.status_updates_frozen = False
         self.last_update = time.time()
+        self._daemon_status = None
         if contentType is None:
             self.contentType = u""
         else:
@@ -379,144 +381,187 @@ class RemoteDownloader(DDBObject):
         app.download_state_manager.total_down_rate += rates[0]
         app.download_state_manager.total_up_rate += rates[1]
 
-    @classmethod
-    def update_status(cls, data, cmd_done=False):
+    @staticmethod
+    def _unicodify_status(data):
         for field in data:
             if field not in ['filename', 'shortFilename', 'channelName',
                              'metainfo']:
                 data[field] = unicodify(data[field])
 
+    def _remember_daemon_status(self, data):
+        """Store the status we got from the downloader daemon.
+
+        This is what apply_status_patch() applies patches to.  It's
+        separate from self.status, which we modify ourselves.
+        """
+        self._daemon_status = data.copy()
+        self._daemon_status.pop('metainfo', None)
+
+    @classmethod
+    def update_status(cls, data, cmd_done=False):
+        cls._unicodify_status(data)
         self = get_downloader_by_dlid(dlid=data['dlid'])
+        if self is not None:
+            self._remember_daemon_status(data)
+            return self._update_status(data, cmd_done)
+        return True
 
+    @classmethod
+    def apply_status_patch(cls, patch, cmd_done=False):
+        """Update our status from a partial status dict.
+
+        The downloader daemon sends patches with only the keys that
+        changed since the last status it sent for a download.
+        """
+        cls._unicodify_status(patch)
+        self = get_downloader_by_dlid(dlid=patch['dlid'])
         if self is not None:
-            now = time.time()
-            last_update = self.last_update
-            rate_limit = False
-            state = self.get_state()
-            new_state = data.get('state', u'downloading')
-
-            # If this item was marked as pending update, then any update
-            # which comes in now which does not have cmd_done set is void.
-            if not cmd_done and self.status_updates_frozen:
-                logging.debug('self = %s, '
-                              'saved state = %s '
-                              'downloader state = %s.  '
-                              'Discard.',
+            if self._daemon_status is None:
+                # We've never seen a full status from the daemon.  This
+                # shouldn't happen, but our own status is the best guess
+                # of what the patch was made against.
+                self._remember_daemon_status(self.status)
+            data = self._daemon_status
+            for key in patch.get(command.PATCH_REMOVED_KEYS, []):
+                data.pop(key, None)
+            data.update(patch)
+            data.pop(command.PATCH_REMOVED_KEYS, None)
+            data.pop('metainfo', None)
+            data = data.copy()
+            if 'metainfo' in patch:
+                data['metainfo'] = patch['metainfo']
+            return self._update_status(data, cmd_done)
+        return True
+
+    def _update_status(self, data, cmd_done):
+        now = time.time()
+        last_update = self.last_update
+        rate_limit = False
+        state = self.get_state()
+        new_state = data.get('state', u'downloading')
+
+        # If this item was marked as pending update, then any update
+        # which comes in now which does not have cmd_done set is void.
+        if not cmd_done and self.status_updates_frozen:
+            logging.debug('self = %s, '
+                          'saved state = %s '
+                          'downloader state = %s.  '
+                          'Discard.',
+                          self, state, new_state)
+            # treat as stale
+            return False
+
+        # If the timing between the status updates is too narrow,
+        # try to skip it because it makes the UI jerky otherwise.
+        if now < last_update:
+            logging.debug('time.time() gone backwards last = %s now = %s',
+                          last_update, now)
+        else:
+            diff = now - last_update
+            if diff < self.MIN_STATUS_UPDATE_SPACING:
+                logging.debug('Rate limit: '
+                              'self = %s, now - last_update = %s, '
+                              'MIN_STATUS_UPDATE_SPACING = %s.',
+                              self, diff, self.MIN_STATUS_UPDATE_SPACING)
+                rate_limit = True
+
+        # If the state is one which we set and was meant to be passed
+        # through to the downloader (valid_states), and the downloader
+        # replied with something that was a response to a previous
+        # download command, and state was also a part of valid_states,
+        # but the saved state and the new state do not match
+        # then it means the message is stale.
+        #
+        # Have a think about why this is true: when you set a state,
+        # which is authoritative, to the downloader you expect it
+        # to reply with that same state.  If they do not match then it
+        # means the message is stale.
+        #
+        # The exception to this rule is if the downloader replies with
+        # an error state, or if downloading has transitioned to finished
+        # state.
+        #
+        # This also does not apply to any state which we set on the
+        # downloader via a restore command.  A restore command before
+        # a pause/resume/cancel will work as intended, and no special
+        # trickery is required.  A restore command which happens after
+        # a pause/resume/cancel is void, so no work is required.
+        #
+        # I hope this makes sense and is clear!
+        valid_states = (u'downloading', u'paused', u'stopped',
+                        u'uploading-paused', u'finished')
+        if (cmd_done and
+          state in valid_states and new_state in valid_states and
+          state != new_state):
+            if not (state == u'downloading' and new_state == u'finished'):
+                logging.debug('self = %s STALE.  '
+                              'Saved state %s, got state %s.  Discarding.',
                               self, state, new_state)
-                # treat as stale
                 return False
 
-            # If the timing between the status updates is too narrow,
-            # try to skip it because it makes the UI jerky otherwise.
-            if now < last_update:
-                logging.debug('time.time() gone backwards last = %s now = %s',
-                              last_update, now)
-            else:
-                diff = now - last_update
-                if diff < self.MIN_STATUS_UPDATE_SPACING:
-                    logging.debug('Rate limit: '
-                                  'self = %s, now - last_update = %s, '
-                                  'MIN_STATUS_UPDATE_SPACING = %s.',
-                                  self, diff, self.MIN_STATUS_UPDATE_SPACING)
-                    rate_limit = True
-
-            # If the state is one which we set and was meant to be passed
-            # through to the downloader (valid_states), and the downloader
-            # replied with something that was a response to a previous
-            # download command, and state was also a part of valid_states,
-            # but the saved state and the new state do not match
-            # then it means the message is stale.
-            #
-            # Have a think about why this is true: when you set a state,
-            # which is authoritative, to the downloader you expect it
-            # to reply with that same state.  If they do not match then it
-            # means the message is stale.
-            #
-            # The exception to this rule is if the downloader replies with
-            # an error state, or if downloading has transitioned to finished
-            # state.
-            #
-            # This also does not apply to any state which we set on the
-            # downloader via a restore command.  A restore command before
-            # a pause/resume/cancel will work as intended, and no special
-            # trickery is required.  A restore command which happens after
-            # a pause/resume/cancel is void, so no work is required.
-            #
-            # I hope this makes sense and is clear!
-            valid_states = (u'downloading', u'paused', u'stopped',
-                            u'uploading-paused', u'finished')
-            if (cmd_done and
-              state in valid_states and new_state in valid_states and
-              state != new_state):
-                if not (state == u'downloading' and new_state == u'finished'):
-                    logging.debug('self = %s STALE.  '
-                                  'Saved state %s, got state %s.  Discarding.',
-                                  self, state, new_state)
-                    return False
-
-            # We are updating!  Reset the status_updates_frozen flag.
-            self.status_updates_frozen = False
- 
-            # FIXME - this should get fixed.
-            metainfo = data.pop('metainfo', self.metainfo)
-
-            # For metainfo, the downloader process doesn't send the
-            # keys if they haven't changed.  Therefore, use our
-            # current values if the key isn't present.
-            current = (self.status, self.metainfo)
-            new = (data, metainfo)
-            if current == new:
-                return True
-
-            # We have something to update: update the last updated timestamp.
-            self.last_update = now
-
-            was_finished = self.is_finished()
-            old_filename = self.get_filename()
-            self.before_changing_status()
+        # We are updating!  Reset the status_updates_frozen flag.
+        self.status_updates_frozen = False
 
-            # FIXME: how do we get all of the possible bit torrent
-            # activity strings into gettext? --NN
-            if data.has_key('activity') and data['activity']:
-                data['activity'] = _(data['activity'])
-
-            # only set attributes if something's changed.  This makes our
-            # UPDATE statments contain less data
-            if data != self.status:
-                self.status = data
-            if metainfo != self.metainfo:
-                self.metainfo = metainfo
-            self._recalc_state()
-
-            # Store the time the download finished
-            finished = self.is_finished() and not was_finished
-            file_migrated = (self.is_finished() and
-                             self.get_filename() != old_filename)
-            needs_signal_item = not (finished or file_migrated or rate_limit)
-            self.after_changing_status()
+        # FIXME - this should get fixed.
+        metainfo = data.pop('metainfo', self.metainfo)
 
-            if ((self.get_state() == u'uploading'
-                 and not self.manualUpload
-                 and (app.config.get(prefs.LIMIT_UPLOAD_RATIO)
-                      and self.get_upload_ratio() > app.config.get(prefs.UPLOAD_RATIO)))):
-                self.stop_upload()
+        # For metainfo, the downloader process doesn't send the
+        # keys if they haven't changed.  Therefore, use our
+        # current values if the key isn't present.
+        current = (self.status, self.metainfo)
+        new = (data, metainfo)
+        if current == new:
+            return True
 
-            if self.changed_attributes == set(('status',)):
-                # if we just changed status, then we can wait a while
-                # to store things to disk.  Since we go through
-                # update_status() often, this results in a fairly
-                # large performance gain and alleviates #12101
-                self._save_later()
-                self.signal_change(needs_signal_item=needs_signal_item,
-                                   needs_save=False)
-            else:
-                self.signal_change()
+        # We have something to update: update the last updated timestamp.
+        self.last_update = now
+
+        was_finished = self.is_finished()
+        old_filename = self.get_filename()
+        self.before_changing_status()
+
+        # FIXME: how do we get all of the possible bit torrent
+        # activity strings into gettext? --NN
+        if data.has_key('activity') and data['activity']:
+            data['activity'] = _(data['activity'])
+
+        # only set attributes if something's changed.  This makes our
+        # UPDATE statments contain less data
+        if data != self.status:
+            self.status = data
+        if metainfo != self.metainfo:
+            self.metainfo = metainfo
+        self._recalc_state()
 
-            if finished:
-                for item in self.item_list:
-                    item.on_download_finished()
-            elif file_migrated:
-                self._file_migrated(old_filename)
+        # Store the time the download finished
+        finished = self.is_finished() and not was_finished
+        file_migrated = (self.is_finished() and
+                         self.get_filename() != old_filename)
+        needs_signal_item = not (finished or file_migrated or rate_limit)
+        self.after_changing_status()
+
+        if ((self.get_state() == u'uploading'
+             and not self.manualUpload
+             and (app.config.get(prefs.LIMIT_UPLOAD_RATIO)
+                  and self.get_upload_ratio() > app.config.get(prefs.UPLOAD_RATIO)))):
+            self.stop_upload()
+
+        if self.changed_attributes == set(('status',)):
+            # if we just changed status, then we can wait a while
+            # to store things to disk.  Since we go through
+            # update_status() often, this results in a fairly
+            # large performance gain and alleviates #12101
+            self._save_later()
+            self.signal_change(needs_signal_item=needs_signal_item,
+                               needs_save=False)
+        else:
+            self.signal_change()
+
+        if finished:
+            for item in self.item_list:
+                item.on_download_finished()
+        elif file_migrated:
+            self._file_migrated(old_filename)
 
         return True
 
@@ -852,6 +897,7 @@ class RemoteDownloader(DDBObject):
     def setup_restored(self):
         self.status_updates_frozen = False
         self.last_update = time.time()
+        self._daemon_status = None
         self._save_later_dc = None
         self._update_retry_time_dc = None
         self.delete_files = True
@@ -978,23 +1024,34 @@ class RemoteDownloader(DDBObject):
         self.after_changing_status()
         self.signal_change()
 
-def cleanup_incomplete_downloads():
-    download_dir = os.path.join(app.config.get(prefs.MOVIES_DIRECTORY),
-                                'Incomplete Downloads')
-    if not fileutil.exists(download_dir):
-        return
+# states for downloaders that are using a file in the Incomplete Downloads
+# directory
+_FILE_IN_USE_STATES = (u'downloading', u'paused', u'offline', u'uploading',
+        u'finished', u'uploading-paused')
 
+def _incomplete_files_in_use(download_dir):
+    """Get the set of paths in download_dir that downloaders are using."""
     files_in_use = set()
-    for downloader in RemoteDownloader.make_view():
-        if downloader.get_state() in ('downloading', 'paused',
-                                     'offline', 'uploading', 'finished',
-                                     'uploading-paused'):
-            filename = downloader.get_filename()
-            if len(filename) > 0:
-                if not fileutil.isabs(filename):
-                    filename = os.path.join(download_dir, filename)
-                files_in_use.add(filename)
-
+    # Only fetch the status column for downloaders in the states we care
+    # about, rather than loading every RemoteDownloader.  There can be lots
+    # of old downloaders, and state is indexed.
+    where = 'state IN (%s)' % ', '.join('?' for s in _FILE_IN_USE_STATES)
+    view = RemoteDownloader.make_view(where, _FILE_IN_USE_STATES)
+    for (status,) in view.select('status'):
+        filename = status.get('filename')
+        if filename:
+            if not fileutil.isabs(filename):
+                filename = os.path.join(download_dir, filename)
+            files_in_use.add(filename)
+    return files_in_use
+
+def _remove_unused_incomplete_files(download_dir, files_in_use, cutoff):
+    """Remove files in download_dir that aren't in use.
+
+    This gets run in the thread pool.  The downloader daemon may be starting
+    new downloads while we run, so we leave alone anything modified after
+    cutoff.
+    """
     try:
         entries = fileutil.listdir(download_dir)
     except OSError:
@@ -1002,15 +1059,32 @@ def cleanup_incomplete_downloads():
 
     for f in entries:
         f = os.path.join(download_dir, f)
-        if f not in files_in_use:
-            try:
-                if fileutil.isfile(f):
-                    fileutil.remove(f)
-                elif fileutil.isdir(f):
-                    fileutil.rmtree(f)
-            except OSError:
-                # FIXME - maybe a permissions error?
-                pass
+        if f in files_in_use:
+            continue
+        try:
+            if fileutil.getmtime(f) >= cutoff:
+                continue
+            if fileutil.isfile(f):
+                fileutil.remove(f)
+            elif fileutil.isdir(f):
+                fileutil.rmtree(f)
+        except OSError:
+            # FIXME - maybe a permissions error?
+            pass
+
+def cleanup_incomplete_downloads():
+    download_dir = os.path.join(app.config.get(prefs.MOVIES_DIRECTORY),
+                                'Incomplete Downloads')
+    if not fileutil.exists(download_dir):
+        return
+
+    files_in_use = _incomplete_files_in_use(download_dir)
+    eventloop.call_in_thread(lambda result: None,
+            lambda error: logging.warn("error cleaning up incomplete "
+                "downloads: %s", error),
+            _remove_unused_incomplete_files,
+            'cleanup incomplete downloads',
+            download_dir, files_in_use, time.time())
 
 def kill_uploaders(*args):
     torrent_limit = app.config.get(prefs.UPSTREAM_TORRENT_LIMIT)
@@ -1023,6 +1097,77 @@ def _on_config_change(obj, key, value):
         kill_uploaders()
 
 
+class DownloadRestarter(object):
+    """Restarts the downloads from our last run a few at a time.
+
+    Each restart means loading fast resume data, announcing to trackers or
+    making HTTP range requests, so restarting hundreds of downloads at once
+    bogs down the downloader daemon.  Instead we restart up to the max number
+    of concurrent downloads at startup, then another group every
+    RESTART_INTERVAL seconds.  If downstream bandwidth for torrents is
+    limited and we're already using most of it, we only restart one
+    download per interval.
+
+    Downloads that the user started manually go first, then auto-downloads,
+    then uploads.  Downloads that the user starts while we're running don't
+    go through us at all, so they don't wait behind the restarts.
+    """
+
+    RESTART_INTERVAL = 2
+    # states that restart_on_startup_if_needed() might restart
+    RESTART_STATES = (u'downloading', u'offline', u'uploading')
+
+    def __init__(self, downloaders):
+        auto_downloader_ids = set(row[0] for row in models.Item.select(
+            ['downloader_id'],
+            'autoDownloaded AND downloader_id IS NOT NULL'))
+        def priority(downloader):
+            if downloader.get_state() == u'uploading':
+                return 2
+            elif downloader.id in auto_downloader_ids:
+                return 1
+            else:
+                return 0
+        # sorted() is stable, so we keep database order within each group
+        self.queue = collections.deque(sorted(downloaders, key=priority))
+        self.timeout = None
+
+    def start(self):
+        self._restart_batch()
+
+    def cancel(self):
+        if self.timeout is not None:
+            self.timeout.cancel()
+            self.timeout = None
+        self.queue.clear()
+
+    def batch_size(self):
+        if app.config.get(prefs.LIMIT_DOWNSTREAM_BT):
+            limit = app.config.get(prefs.DOWNSTREAM_BT_LIMIT_IN_KBS) * 1024
+            if app.download_state_manager.total_down_rate >= limit * 0.9:
+                return 1
+        return (app.config.get(prefs.MAX_MANUAL_DOWNLOADS) +
+                app.config.get(prefs.DOWNLOADS_TARGET))
+
+    def _restart_batch(self):
+        self.timeout = None
+        count = 0
+        batch_size = self.batch_size()
+        while self.queue and count < batch_size:
+            downloader = self.queue.popleft()
+            if not downloader.id_exists():
+                continue
+            # Only count downloaders that might restart.  Finished and
+            # stopped downloads are cheap, so we handle them right away.
+            if (downloader.get_state() in self.RESTART_STATES and
+                    not app.download_state_manager.get_download(
+                        downloader.dlid)):
+                count += 1
+            downloader.restart_on_startup_if_needed()
+        if self.queue:
+            self.timeout = eventloop.add_timeout(self.RESTART_INTERVAL,
+                    self._restart_batch, "restart downloads")
+
 class DownloadDaemonStarter(object):
     def __init__(self):
         RemoteDownloader.initialize_daemon()
@@ -1030,6 +1175,7 @@ class DownloadDaemonStarter(object):
         self.started = False
         self._config_callback_handle = None
         self._download_tracker = None
+        self.restarter = None
 
     def limit_uploaders(self):
         view = RemoteDownloader.auto_uploader_view()
@@ -1040,6 +1186,9 @@ class DownloadDaemonStarter(object):
         kill_uploaders()
 
     def disconnect_signals(self):
+        if self.restarter is not None:
+            self.restarter.cancel()
+            self.restarter = None
         if self._download_tracker is not None:
             self._download_tracker.unlink()
             self._download_tracker = None
@@ -1055,8 +1204,9 @@ class DownloadDaemonStarter(object):
         self.started = True
 
     def restart_downloads(self):
-        for downloader in self.downloads_at_startup:
-            downloader.restart_on_startup_if_needed()
+        self.restarter = DownloadRestarter(self.downloads_at_startup)
+        self.downloads_at_startup = None
+        self.restarter.start()
 
     def shutdown(self, callback):
         self.disconnect_signals()
@@ -452,6 +452,9 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
         self.searchTerm = search_term
         self.userTitle = None
         self.visible = True
+        # Subscriber sets this to False for feeds that it loads through the
+        # feed update queue
+        self.load_on_insert = True
         self.setup_common()
 
     def setup_restored(self):
@@ -462,6 +465,7 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
 
     def setup_common(self):
         self.create_signal('update-finished')
+        self.create_signal('load-finished')
         self.download = None
         self.wasUpdating = False
         self.inlineSearchTerm = None
@@ -531,7 +535,20 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
         return cls.make_view("origURL LIKE 'dtv:directoryfeed:%'")
 
     def on_db_insert(self):
-        self.generate_feed(True)
+        if self.load_on_insert:
+            self.generate_feed(True)
+
+    def start_initial_load(self):
+        """Start loading a new feed that was created with load_on_insert
+        set to False.
+
+        load-finished is emitted once we have downloaded the feed.
+        """
+        if self.id_exists():
+            self.generate_feed(True)
+        else:
+            # removed while it was waiting in the update queue
+            self.emit('load-finished')
 
     def in_folder(self):
         return self.folder_id is not None
@@ -577,17 +594,50 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
         if self.actualFeed:
             return self.actualFeed.clean_old_items()
 
+    _CACHED_COUNT_ATTRS = ('_num_available', '_num_unwatched',
+            '_num_downloaded', '_num_downloading')
+
     def invalidate_counts(self):
-        for cached_count_attr in ('_num_available', '_num_unwatched',
-                '_num_downloaded', '_num_downloading'):
+        for cached_count_attr in self._CACHED_COUNT_ATTRS:
             if cached_count_attr in self.__dict__:
                 del self.__dict__[cached_count_attr]
 
+    # ChannelInfo fields that depend on the item counts
+    COUNT_INFO_FIELDS = ('unwatched', 'available', 'num_downloaded',
+            'has_downloading')
+
     def recalc_counts(self):
         self.invalidate_counts()
-        self.signal_change(needs_save=False)
+        self.signal_info_change(self.COUNT_INFO_FIELDS)
         if self.in_folder():
-            self.get_folder().signal_change(needs_save=False)
+            self.get_folder().signal_info_change(self.COUNT_INFO_FIELDS)
+
+    @classmethod
+    def cache_counts(cls, feeds):
+        """Calculate the item counts for a group of feeds at once.
+
+        num_downloaded(), num_downloading(), num_unwatched() and
+        num_available() each run their own COUNT queries when their cached
+        value has been invalidated.  Call this before using them on lots of
+        feeds to calculate every missing count with a single query.
+        """
+        to_calc = [f for f in feeds if not f.has_cached_counts()]
+        if not to_calc:
+            return
+        counts = models.Item.feed_counts([f.id for f in to_calc])
+        for feed in to_calc:
+            (downloaded, downloading, unwatched, available,
+                    auto_pending) = counts.get(feed.id, (0, 0, 0, 0, 0))
+            feed._num_downloaded = downloaded
+            feed._num_downloading = downloading
+            feed._num_unwatched = unwatched
+            feed._num_available = available - auto_pending
+
+    def has_cached_counts(self):
+        for cached_count_attr in self._CACHED_COUNT_ATTRS:
+            if cached_count_attr not in self.__dict__:
+                return False
+        return True
 
     def num_downloaded(self):
         """Returns the number of downloaded items in the feed.
@@ -755,6 +805,11 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
             return u'off'
 
     def set_auto_download_mode(self, mode):
+        self._set_auto_download_attrs(mode)
+        self.signal_change()
+        self.signal_items()
+
+    def _set_auto_download_attrs(self, mode):
         # note that this is somewhat duplicated in setup_new
         if mode == u'all':
             self.getEverything = True
@@ -766,8 +821,30 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
             self.autoDownloadable = False
         else:
             raise ValueError("Bad auto-download mode: %s" % mode)
+
+    def set_initial_settings(self, title=None, auto_download_mode=None,
+            expiration=None, folder=None):
+        """Set the settings for a feed that was just created.
+
+        This does the work of set_title(), set_auto_download_mode(),
+        set_expiration() and set_folder(), but doesn't signal changes or
+        touch the feed's items, since a new feed doesn't have any.  Call it
+        right after creating the feed, inside a BulkSQLManager batch, so
+        that the feed gets inserted with its final settings.
+
+        :param expiration: (type, time) tuple, as used by set_expiration()
+        """
+        self.confirm_db_thread()
+        if title is not None:
+            self.userTitle = title
+        if auto_download_mode is not None:
+            self._set_auto_download_attrs(auto_download_mode)
+        if expiration is not None:
+            self.expire = expiration[0]
+            self.expireTime = timedelta(hours=expiration[1])
+        if folder is not None:
+            self.folder_id = folder.get_id()
         self.signal_change()
-        self.signal_items()
 
     def set_expiration(self, type_, time_):
         """Sets the expiration attributes. Valid types are u'system',
@@ -887,6 +964,7 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
             logging.debug("added async callback to create feed %s", self.origURL)
         if newFeed:
             self.finish_generate_feed(newFeed)
+            self.emit('load-finished')
 
     def is_watched_folder(self):
         return self.origURL.startswith("dtv:directoryfeed:")
@@ -924,6 +1002,7 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
     def _generate_feed_errback(self, error, removeOnError):
         if not self.id_exists():
             return
+        self.emit('load-finished')
         logging.warning("Couldn't load podcast at %s (%s)",
                         self.origURL, error)
         self._handle_feed_loading_error(error.getFriendlyDescription())
@@ -940,6 +1019,7 @@ class Feed(DDBObject, iconcache.IconCacheOwnerMixin):
 
         if not self.id_exists():
             return
+        self.emit('load-finished')
         if info['updated-url'] != self.origURL and \
                 not self.origURL.startswith('dtv:'): # we got redirected
             f = lookup_feed(info['updated-url'], self.searchTerm)
@@ -1208,8 +1288,64 @@ class ThrottledUpdateFeedImpl(FeedImpl):
                     self.update)
         else:
             if self.updateFreq > 0:
-                feedupdate.schedule_update(self.updateFreq, self.ufeed,
-                        self.update)
+                feedupdate.schedule_periodic_update(self.updateFreq,
+                        self.ufeed, self.update)
+
+    def cancel_update_events(self):
+        FeedImpl.cancel_update_events(self)
+        feedupdate.cancel_update(self.ufeed)
+
+    def on_remove(self):
+        feedupdate.forget_feed(self.ufeed)
+
+class _EnclosureIndex(object):
+    """Index of items by the values that
+    FeedParserValues.compare_to_item_enclosures() checks.
+
+    We use this in _create_items_for_parsed() to find items without an RSS
+    id that match an entry, without comparing every entry with every item.
+    Only items with the same enclosure values can match, since
+    compare_to_item() checks those values too.
+    """
+    def __init__(self):
+        # maps enclosure keys to lists of items
+        self.buckets = {}
+        # maps items to the key they're stored under
+        self.item_keys = {}
+        # items whose key we couldn't calculate or hash.  We always compare
+        # entries to these.
+        self.unindexed = []
+
+    def add(self, item):
+        try:
+            key = FeedParserValues.item_enclosure_key(item)
+            self.buckets.setdefault(key, []).append(item)
+        except StandardError:
+            self.unindexed.append(item)
+        else:
+            self.item_keys[item] = key
+
+    def update(self, item):
+        """Call this after an item's enclosure values may have changed."""
+        try:
+            old_key = self.item_keys.pop(item)
+        except KeyError:
+            # item is in self.unindexed, just leave it there
+            return
+        self.buckets[old_key].remove(item)
+        self.add(item)
+
+    def candidates(self, fp_values):
+        """Get the items that may match a FeedParserValues object."""
+        try:
+            key = fp_values.enclosure_key()
+            bucket = self.buckets.get(key, [])
+        except StandardError:
+            # couldn't hash the key, compare against everything
+            bucket = self.item_keys.keys()
+        # copy the list since update() may change it while the caller is
+        # iterating through it
+        return bucket + self.unindexed
 
 class RSSFeedImplBase(ThrottledUpdateFeedImpl):
     """
@@ -1239,6 +1375,7 @@ class RSSFeedImplBase(ThrottledUpdateFeedImpl):
 
     def create_items_for_parsed(self, parsed):
         """Update the feed using parsed XML passed in"""
+        self.new_item_count = 0
         app.bulk_sql_manager.start()
         try:
             self._create_items_for_parsed(parsed)
@@ -1266,13 +1403,14 @@ class RSSFeedImplBase(ThrottledUpdateFeedImpl):
 
         items_byid = {}
         items_byURLTitle = {}
-        items_nokey = []
+        items_nokey = _EnclosureIndex()
         for item in self.items:
             rate_limiter.check_for_sleep()
-            try:
-                items_byid[item.get_rss_id()] = item
-            except KeyError:
-                items_nokey.append(item)
+            rss_id = item.get_rss_id()
+            if rss_id is not None:
+                items_byid[rss_id] = item
+            else:
+                items_nokey.add(item)
             by_url_title_key = (item.url, item.entry_title)
             if by_url_title_key != (None, None):
                 items_byURLTitle[by_url_title_key] = item
@@ -1300,19 +1438,21 @@ class RSSFeedImplBase(ThrottledUpdateFeedImpl):
                         new = False
                         self.old_items.discard(item)
             if new:
-                for item in items_nokey:
+                for item in items_nokey.candidates(fp_values):
                     if fp_values.compare_to_item(item):
                         new = False
                     else:
                         try:
                             if fp_values.compare_to_item_enclosures(item):
                                 item.update_from_feed_parser_values(fp_values)
+                                items_nokey.update(item)
                                 new = False
                                 self.old_items.discard(item)
                         except StandardError:
                             pass
             if new and fp_values.first_video_enclosure is not None:
                 self._handle_new_entry(entry, fp_values, channel_title)
+                self.new_item_count += 1
 
     def _allow_feed_to_override_title(self):
         """Should the RSS feed override the default title?
@@ -1437,6 +1577,10 @@ class RSSFeedImpl(RSSFeedImplBase):
         self.parsed = parsed
         self.remember_old_items()
         self.create_items_for_parsed(parsed)
+        changed = (self.new_item_count > 0 or
+                getattr(self, 'validators_changed', True))
+        feedupdate.record_update_result(self.ufeed, changed)
+        self.validators_changed = True
 
         try:
             updateFreq = self.parsed["feed"]["ttl"]
@@ -1499,6 +1643,7 @@ class RSSFeedImpl(RSSFeedImplBase):
         if info.get('status') == 304:
             logging.debug("RSSFeedImpl: _update_callback: "
                           "status 304 (%s)", self.ufeed)
+            feedupdate.record_update_result(self.ufeed, False)
             self.schedule_update_events(-1)
             self.updating = False
             self.ufeed.signal_change()
@@ -1509,6 +1654,8 @@ class RSSFeedImpl(RSSFeedImplBase):
 
         # FIXME HTML can be non-unicode here --NN
         self.url = unicodify(info['updated-url'])
+        old_validators = (getattr(self, 'etag', None),
+                getattr(self, 'modified', None))
         if info.has_key('etag'):
             self.etag = unicodify(info['etag'])
         else:
@@ -1517,6 +1664,11 @@ class RSSFeedImpl(RSSFeedImplBase):
             self.modified = unicodify(info['last-modified'])
         else:
             self.modified = None
+        # feedparser_callback() uses this to figure out if the feed changed.
+        # If the server doesn't send an ETag or Last-Modified header, we
+        # only go by new items.
+        self.validators_changed = (old_validators !=
+                (self.etag, self.modified))
         self.call_feedparser(html)
 
     @returns_unicode
@@ -1530,6 +1682,7 @@ class RSSFeedImpl(RSSFeedImplBase):
         return u""
 
     def on_remove(self):
+        RSSFeedImplBase.on_remove(self)
         if self.download is not None:
             self.download.cancel()
             self.download = None
@@ -1672,6 +1825,7 @@ class RSSMultiFeedBase(RSSFeedImplBase):
         self.call_feedparser(html, url)
 
     def on_remove(self):
+        RSSFeedImplBase.on_remove(self)
         self._cancel_all_downloads()
 
     def _cancel_all_downloads(self):
@@ -1883,6 +2037,7 @@ class ScraperFeedImpl(ThrottledUpdateFeedImpl):
                 self.get_html(newURLs, depth, linkNumber)
 
     def on_remove(self):
+        ThrottledUpdateFeedImpl.on_remove(self)
         for download in self.downloads:
             download.cancel()
         self.downloads = set()
@@ -2698,6 +2853,15 @@ def lookup_feed(url, search_term=None):
     except ObjectNotFoundError:
         return None
 
+def all_feed_keys():
+    """Get a set of (url, search_term) tuples for all feeds.
+
+    This uses a single query, so it's better than calling lookup_feed() over
+    and over when checking lots of URLs.
+    """
+    return set(tuple(row) for row in
+            Feed.select(['origURL', 'searchTerm']))
+
 def remove_orphaned_feed_impls():
     removed_impls = []
     for klass in (FeedImpl, RSSFeedImpl, SavedSearchFeedImpl,
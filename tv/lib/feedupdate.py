@@ -31,14 +31,79 @@
 
 Our basic strategy is to limit the number of feeds that are
 simultaniously updating at any given time.  Right now the limit is set
-to 3.
+to 6, with at most 2 feeds from any one host updating at once.
+
+We also adapt how often feeds get updated to how often they change.  Each
+time a feed update finishes, the feed reports whether the update found new
+content (see record_update_result()).  Feeds that don't change get updated
+less and less often, up to the MAX_CHANNEL_CHECK_INTERVAL_X_MN pref.  As
+soon as a feed changes, we go back to updating it at its normal interval.
+
+New feeds from a subscription import also go through the queue (see
+load_feeds()), so importing a big OPML file doesn't start downloading
+every feed at once.
 """
 
 import collections
+import logging
+import urlparse
 
+from miro import app
 from miro import eventloop
+from miro import prefs
+
+MAX_UPDATES = 6
+MAX_UPDATES_PER_HOST = 2
+
+# How much we multiply the update interval by after each update that
+# didn't find new content.
+BACKOFF_FACTOR = 2
+# Limit for the multiplier.  The interval is also limited by the
+# MAX_CHANNEL_CHECK_INTERVAL_X_MN pref, this just keeps the number sane.
+MAX_MULTIPLIER = 1024
+
+def _get_host(feed):
+    try:
+        url = feed.get_url()
+    except StandardError:
+        return ''
+    if not url:
+        return ''
+    return urlparse.urlparse(url)[1].lower()
+
+class UpdateIntervalTracker(object):
+    """Tracks how often feeds change and calculates their update intervals.
+
+    This is only stored in memory, so after a restart all feeds start out
+    being updated at their normal interval again.
+    """
+    def __init__(self):
+        # maps feed ids to the multiplier for their update interval
+        self.multipliers = {}
+
+    def record_update_result(self, feed_id, changed):
+        if changed:
+            self.multipliers.pop(feed_id, None)
+        else:
+            multiplier = self.multipliers.get(feed_id, 1) * BACKOFF_FACTOR
+            self.multipliers[feed_id] = min(multiplier, MAX_MULTIPLIER)
+
+    def forget_feed(self, feed_id):
+        self.multipliers.pop(feed_id, None)
 
-MAX_UPDATES = 3
+    def calc_interval(self, feed_id, base_interval, max_interval):
+        """Calculate the update interval for a feed.
+
+        :param base_interval: normal interval for the feed, in seconds.  This
+            is also the minimum interval.
+        :param max_interval: maximum interval for the feed, in seconds.  If
+            this is less than 0, we always use base_interval.
+        """
+        multiplier = self.multipliers.get(feed_id, 1)
+        if max_interval < 0 or multiplier == 1:
+            return base_interval
+        interval = min(base_interval * multiplier, max_interval)
+        return max(interval, base_interval)
 
 class FeedUpdateQueue(object):
     def __init__(self):
@@ -46,12 +111,38 @@ class FeedUpdateQueue(object):
         self.timeouts = {}
         self.callback_handles = {}
         self.currently_updating = set()
+        # maps hosts to the number of feeds from that host that are updating
+        self.host_counts = collections.defaultdict(int)
+        self.update_hosts = {}
+        self.interval_tracker = UpdateIntervalTracker()
+        # ids of feeds in update_queue for their initial load, rather than
+        # an update.  These signal load-finished instead of update-finished.
+        self.initial_loads = set()
 
     def schedule_update(self, delay, feed, update_callback):
         name = "Feed update (%s)" % feed.get_title()
         self.timeouts[feed.id] = eventloop.add_timeout(delay, self.do_update, 
                 name, args=(feed, update_callback))
 
+    def schedule_periodic_update(self, base_interval, feed, update_callback):
+        """Schedule the next regular update for a feed.
+
+        This works like schedule_update(), but the delay gets lengthened if
+        the feed hasn't changed in a while.
+        """
+        max_interval = app.config.get(prefs.MAX_CHANNEL_CHECK_INTERVAL_X_MN)
+        if max_interval > 0:
+            max_interval *= 60
+        delay = self.interval_tracker.calc_interval(feed.id, base_interval,
+                max_interval)
+        if delay != base_interval:
+            logging.debug("feed unchanged, delaying update to %s seconds "
+                    "(%s)", delay, feed.get_title())
+        self.schedule_update(delay, feed, update_callback)
+
+    def record_update_result(self, feed, changed):
+        self.interval_tracker.record_update_result(feed.id, changed)
+
     def cancel_update(self, feed):
         try:
             timeout = self.timeouts.pop(feed.id)
@@ -60,31 +151,65 @@ class FeedUpdateQueue(object):
         else:
             timeout.cancel()
 
+    def forget_feed(self, feed):
+        self.cancel_update(feed)
+        self.interval_tracker.forget_feed(feed.id)
+
     def do_update(self, feed, update_callback):
         del self.timeouts[feed.id]
         self.update_queue.append((feed, update_callback))
         self.run_update_queue()
 
+    def load_feeds(self, feeds):
+        for feed in feeds:
+            self.initial_loads.add(feed.id)
+            self.update_queue.append((feed, feed.start_initial_load))
+        self.run_update_queue()
+
     def update_finished(self, feed):
         for callback_handle in self.callback_handles.pop(feed.id):
             feed.disconnect(callback_handle)
         self.currently_updating.remove(feed)
+        host = self.update_hosts.pop(feed.id)
+        self.host_counts[host] -= 1
+        if self.host_counts[host] <= 0:
+            del self.host_counts[host]
         # call run_update_queue in an idle to avoid re-updating the feed that
         # just finished.  That could cause weird effects since we are in the
         # update-finished callback right now.  See #16277
         eventloop.add_idle(self.run_update_queue, 'run feed update queue')
 
+    def _host_available(self, host):
+        # feeds without a host (for example search feeds) are only limited
+        # by MAX_UPDATES
+        return not host or self.host_counts[host] < MAX_UPDATES_PER_HOST
+
     def run_update_queue(self):
+        # feeds that we can't start because their host is busy.  These stay
+        # at the front of the queue.
+        waiting = []
         while (len(self.update_queue) > 0 and 
                len(self.currently_updating) < MAX_UPDATES):
             feed, update_callback = self.update_queue.popleft()
             if feed in self.currently_updating:
                 continue
-            handle = feed.connect('update-finished', self.update_finished)
+            host = _get_host(feed)
+            if not self._host_available(host):
+                waiting.append((feed, update_callback))
+                continue
+            if feed.id in self.initial_loads:
+                self.initial_loads.remove(feed.id)
+                handle = feed.connect('load-finished', self.update_finished)
+            else:
+                handle = feed.connect('update-finished',
+                        self.update_finished)
             handle2 = feed.connect('removed', self.update_finished)
             self.callback_handles[feed.id] = (handle, handle2)
             self.currently_updating.add(feed)
+            self.update_hosts[feed.id] = host
+            self.host_counts[host] += 1
             update_callback()
+        self.update_queue.extendleft(reversed(waiting))
 
 global_update_queue = FeedUpdateQueue()
 
@@ -92,8 +217,38 @@ def cancel_update(feed):
     """Cancel any pending updates for feed."""
     global_update_queue.cancel_update(feed)
 
+def forget_feed(feed):
+    """Cancel any pending updates for feed and forget how often it's been
+    changing.  Call this when a feed is removed.
+    """
+    global_update_queue.forget_feed(feed)
+
 def schedule_update(delay, feed, update_callback):
     """Schedules a feed to be updated sometime around delay seconds in
     the future.
     """
     global_update_queue.schedule_update(delay, feed, update_callback)
+
+def schedule_periodic_update(base_interval, feed, update_callback):
+    """Schedules the next regular update for a feed.
+
+    The update will happen base_interval seconds in the future, or later if
+    the feed hasn't been changing.
+    """
+    global_update_queue.schedule_periodic_update(base_interval, feed,
+            update_callback)
+
+def load_feeds(feeds):
+    """Start the initial loads for a group of new feeds.
+
+    The feeds should be created with load_on_insert set to False.  The loads
+    are limited by MAX_UPDATES and MAX_UPDATES_PER_HOST, just like updates.
+    """
+    global_update_queue.load_feeds(feeds)
+
+def record_update_result(feed, changed):
+    """Record whether an update for a feed found new content.
+
+    This is used to decide how long to wait before the next update.
+    """
+    global_update_queue.record_update_result(feed, changed)
@@ -150,7 +150,9 @@ class ChannelFolder(FolderBase):
         """Returns number of unwatched items in feed.
         """
         unwatched = 0
-        for child in self.get_children_view():
+        children = list(self.get_children_view())
+        feed.Feed.cache_counts(children)
+        for child in children:
             unwatched += child.num_unwatched()
         return unwatched
 
@@ -158,7 +160,9 @@ class ChannelFolder(FolderBase):
         """Returns number of available items in feed
         """
         available = 0
-        for child in self.get_children_view():
+        children = list(self.get_children_view())
+        feed.Feed.cache_counts(children)
+        for child in children:
             available += child.num_available()
         return available
 
@@ -197,6 +201,10 @@ class PlaylistFolderItemMap(playlist.PlaylistItemMap):
         except ObjectNotFoundError:
             cls(playlist_id, item_id)
 
+    @classmethod
+    def already_added(cls, map_):
+        map_.inc_count()
+
     @classmethod
     def remove_item_id(cls, playlist_id, item_id):
         view = cls.make_view('playlist_id=? AND item_id=?',
@@ -37,6 +37,7 @@ from miro import dialogs
 from miro import eventloop
 from miro import item
 from miro import folder
+from miro import startup
 from miro import tabs
 from miro.frontends.cli import clidialog
 from miro.plat import resources
@@ -130,6 +131,13 @@ class MiroInterpreter(cmd.Cmd):
         """quit -- Quits Miro cli."""
         self.quit_flag = True
 
+    def do_startuptimes(self, line):
+        """startuptimes -- Shows how long each part of startup took."""
+        for name, phase_time, in_thread in startup.get_phase_times():
+            if in_thread:
+                name += " (in thread)"
+            print " * %-40s %.3fs" % (name, phase_time)
+
     @run_in_event_loop
     def do_feed(self, line):
         """feed <name> -- Selects a feed by name."""
@@ -64,6 +64,8 @@ def pick_test():
         ProfileItemViewAdd,
         ProfileItemViewRemove,
         ProfileItemViewResort,
+        ProfileItemViewToggleFilters,
+        ProfileItemViewProgressUpdates,
     ]
     labels = [c.friendly_name() for c in choices]
     index = dialogs.ask_for_choice('Pick Test',
@@ -250,7 +252,8 @@ class ProfileItemView(ProfiledCode):
         retval = []
         for x in xrange(count):
             item_info = messages.ItemInfo.__new__(messages.ItemInfo)
-            item_info.__dict__ = item_info_template.copy()
+            for name, value in item_info_template.iteritems():
+                setattr(item_info, name, value)
             self.mutate_item(item_info)
             item_info.id = self.id_counter.next()
             retval.append(item_info)
@@ -312,3 +315,55 @@ class ProfileItemViewResort(ProfileItemView):
     def profiled_code(self):
         self.item_list.set_sort(itemlist.NameSort(False))
         self.item_view.model_changed()
+
+class ProfileItemViewToggleFilters(ProfileItemView):
+    initial_items = 10000
+
+    @classmethod
+    def friendly_name(cls):
+        return "Profile toggling filters with lots of items"
+
+    def set_up(self):
+        ProfileItemView.set_up(self)
+        # mark some of the items as downloaded video so that the filters
+        # have something to do
+        items = self.item_list.get_items()
+        for i, item in enumerate(items):
+            if i % 3:
+                item.video_path = '/fake/path/%d.mov' % i
+                item.downloaded = True
+            if i % 2:
+                item.file_type = u'video'
+            else:
+                item.file_type = u'audio'
+        self.item_list.update_items(items)
+
+    def profiled_code(self):
+        for x in xrange(10):
+            for key in (u'downloaded', u'video', u'audio', u'all'):
+                self.item_list.select_filter(key)
+                self.item_list.recalculate_hidden_items()
+                self.item_view.model_changed()
+
+class ProfileItemViewProgressUpdates(ProfileItemView):
+    initial_items = 60000
+
+    @classmethod
+    def friendly_name(cls):
+        return "Profile updating a few items in a big list"
+
+    def set_up(self):
+        ProfileItemView.set_up(self)
+        self.item_list.set_resort_on_update(True)
+
+    def profiled_code(self):
+        items = self.item_list.get_items()
+        for x in xrange(20):
+            changed = random.sample(items, 200)
+            # only some of the changes move the item in the list
+            for item in changed[:20]:
+                item.release_date += datetime.timedelta(days=1)
+            for item in changed[20:]:
+                item.size += 1
+            self.item_list.update_items(changed)
+            self.item_view.model_changed()
@@ -40,12 +40,14 @@ import stat
 from miro.gtcache import gettext as _
 
 from miro.plat.frontends.widgets import widgetset
+from miro.frontends.widgets import imagepool
 from miro.frontends.widgets import widgetutil
 from miro.frontends.widgets import widgetconst
 from miro.frontends.widgets.dialogs import MainDialog
 from miro.dialogs import BUTTON_OK
 
 from miro import app
+from miro import iconcache
 from miro import prefs
 from miro import util
 
@@ -76,6 +78,11 @@ def get_database_object_count():
     # should be a read-only endeavor, so it should be ok.
     return app.db.persistent_object_count()
 
+def get_icon_queue_size():
+    stats = iconcache.icon_cache_updater.get_stats()
+    return (stats['queued_visible'] + stats['queued_vital'] +
+            stats['queued_idle'])
+
 SEPARATOR = None
 SHOW = _("Show")
 
@@ -130,6 +137,11 @@ def run_dialog():
                  get_database_size(), "0B", False)},
             {"label": _("Total db objects in memory:"),
              "data": lambda: "%d" % get_database_object_count()},
+            {"label": _("Image cache memory:"),
+             "data": lambda: util.format_size_for_user(
+                 imagepool.get_memory_usage(), "0B", False)},
+            {"label": _("Icon downloads queued:"),
+             "data": lambda: "%d" % get_icon_queue_size()},
 
             SEPARATOR,
 
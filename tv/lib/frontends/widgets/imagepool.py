@@ -33,6 +33,11 @@ filenames.
 imagepool handles creating Image and ImageSurface objects for image
 filenames.  It caches Image/ImageSurface objecsts so to avoid re-creating
 them.
+
+The caches are limited by the memory that the decoded images use, not just
+by the number of images.  Scaled images are created from the full-sized
+image if it's in the cache.  We don't cache the full-sized image when only
+scaled versions are asked for, since that's usually much bigger.
 """
 
 import logging
@@ -45,6 +50,16 @@ from miro.plat.frontends.widgets import widgetset
 broken_image = widgetset.Image(resources.path('images/broken-image.gif'))
 
 CACHE_SIZE = 2000 # number of objects to keep in memory
+# max bytes of decoded image data to keep in memory for each cache
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+SURFACE_CACHE_BYTES = 64 * 1024 * 1024
+
+def decoded_size(image):
+    """Estimate how many bytes of memory an Image or ImageSurface uses.
+
+    We assume 4 bytes per pixel, which is what an ARGB image takes up.
+    """
+    return int(image.width) * int(image.height) * 4
 
 def resize_image(image, dest_width, dest_height, upsize_threshold=1.5):
     # handle corner case of empty dest
@@ -85,25 +100,73 @@ def resize_one_dimension(image, width_scale, height_scale,
     # okay, give up on scaling and just return the image
     return image
 
+def load_image(path):
+    try:
+        return widgetset.Image(path)
+    except StandardError:
+        logging.warn("error loading image %s:\n%s", path,
+                traceback.format_exc())
+        return broken_image
+
 class ImagePool(util.Cache):
+    def get(self, key):
+        path, size = key
+        if size is not None and key not in self and (path, None) in self:
+            # scale the full-sized image rather than loading the file again
+            image = self.get_cached((path, None))
+            resized = resize_image(image, *size)
+            if resized is image:
+                # resize_image() returned the image as-is.  Don't store it
+                # under a second key, or it would count twice against
+                # IMAGE_CACHE_BYTES.
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.set(key, resized)
+            return resized
+        return util.Cache.get(self, key)
+
     def create_new_value(self, (path, size)):
-        try:
-            image = widgetset.Image(path)
-        except StandardError:
-            logging.warn("error loading image %s:\n%s", path,
-                    traceback.format_exc())
-            image = broken_image
+        # If we only need a scaled image, don't keep the full-sized one
+        # around.
+        image = load_image(path)
         if size is not None:
             image = resize_image(image, *size)
         return image
 
+    def sizeof(self, key, image):
+        if image is broken_image:
+            # broken_image is always in memory, don't count it
+            return 0
+        return decoded_size(image)
+
 class ImageSurfacePool(util.Cache):
     def create_new_value(self, (path, size)):
         image = _imagepool.get((path, size))
         return widgetset.ImageSurface(image)
 
-_imagepool = ImagePool(CACHE_SIZE)
-_image_surface_pool = ImageSurfacePool(CACHE_SIZE)
+    def sizeof(self, key, surface):
+        return decoded_size(surface)
+
+_imagepool = ImagePool(CACHE_SIZE, IMAGE_CACHE_BYTES)
+_image_surface_pool = ImageSurfacePool(CACHE_SIZE, SURFACE_CACHE_BYTES)
+
+def get_stats():
+    """Get statistics about the image caches.
+
+    Returns a dict that maps 'images' and 'surfaces' to the stats for those
+    caches (see util.Cache.get_stats()).  The weight value is the number of
+    bytes of decoded image data in the cache.
+    """
+    return {
+        'images': _imagepool.get_stats(),
+        'surfaces': _image_surface_pool.get_stats(),
+    }
+
+def get_memory_usage():
+    """Get the total bytes of decoded image data that we're holding on to.
+    """
+    return _imagepool.total_weight + _image_surface_pool.total_weight
 
 def get(path, size=None):
     """Returns an Image for path.
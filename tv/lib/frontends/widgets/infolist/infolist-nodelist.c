@@ -341,6 +341,7 @@ infolist_nodelist_ensure_index_lookup(InfoListNodeList* nodelist)
                 nodelist->index_lookup[i] = node;
                 node = node->next;
         }
+        nodelist->index_lookup_dirty = 0;
         return 0;
 }
 
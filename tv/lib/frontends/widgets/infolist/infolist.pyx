@@ -178,6 +178,32 @@ cdef InfoListNode* insert_node_before(InfoListNodeList* nodelist,
     infolist_nodelist_insert_after(nodelist, pos, node)
     return pos
 
+cdef InfoListNode* find_insert_pos(InfoListNodeList* nodelist,
+        InfoListNode* node, int reverse) except NULL:
+    # Binary search for the position to insert node into nodelist.  Returns
+    # the node that it should be inserted before, which will be the end
+    # sentinal if it belongs at the end of the list.
+    #
+    # This uses infolist_nodelist_nth_node(), so it's only fast as long as
+    # the list doesn't change between calls.
+    cdef int cmp_result, low, high, middle
+
+    low = 0
+    high = nodelist.node_count
+    while low < high:
+        middle = (low + high) >> 1
+        cmp_result = infolist_node_cmp(node,
+                infolist_nodelist_nth_node(nodelist, middle))
+        if reverse:
+            cmp_result *= -1
+        if cmp_result > 0:
+            low = middle + 1
+        else:
+            high = middle
+    if low == nodelist.node_count:
+        return infolist_nodelist_tail(nodelist).next
+    return infolist_nodelist_nth_node(nodelist, low)
+
 cdef int update_sort_key(InfoListNode* node, object new_sort_key, int reverse):
     # Update node's sort key, then return TRUE if the node is now out of place
     # in the list.
@@ -339,12 +365,12 @@ cdef class InfoList:
         """
 
         cdef InfoListNode** node_array # stores the nodes we will update
-        cdef InfoListNode* pos
+        cdef InfoListNode** pos_array # stores where moved nodes will go
         cdef InfoListNode* node
         cdef int count, move_count, reverse
         cdef object sort_key
 
-        node_array = NULL
+        node_array = pos_array = NULL
         count = len(infos)
         node_array = <InfoListNode**>PyMem_Malloc(
                 sizeof(InfoListNode*) * count)
@@ -375,18 +401,27 @@ cdef class InfoList:
                     move_count += 1
             if move_count == 0:
                 return
-            # remove infos, sort them, then re-enter them
+            # remove the nodes that moved, then binary search for their new
+            # positions.  We calculate all the positions before inserting
+            # anything so that the index lookup only gets built once.
+            pos_array = <InfoListNode**>PyMem_Malloc(
+                    sizeof(InfoListNode*) * move_count)
             infolistplat_will_reorder_nodes(self.nodelist)
             for 0 <= i < move_count:
                 infolist_nodelist_remove(self.nodelist, node_array[i])
-            self.sort_nodes_reversed(node_array, move_count)
-            pos = infolist_nodelist_tail(self.nodelist)
+            self.sort_nodes(node_array, move_count)
             for 0 <= i < move_count:
-                pos = insert_node_before(self.nodelist, node_array[i], pos,
+                pos_array[i] = find_insert_pos(self.nodelist, node_array[i],
                         reverse)
+            # node_array is sorted, so nodes that go into the same spot end
+            # up in the right order.
+            for 0 <= i < move_count:
+                infolist_nodelist_insert_before(self.nodelist, pos_array[i],
+                        node_array[i])
             infolistplat_nodes_reordered(self.nodelist)
         finally:
             PyMem_Free(node_array)
+            PyMem_Free(pos_array)
 
     def remove_ids(self, id_list):
         """Remove objects from the list.
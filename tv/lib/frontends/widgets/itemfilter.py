@@ -51,6 +51,8 @@ class ItemFilter(object):
       - define user_label
       - define the filter() method()
       - (optionally) override the switch_to_filter() method
+      - (optionally) override match_info() and extra_ids() if filter()
+        depends on something besides the ItemInfo
     """
     key = None
 
@@ -63,6 +65,23 @@ class ItemFilter(object):
         """
         raise NotImplementedError()
 
+    def match_info(self, item_info):
+        """Check if item_info matches based only on its own data.
+
+        ItemList stores the result of this for each item so that it doesn't
+        need to re-run the filter when the user toggles filters.  The result
+        must only change when item_info does.
+
+        By default this is the same as filter().
+        """
+        return self.filter(item_info)
+
+    def extra_ids(self):
+        """Get ids of items that pass filter() even though match_info()
+        returns False for them.
+        """
+        return ()
+
     def switch_to_filter(self, previous_filters):
         """select/deselect filters when this one is selected
 
@@ -145,6 +164,30 @@ class ItemFilterSet(object):
                 return False
         return True
 
+    def matching_ids(self, member_sets):
+        """Calculate the ids that pass all active filters.
+
+        :param member_sets: dict mapping filter keys to the set of ids that
+            match_info() returned True for.  It must have an entry for each
+            active filter.
+        :returns: set of ids that should be included in the item list, or
+            None if no filters are active.  The set may contain ids from
+            extra_ids() that aren't in the list at all.
+        """
+        matching = None
+        sets = [(member_sets[f.key], f) for f in self.active_filter_objects]
+        # start with the smallest set, this keeps the intersections cheap
+        sets.sort(key=lambda (members, f): len(members))
+        for members, f in sets:
+            extra = [id_ for id_ in f.extra_ids() if id_ not in members]
+            if extra:
+                members = members.union(extra)
+            if matching is None:
+                matching = set(members)
+            else:
+                matching.intersection_update(members)
+        return matching
+
 # define the actual filter classes we use
 
 class ItemFilterAll(ItemFilter):
@@ -175,8 +218,18 @@ class ItemFilterUnplayed(ItemFilterAudioVideoHelper):
 
     def filter(self, item_info):
         return (app.playback_manager.is_playing_item(item_info) or
-                (item_info.video_path is not None and not
-                    item_info.video_watched))
+                self.match_info(item_info))
+
+    def match_info(self, item_info):
+        return (item_info.video_path is not None and
+                not item_info.video_watched)
+
+    def extra_ids(self):
+        # keep the currently playing item around, even if it's been watched
+        playing = app.playback_manager.get_playing_item()
+        if playing is None:
+            return ()
+        return (playing.id,)
 
 class ItemFilterDownloaded(ItemFilterAudioVideoHelper):
     """Filter for downloaded items."""
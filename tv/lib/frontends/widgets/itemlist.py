@@ -450,6 +450,12 @@ class ItemList(object):
         # maps ids -> items that are this list, but are filtered by our
         # ItemFilters
         self._hidden_items = {}
+        # ids of items that are in our model
+        self._shown_ids = set()
+        # maps filter keys -> set of ids that match that filter.  We create
+        # these when a filter first becomes active, then keep them up to date
+        # as items change.  This way changing filters is just set math.
+        self._member_sets = {}
 
     def set_sort(self, sorter):
         self._sorter = sorter
@@ -482,23 +488,28 @@ class ItemList(object):
         """Get a TableView iter object for an id."""
         return self.model.iter_for_id(id_)
 
+    def _index_of_id(self, start_id):
+        """Get the position of start_id in the model.
+
+        If start_id isn't in the list, we return the last position.
+        """
+        try:
+            return self.model.index_of_id(start_id)
+        except KeyError:
+            return max(len(self.model) - 1, 0)
+
     def get_items(self, start_id=None):
         """Get a list of ItemInfo objects in this list"""
         rv = self.model.info_list()
         if start_id is not None:
-            for idx in xrange(len(rv)):
-                if rv[idx].id == start_id:
-                    break
-            return rv[idx:]
+            return rv[self._index_of_id(start_id):]
         return rv
 
     def iter_items(self, start_id=None):
         """Iterate through ItemInfo objects in this list"""
         info_list = self.model.info_list()
         if start_id is not None:
-            for start_id_index in xrange(len(info_list)):
-                if info_list[start_id_index].id == start_id:
-                    break
+            start_id_index = self._index_of_id(start_id)
         else:
             start_id_index = 0
         for i in xrange(start_id_index, len(info_list)):
@@ -532,8 +543,37 @@ class ItemList(object):
         if len(to_add) == 0:
             return
         self.model.add_infos(to_add)
+        self._shown_ids.update(info.id for info in to_add)
+
+    def _remove_ids(self, id_list):
+        if len(id_list) == 0:
+            return
+        self.model.remove_ids(id_list)
+        self._shown_ids.difference_update(id_list)
+
+    def _update_member_sets(self, item_list):
+        for key, members in self._member_sets.iteritems():
+            match_info = itemfilter.ItemFilter.get_filter(key).match_info
+            for info in item_list:
+                if match_info(info):
+                    members.add(info.id)
+                else:
+                    members.discard(info.id)
+
+    def _ensure_member_sets(self):
+        """Make sure we have a member set for each active filter."""
+        missing = [key for key in self.filter_set.active_filters
+                   if key not in self._member_sets]
+        if not missing:
+            return
+        all_items = self.model.info_list() + self._hidden_items.values()
+        for key in missing:
+            match_info = itemfilter.ItemFilter.get_filter(key).match_info
+            self._member_sets[key] = set(info.id for info in all_items
+                                         if match_info(info))
 
     def add_items(self, item_list):
+        self._update_member_sets(item_list)
         to_add = []
         for item in item_list:
             if self.filter_set.filter(item):
@@ -543,6 +583,7 @@ class ItemList(object):
         self._insert_items(to_add)
 
     def update_items(self, changed_items):
+        self._update_member_sets(changed_items)
         to_add = []
         to_remove = []
         to_update = []
@@ -564,7 +605,7 @@ class ItemList(object):
                     to_update.append(info)
         self._insert_items(to_add)
         self.model.update_infos(to_update, resort=self.resort_on_update)
-        self.model.remove_ids(to_remove)
+        self._remove_ids(to_remove)
 
     def remove_items(self, id_list):
         ids_in_model = []
@@ -573,12 +614,16 @@ class ItemList(object):
                 del self._hidden_items[id_]
             else:
                 ids_in_model.append(id_)
-        self.model.remove_ids(ids_in_model)
+        self._remove_ids(ids_in_model)
+        for members in self._member_sets.itervalues():
+            members.difference_update(id_list)
 
     def remove_all(self):
         """Remove items from the list."""
         self.model.remove_all()
         self._hidden_items = {}
+        self._shown_ids = set()
+        self._member_sets = {}
 
     def select_filter(self, key):
         self.filter_set.select(key)
@@ -590,22 +635,27 @@ class ItemList(object):
         return self.filter_set.active_filters
 
     def recalculate_hidden_items(self):
-        info_list_at_start = self.model.info_list()
-
-        newly_matching = []
-        for item in self._hidden_items.values():
-            if self.filter_set.filter(item):
-                newly_matching.append(item)
-                del self._hidden_items[item.id]
+        self._ensure_member_sets()
+        matching = self.filter_set.matching_ids(self._member_sets)
+        if matching is None:
+            # no filters active, everything matches
+            to_show = self._hidden_items.keys()
+            to_hide = []
+        else:
+            if len(matching) < len(self._hidden_items):
+                to_show = [id_ for id_ in matching
+                           if id_ in self._hidden_items]
+            else:
+                to_show = [id_ for id_ in self._hidden_items
+                           if id_ in matching]
+            to_hide = list(self._shown_ids.difference(matching))
+
+        newly_matching = [self._hidden_items.pop(id_) for id_ in to_show]
+        for id_ in to_hide:
+            self._hidden_items[id_] = self.model.get_info(id_)
+        self._remove_ids(to_hide)
         self._insert_items(newly_matching)
 
-        newly_unmatching_ids = []
-        for item in info_list_at_start:
-            if not self.filter_set.filter(item):
-                newly_unmatching_ids.append(item.id)
-                self._hidden_items[item.id] = item
-        self.model.remove_ids(newly_unmatching_ids)
-
     def move_items(self, insert_before, item_ids):
         """Move a group of items inside the list.
 
@@ -28,26 +28,65 @@
 # statement from all source files in the program, then also delete it here.
 
 import os
+import re
 import logging
 import collections
+import hashlib
+import urlparse
 
 from miro import httpclient
 from miro import eventloop
 from miro.database import DDBObject, ObjectNotFoundError
 from miro.download_utils import next_free_filename, get_file_url_path
 from miro.util import unicodify
-from miro.plat.utils import unicode_to_filename
+from miro.plat.utils import unicode_to_filename, filename_to_unicode
 from miro import app
 from miro import prefs
 from miro import fileutil
 
-RUNNING_MAX = 3
+def _get_host(url):
+    if url is None or url.startswith(u"/") or url.startswith(u"file://"):
+        return ''
+    return urlparse.urlparse(url)[1].lower()
 
 class IconCacheUpdater:
+    """Schedules icon updates.
+
+    The number of icons we download at once is limited by the
+    ICON_CACHE_MAX_FETCHES pref.  Only ICON_CACHE_MAX_FETCHES_PER_HOST of
+    those can be from the same host, so a single slow host can't hold up the
+    others.  Icons that are waiting for a busy host don't hold up icons
+    behind them in the queue.
+
+    IconCache objects that want the same URL share one download.  Those
+    don't count against the limits, since they don't make a new connection.
+
+    Updates are run in priority order: icons for items that the frontend is
+    displaying, then vital icons, then everything else.
+    """
+
+    # names of our queues, in priority order
+    QUEUE_NAMES = ('visible', 'vital', 'idle')
+
     def __init__(self):
-        self.idle = collections.deque()
-        self.vital = collections.deque()
-        self.running_count = 0
+        self.queues = dict((name, collections.deque())
+                for name in self.QUEUE_NAMES)
+        # maps IconCache objects waiting in a queue to the name of the queue
+        # they're in.  We don't remove objects from the middle of the
+        # queues, instead we skip them if their entry here doesn't match.
+        self.queued = {}
+        # ids of the items that the frontend is displaying
+        self.visible_ids = set()
+        # maps running IconCache objects to the URL they're updating from
+        self.running = {}
+        # maps URLs to the number of running IconCache objects using them
+        self.running_urls = collections.defaultdict(int)
+        # maps hosts to the set of URLs we're updating from on that host
+        self.host_urls = collections.defaultdict(set)
+        # maps URLs that we're downloading to lists of (callback, errback)
+        # tuples
+        self.in_flight = {}
+        self.run_queue_scheduled = False
         self.in_shutdown = False
 
     def request_update(self, item, is_vital=False):
@@ -56,33 +95,165 @@ class IconCacheUpdater:
             if (item.filename and fileutil.access(item.filename, os.R_OK)
                    and item.url == item.dbItem.get_thumbnail_url()):
                 is_vital = False
-        if self.running_count < RUNNING_MAX:
-            eventloop.add_idle(item.request_icon, "Icon Request")
-            self.running_count += 1
+        if item in self.running:
+            if item.updating:
+                item.needsUpdate = True
+            # otherwise, request_icon() hasn't run yet so there's nothing to
+            # do.
+            return
+        if self._is_visible(item):
+            queue_name = 'visible'
+        elif is_vital:
+            queue_name = 'vital'
         else:
-            if is_vital:
-                self.vital.append(item)
-            else:
-                self.idle.append(item)
-
-    def update_finished(self):
+            queue_name = 'idle'
+        current_queue_name = self.queued.get(item)
+        if (current_queue_name is not None and
+                self._queue_rank(current_queue_name) <=
+                self._queue_rank(queue_name)):
+            # already queued with at least this priority
+            return
+        self._enqueue(item, queue_name)
+        # Don't run the queue here.  IconCache.setup_new() calls us before
+        # the database object has finished its own setup_new(), so we can't
+        # call get_update_url() yet.
+        self._schedule_run_queue()
+
+    def _schedule_run_queue(self):
+        if not self.run_queue_scheduled:
+            self.run_queue_scheduled = True
+            eventloop.add_idle(self._run_scheduled_queue,
+                    "Run icon cache queue")
+
+    def _run_scheduled_queue(self):
+        self.run_queue_scheduled = False
+        self._run_queue()
+
+    def _enqueue(self, item, queue_name):
+        self.queued[item] = queue_name
+        self.queues[queue_name].append(item)
+
+    def _is_visible(self, item):
+        try:
+            return item.dbItem.id in self.visible_ids
+        except AttributeError:
+            return False
+
+    def _queue_rank(self, queue_name):
+        return self.QUEUE_NAMES.index(queue_name)
+
+    def _can_start(self, url):
+        if url in self.running_urls:
+            # we'll share the download with the running update
+            return True
+        if len(self.running_urls) >= app.config.get(
+                prefs.ICON_CACHE_MAX_FETCHES):
+            return False
+        host = _get_host(url)
+        return (not host or len(self.host_urls[host]) <
+                app.config.get(prefs.ICON_CACHE_MAX_FETCHES_PER_HOST))
+
+    def _run_queue(self):
         if self.in_shutdown:
-            self.running_count -= 1
             return
+        for queue_name in self.QUEUE_NAMES:
+            queue = self.queues[queue_name]
+            # items that we can't start because their host is busy.  These
+            # stay at the front of the queue.
+            waiting = []
+            while len(queue) > 0:
+                item = queue.popleft()
+                if self.queued.get(item) != queue_name:
+                    # item was moved to another queue or already started
+                    continue
+                url = item.get_update_url()
+                if self._can_start(url):
+                    del self.queued[item]
+                    self._start(item, url)
+                else:
+                    waiting.append(item)
+                    if len(self.running_urls) >= app.config.get(
+                            prefs.ICON_CACHE_MAX_FETCHES):
+                        break
+            queue.extendleft(reversed(waiting))
+
+    def _start(self, item, url):
+        self.running[item] = url
+        self.running_urls[url] += 1
+        self.host_urls[_get_host(url)].add(url)
+        eventloop.add_idle(item.request_icon, "Icon Request")
 
-        if len(self.vital) > 0:
-            item = self.vital.popleft()
-        elif len(self.idle) > 0:
-            item = self.idle.popleft()
+    def update_finished(self, item):
+        try:
+            url = self.running.pop(item)
+        except KeyError:
+            # item was updated without going through request_update()
+            pass
         else:
-            self.running_count -= 1
+            self.running_urls[url] -= 1
+            if self.running_urls[url] <= 0:
+                del self.running_urls[url]
+                host = _get_host(url)
+                self.host_urls[host].discard(url)
+                if not self.host_urls[host]:
+                    del self.host_urls[host]
+        self._run_queue()
+
+    def grab_url(self, url, callback, errback):
+        """Download an icon.
+
+        This works like httpclient.grab_url(), except that if we're already
+        downloading url, we wait for that download instead of starting
+        another one.
+        """
+        if url in self.in_flight:
+            self.in_flight[url].append((callback, errback))
             return
-
-        eventloop.add_idle(item.request_icon, "Icon Request")
+        self.in_flight[url] = [(callback, errback)]
+        httpclient.grab_url(url,
+                lambda info: self._grab_url_finished(url, info, None),
+                lambda error: self._grab_url_finished(url, None, error))
+
+    def _grab_url_finished(self, url, info, error):
+        for callback, errback in self.in_flight.pop(url):
+            if error is None:
+                callback(info)
+            else:
+                errback(error)
+
+    def set_visible_items(self, item_ids):
+        """Set the items that the frontend is displaying.
+
+        Icons for these items get updated before any other icons.
+        """
+        self.visible_ids = set(item_ids)
+        for queue_name in ('vital', 'idle'):
+            for item in list(self.queues[queue_name]):
+                if (self.queued.get(item) == queue_name and
+                        self._is_visible(item)):
+                    self._enqueue(item, 'visible')
+        self._run_queue()
+
+    def get_stats(self):
+        """Get a dict with the number of queued and running updates."""
+        counts = dict((name, 0) for name in self.QUEUE_NAMES)
+        for queue_name in self.queued.itervalues():
+            counts[queue_name] += 1
+        return {
+            'queued_visible': counts['visible'],
+            'queued_vital': counts['vital'],
+            'queued_idle': counts['idle'],
+            'running': len(self.running),
+            'downloading': len(self.in_flight),
+            'hosts': len(self.host_urls),
+        }
 
     @eventloop.as_idle
     def clear_vital(self):
-        self.vital = collections.deque()
+        for item in self.queues['vital']:
+            if self.queued.get(item) == 'vital':
+                del self.queued[item]
+        self.queues['vital'] = collections.deque()
 
     @eventloop.as_idle
     def shutdown(self):
@@ -92,6 +263,83 @@ class IconCacheUpdater:
 # module import time.
 icon_cache_updater = IconCacheUpdater()
 
+# Icon files are named after the SHA1 hash of their contents, so identical
+# icons for many items are only stored once.  Several IconCache objects can
+# then share a file.  The reference count for a file is the number of
+# IconCache rows with that filename, plus the number of writes for it that
+# are in progress, which we track here.
+_pending_writes = collections.defaultdict(int)
+
+def content_filename(body, filename_hint):
+    """Get the path to store an icon at.
+
+    :param body: contents of the icon
+    :param filename_hint: filename from the HTTP response.  We use the
+        extension from this.
+    """
+    cachedir = app.config.get(prefs.ICON_CACHE_DIRECTORY)
+    ext = os.path.splitext(filename_hint)[1]
+    if len(ext) > 6 or not ext[1:].isalnum():
+        ext = u''
+    name = unicode(hashlib.sha1(body).hexdigest()) + ext.lower()
+    return os.path.join(cachedir, unicode_to_filename(name, cachedir))
+
+def _write_icon_file(filename, body):
+    """Write an icon to disk.
+
+    This runs in the thread pool.  Since icon filenames depend on their
+    contents, we don't need to write anything if the file already exists.
+    """
+    if fileutil.exists(filename):
+        return
+    cachedir = os.path.dirname(filename)
+    try:
+        fileutil.makedirs(cachedir)
+    except OSError:
+        pass
+    tmp_filename, output = next_free_filename(filename + ".part")
+    try:
+        output.write(body)
+    finally:
+        output.close()
+    try:
+        fileutil.rename(tmp_filename, filename)
+    except OSError:
+        # another write for the same contents may have beat us to it
+        fileutil.remove(tmp_filename)
+        if not fileutil.exists(filename):
+            raise
+
+def pending_filenames():
+    """Get the filenames of icons that are currently being written."""
+    return _pending_writes.keys()
+
+# next_free_filename() turns foo.png.part into foo.png.1.part, etc.
+_temp_filename_re = re.compile(r'(\.\d+)?\.part$')
+
+def is_temp_file_in_use(path):
+    """Check if path is a temp file that _write_icon_file() is writing to.
+    """
+    target, count = _temp_filename_re.subn('', path)
+    if count == 0:
+        return False
+    target = os.path.normcase(fileutil.expand_filename(target))
+    for filename in _pending_writes:
+        if os.path.normcase(fileutil.expand_filename(filename)) == target:
+            return True
+    return False
+
+def _release_file(filename):
+    """Remove an icon file if nothing references it anymore."""
+    if _pending_writes.get(filename, 0) > 0:
+        return
+    if IconCache.filename_ref_count(filename) > 0:
+        return
+    try:
+        fileutil.remove(filename)
+    except OSError:
+        pass
+
 class IconCache(DDBObject):
     def setup_new(self, dbItem):
         self.etag = None
@@ -115,7 +363,24 @@ class IconCache(DDBObject):
 
     @classmethod
     def all_filenames(cls):
-        return [r[0] for r in cls.select(["filename"], 'filename IS NOT NULL')]
+        """Get the filenames used by IconCache objects.
+
+        Each filename is only listed once, even if several objects share
+        it.
+        """
+        return [r[0] for r in cls.select(["filename"], 'filename IS NOT NULL',
+            group_by='filename')]
+
+    @classmethod
+    def filename_ref_count(cls, filename):
+        """Count the IconCache rows that use filename.
+
+        We ask the database rather than keeping counts in memory, since
+        most IconCache objects aren't loaded.  The icon_cache_filename
+        index keeps this quick.
+        """
+        return cls.make_view('filename=?',
+                (filename_to_unicode(filename),)).count()
 
     def icon_changed(self, needs_save=True):
         self.signal_change(needs_save=needs_save)
@@ -126,13 +391,12 @@ class IconCache(DDBObject):
 
     def remove(self):
         self.removed = True
-        if self.filename:
-            self.remove_file(self.filename)
         DDBObject.remove(self)
+        if self.filename:
+            _release_file(self.filename)
 
     def reset(self):
-        if self.filename:
-            self.remove_file(self.filename)
+        old_filename = self.filename
         self.filename = None
         self.url = None
         self.etag = None
@@ -141,18 +405,14 @@ class IconCache(DDBObject):
         self.updating = False
         self.needsUpdate = False
         self.icon_changed()
-
-    def remove_file(self, filename):
-        try:
-            fileutil.remove(filename)
-        except OSError:
-            pass
+        if old_filename:
+            _release_file(old_filename)
 
     def error_callback(self, url, error=None):
         self.dbItem.confirm_db_thread()
 
         if self.removed:
-            icon_cache_updater.update_finished()
+            icon_cache_updater.update_finished(self)
             return
 
         # Don't clear the cache on an error.
@@ -161,130 +421,91 @@ class IconCache(DDBObject):
             self.etag = None
             self.modified = None
             self.icon_changed()
-        self.updating = False
-        if self.needsUpdate:
-            self.needsUpdate = False
-            self.request_update(True)
-        icon_cache_updater.update_finished()
+        self.update_finished()
 
     def update_icon_cache(self, url, info):
         self.dbItem.confirm_db_thread()
 
         if self.removed:
-            icon_cache_updater.update_finished()
+            icon_cache_updater.update_finished(self)
             return
 
-        needs_save = False
-        needsChange = False
-
         if info == None or (info['status'] != 304 and info['status'] != 200):
             self.error_callback(url, "bad response")
             return
-        try:
+        if info['status'] == 304:
             # Our cache is good.  Hooray!
-            if info['status'] == 304:
-                return
-
-            needsChange = True
-
-            # We have to update it, and if we can't write to the file, we
-            # should pick a new filename.
-            if ((self.filename and
-                 not fileutil.access(self.filename, os.R_OK | os.W_OK))):
-                self.filename = None
-
-            cachedir = app.config.get(prefs.ICON_CACHE_DIRECTORY)
-            try:
-                fileutil.makedirs(cachedir)
-            except OSError:
-                pass
+            self.update_finished()
+            return
 
-            try:
-                # Write to a temp file.
-                if self.filename:
-                    tmp_filename = self.filename + ".part"
-                else:
-                    tmp_filename = os.path.join(cachedir, info["filename"]) + ".part"
-                tmp_filename, output = next_free_filename(tmp_filename)
-                output.write(info["body"])
-                output.close()
-            except IOError:
-                self.remove_file(tmp_filename)
-                return
-            except ValueError:
-                logging.warn('update_icon_cache: next_free_filename failed '
-                             '#1, candidate = %r', tmp_filename)
-                return
+        # Write the file in the thread pool.  We count the write as a
+        # reference to the file, so nobody removes it before
+        # _icon_file_written() gets called.
+        filename = content_filename(info["body"], info["filename"])
+        _pending_writes[filename] += 1
+        eventloop.call_in_thread(
+                lambda result: self._icon_file_written(url, info, filename),
+                lambda error: self._icon_file_error(url, filename, error),
+                _write_icon_file, 'Write icon cache file', filename,
+                info["body"])
+
+    def _finish_pending_write(self, filename):
+        _pending_writes[filename] -= 1
+        if _pending_writes[filename] <= 0:
+            del _pending_writes[filename]
+
+    def _icon_file_written(self, url, info, filename):
+        self._finish_pending_write(filename)
+        if self.removed:
+            _release_file(filename)
+            icon_cache_updater.update_finished(self)
+            return
 
-            filename = unicode(info["filename"])
-            filename = unicode_to_filename(filename, cachedir)
-            filename = os.path.join(cachedir, filename)
-            needs_save = True
-            try:
-                filename, fp = next_free_filename(filename)
-            except ValueError:
-                logging.warn('update_icon_cache: next_free_filename failed '
-                             '#2, candidate = %r', filename)
-                return
+        old_filename = self.filename
+        self.filename = filename
+        self.etag = unicodify(info.get("etag"))
+        self.modified = unicodify(info.get("modified"))
+        self.url = url
+        # save our new filename before releasing the old file, so that
+        # the reference counts are correct.
+        self.icon_changed()
+        if old_filename and old_filename != filename:
+            _release_file(old_filename)
+        self.update_finished()
+
+    def _icon_file_error(self, url, filename, error):
+        self._finish_pending_write(filename)
+        logging.warn("iconcache: error writing %s: %s", filename, error)
+        _release_file(filename)
+        if self.removed:
+            icon_cache_updater.update_finished(self)
+            return
+        self.update_finished()
 
-            if self.filename:
-                filename = self.filename
-                self.filename = None
-                self.remove_file(filename)
-
-            # we need to move the file here--so we close the file
-            # pointer and then move the file.
-            fp.close()
-            try:
-                self.remove_file(filename)
-                fileutil.rename(tmp_filename, filename)
-            except (IOError, OSError):
-                logging.exception("iconcache: fileutil.move failed")
-                filename = None
-
-            self.filename = filename
-
-            etag = unicodify(info.get("etag"))
-            modified = unicodify(info.get("modified"))
-
-            if self.etag != etag:
-                needs_save = True
-                self.etag = etag
-            if self.modified != modified:
-                needs_save = True
-                self.modified = modified
-            if self.url != url:
-                needs_save = True
-                self.url = url
-        finally:
-            if needsChange:
-                self.icon_changed(needs_save=needs_save)
-            self.updating = False
-            if self.needsUpdate:
-                self.needsUpdate = False
-                self.request_update(True)
-            icon_cache_updater.update_finished()
+    def update_finished(self):
+        self.updating = False
+        icon_cache_updater.update_finished(self)
+        if self.needsUpdate:
+            self.needsUpdate = False
+            self.request_update(True)
 
     def request_icon(self):
         if self.removed:
-            icon_cache_updater.update_finished()
+            icon_cache_updater.update_finished(self)
             return
 
         self.dbItem.confirm_db_thread()
         if self.updating:
             self.needsUpdate = True
-            icon_cache_updater.update_finished()
+            icon_cache_updater.update_finished(self)
             return
 
-        if hasattr(self.dbItem, "get_thumbnail_url"):
-            url = self.dbItem.get_thumbnail_url()
-        else:
-            url = self.url
+        url = self.get_update_url()
 
         # Only verify each icon once per run unless the url changes
         if (url == self.url and self.filename
                 and fileutil.access(self.filename, os.R_OK)):
-            icon_cache_updater.update_finished()
+            icon_cache_updater.update_finished(self)
             return
 
         self.updating = True
@@ -295,9 +516,17 @@ class IconCache(DDBObject):
             return
 
         # Last try, get the icon from HTTP.
-        httpclient.grab_url(url, lambda info: self.update_icon_cache(url, info),
+        icon_cache_updater.grab_url(url,
+                lambda info: self.update_icon_cache(url, info),
                 lambda error: self.error_callback(url, error))
 
+    def get_update_url(self):
+        """Get the URL that we should fetch our icon from."""
+        if hasattr(self.dbItem, "get_thumbnail_url"):
+            return self.dbItem.get_thumbnail_url()
+        else:
+            return self.url
+
     def request_update(self, is_vital=False):
         if hasattr(self, "updating") and hasattr(self, "dbItem"):
             if self.removed:
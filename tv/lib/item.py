@@ -136,16 +136,28 @@ class FeedParserValues(object):
                 return False
         return True
 
+    ENCLOSURE_KEYS = ('url', 'enclosure_size', 'enclosure_type',
+            'enclosure_format')
+
     def compare_to_item_enclosures(self, item):
-        compare_keys = (
-            'url', 'enclosure_size', 'enclosure_type',
-            'enclosure_format'
-            )
-        for key in compare_keys:
+        for key in self.ENCLOSURE_KEYS:
             if getattr(item, key) != self.data[key]:
                 return False
         return True
 
+    def enclosure_key(self):
+        """Get a tuple of the values that compare_to_item_enclosures()
+        checks.
+
+        Items whose item_enclosure_key() is equal to this tuple match our
+        enclosures.
+        """
+        return tuple(self.data[key] for key in self.ENCLOSURE_KEYS)
+
+    @classmethod
+    def item_enclosure_key(cls, item):
+        return tuple(getattr(item, key) for key in cls.ENCLOSURE_KEYS)
+
     def _calc_title(self):
         if hasattr(self.entry, "title"):
             # The title attribute shouldn't use entities, but some in
@@ -637,6 +649,49 @@ class Item(DDBObject, iconcache.IconCacheOwnerMixin, metadata.Store):
                 (feed_id,),
                 joins={'remote_downloader AS rd': 'item.downloader_id=rd.id'})
 
+    @classmethod
+    def feed_counts(cls, feed_ids):
+        """Count the items in several feed views for many feeds at once.
+
+        This runs a single GROUP BY query instead of a COUNT query for each
+        view of each feed.  The conditions below must be kept in sync with
+        feed_downloaded_view(), feed_downloading_view(),
+        feed_unwatched_view(), feed_available_view() and
+        feed_auto_pending_view().
+
+        :returns: dict mapping feed ids to (downloaded, downloading,
+            unwatched, available, auto_pending) tuples.  Feeds without any
+            items are left out.
+        """
+        from miro.storedatabase import split_values_for_sqlite
+        downloaded = ("(item.is_file_item OR rd.state in ('finished', "
+                "'uploading', 'uploading-paused'))")
+        columns = [
+            'item.feed_id',
+            'SUM(%s)' % downloaded,
+            "SUM(rd.state in ('downloading', 'uploading') AND "
+                "rd.main_item_id=item.id)",
+            "SUM(NOT item.seen AND item.file_type in ('audio', 'video') "
+                "AND %s)" % downloaded,
+            'SUM(NOT item.autoDownloaded AND item.downloadedTime IS NULL '
+                'AND NOT item.is_file_item AND '
+                'feed.last_viewed <= item.creationTime)',
+            'SUM(feed.autoDownloadable AND NOT item.was_downloaded AND '
+                '(item.eligibleForAutoDownload OR feed.getEverything))',
+        ]
+        joins = {'remote_downloader AS rd': 'item.downloader_id=rd.id',
+                 'feed': 'item.feed_id=feed.id'}
+        counts = {}
+        for feed_ids_chunk in split_values_for_sqlite(list(feed_ids)):
+            where = 'item.feed_id IN (%s)' % ', '.join(
+                    '?' for i in xrange(len(feed_ids_chunk)))
+            rows = cls.select(columns, where, feed_ids_chunk, convert=False,
+                    joins=joins, group_by='item.feed_id')
+            for row in rows:
+                # SUM() returns NULL if the condition was never true
+                counts[row[0]] = tuple(count or 0 for count in row[1:])
+        return counts
+
     @classmethod
     def children_view(cls, parent_id):
         return cls.make_view('parent_id=?', (parent_id,))
@@ -1979,6 +2034,8 @@ class Item(DDBObject, iconcache.IconCacheOwnerMixin, metadata.Store):
             for item in self.get_children():
                 item.remove()
         self._remove_from_playlists()
+        if app.movie_data_updater is not None:
+            app.movie_data_updater.cancel_update(self)
         DDBObject.remove(self)
         # need to call this after DDBObject.remove(), so that the item info is
         # there for ItemInfoFetcher to see.
@@ -2009,13 +2066,22 @@ class Item(DDBObject, iconcache.IconCacheOwnerMixin, metadata.Store):
         """
         if not self.id_exists():
             return True
-        if (self.isContainerItem is not None and
-                not fileutil.exists(self.get_filename()) and
-                not self._allow_nonexistent_paths):
+        path = self.get_deleted_check_path()
+        if path is not None and not fileutil.exists(path):
             self.expire()
             return True
         return False
 
+    def get_deleted_check_path(self):
+        """Get the path that check_deleted() should check.
+
+        :returns: filename, or None if there's no file to check
+        """
+        if (self.isContainerItem is None or
+                self._allow_nonexistent_paths):
+            return None
+        return self.get_filename()
+
     def _get_downloader(self):
         try:
             return self._downloader
@@ -2318,18 +2384,44 @@ def update_incomplete_movie_data():
             item.check_media_file()
         yield
 
+def _find_missing_paths(paths):
+    """Check which paths in a list don't exist.
+
+    This gets run in the thread pool.
+
+    :returns: (missing, elapsed) tuple.  missing is a list of indexes into
+        paths, elapsed is how long the checks took.
+    """
+    start = time.time()
+    missing = [i for i, path in enumerate(paths)
+               if not fileutil.exists(path)]
+    return missing, time.time() - start
+
 class DeletedFileChecker(object):
     """Utility class that manages calling Item.check_deleted().
 
     This class ensures that we only schedule one idle callback at a time.
+
+    The files are checked in the thread pool, since a stat call on a network
+    share or sleeping disk can block for seconds.  We only check one batch
+    at a time, and size the batches so that each one takes about
+    TARGET_BATCH_TIME seconds.
     """
+    MIN_BATCH_SIZE = 10
+    MAX_BATCH_SIZE = 1000
+    INITIAL_BATCH_SIZE = 100
+    TARGET_BATCH_TIME = 1.0
+
     def __init__(self):
         # track items that we should call check_deleted for
         self.items_to_check = set()
         # track if we have run_checks() scheduled as an idle callback
         self.check_scheduled = False
+        # track if we have a batch of checks running in the thread pool
+        self.batch_running = False
         # track if we should be checking yet
         self.started = False
+        self.batch_size = self.INITIAL_BATCH_SIZE
 
     def schedule_check(self, item):
         self.items_to_check.add(item)
@@ -2343,40 +2435,83 @@ class DeletedFileChecker(object):
     def _ensure_run_checks_scheduled(self):
         """Ensure that we run_checks() scheduled as an idle callback.
 
-        This method is a no-op if start_checks() hasn't been called yet.
+        This method is a no-op if start_checks() hasn't been called yet, or
+        if we are waiting for a batch to finish.
 
         If this method is called multiple times before run_checks() runs, then
         it only schedules one callback.
         """
-        if self.started and not self.check_scheduled:
+        if (self.started and not self.check_scheduled and
+                not self.batch_running):
             eventloop.add_idle(self.run_checks, 'checking items deleted')
             self.check_scheduled = True
 
     def run_checks(self):
-        """Call check_deleted() for the items that are scheduled to check."""
+        """Check the files for the items that are scheduled to check."""
         self.check_scheduled = False
-        # Grab a limited number items at a time to prevent us from using too
-        # much time in for this idle callback.
+        # Grab a limited number items at a time so that one batch doesn't
+        # tie up the thread pool for too long.
         # Update items_to_check immediately in case schedule_check() is called
-        # in response to us calling check_deleted()
-        items_this_pass = []
-        for x in xrange(100):
+        # while the batch is running
+        to_check = []
+        for x in xrange(self.batch_size):
             try:
-                to_check = self.items_to_check.pop()
-                items_this_pass.append(to_check)
+                item = self.items_to_check.pop()
             except KeyError:
                 break # items_to_check is empty
+            if not item.id_exists():
+                continue
+            path = item.get_deleted_check_path()
+            if path is not None:
+                to_check.append((item, path))
 
+        if not to_check:
+            if self.items_to_check:
+                self._ensure_run_checks_scheduled()
+            return
+
+        def callback(result):
+            self._batch_finished(to_check, result)
+        self.batch_running = True
+        eventloop.call_in_thread(callback, self._batch_error,
+                _find_missing_paths, 'checking items deleted',
+                [path for item, path in to_check])
+
+    def _batch_finished(self, to_check, result):
+        missing, elapsed = result
+        self.batch_running = False
+        self._update_batch_size(len(to_check), elapsed)
         app.bulk_sql_manager.start()
         try:
-            for item in items_this_pass:
-                if item.id_exists():
-                    item.check_deleted()
+            for index in missing:
+                item, path = to_check[index]
+                # the item may have changed while the batch was running
+                if (item.id_exists() and
+                        item.get_deleted_check_path() == path):
+                    item.expire()
         finally:
             app.bulk_sql_manager.finish()
             if self.items_to_check:
                 self._ensure_run_checks_scheduled()
 
+    def _batch_error(self, error):
+        logging.warn("error checking for deleted files: %s", error)
+        self.batch_running = False
+        if self.items_to_check:
+            self._ensure_run_checks_scheduled()
+
+    def _update_batch_size(self, count, elapsed):
+        """Adjust batch_size based on how long the last batch took."""
+        if elapsed <= 0:
+            ideal_size = self.MAX_BATCH_SIZE
+        else:
+            ideal_size = int(self.TARGET_BATCH_TIME * count / elapsed)
+        # move halfway to the ideal size, so that one slow stat doesn't
+        # shrink the batches too much
+        new_size = (self.batch_size + ideal_size) // 2
+        self.batch_size = max(self.MIN_BATCH_SIZE,
+                              min(self.MAX_BATCH_SIZE, new_size))
+
 class DeviceItem(metadata.Store):
     """
     An item which lives on a device.  There's a separate, per-device JSON
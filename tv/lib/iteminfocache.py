@@ -249,7 +249,8 @@ class ItemInfoCache(signals.SignalEmitter):
         if item.id not in self.id_to_info:
             # signal_change() called inside setup_new(), just ignor it
             return
-        info = itemsource.DatabaseItemSource._item_info_for(item)
+        info = itemsource.DatabaseItemSource._item_info_for(item,
+                self.id_to_info[item.id])
         self.id_to_info[item.id] = info
         if item.id in self._infos_added:
             # no need to update if we insert the new values
@@ -140,7 +140,7 @@ class DatabaseItemSource(ItemSource):
     # bump this whenever you change the ItemInfo class, or change one of the
     # functions that ItemInfo uses to get it's attributes (for example
     # Item.get_description()).
-    VERSION = 35
+    VERSION = 37
 
     def __init__(self, view):
         ItemSource.__init__(self)
@@ -152,7 +152,12 @@ class DatabaseItemSource(ItemSource):
         self.tracker.connect('removed', self._on_tracker_removed)
 
     @staticmethod
-    def _item_info_for(item):
+    def _item_info_for(item, old_info=None):
+        """Create an ItemInfo for item
+
+        :param old_info: previous ItemInfo for the item.  If given, we reuse
+            its sort keys if possible.
+        """
         info = {
             'feed_id': item.feed_id,
             'feed_name': item.get_source(),
@@ -210,6 +215,8 @@ class DatabaseItemSource(ItemSource):
             'is_playing': item.is_playing(),
             }
         info.update(item.get_iteminfo_metadata())
+        if old_info is not None:
+            info.update(old_info.sort_key_values())
         if item.isContainerItem:
             info['children'] = [DatabaseItemSource._item_info_for(i) for i in
                                 item.get_children()]
@@ -537,7 +544,7 @@ class SharingItemHandler(ItemHandler):
         if info.is_playing != is_playing:
             # modifying the ItemInfo in-place messes up the Tracker's
             # object-changed logic, so make a copy
-            info = messages.ItemInfo(info.id, **info.__dict__)
+            info = messages.ItemInfo(info.id, **info.get_attrs())
             info.is_playing = is_playing
             info.item_source.emit("changed", info)
 
@@ -753,7 +760,7 @@ class DeviceItemHandler(ItemHandler):
             # object-changed logic, so make a copy
             info_cache = app.device_manager.info_cache[info.device.mount]
             info = info_cache[info.id] = messages.ItemInfo(
-                info.id, **info.__dict__)
+                info.id, **info.get_attrs())
             database = info.device.database
             info.is_playing = is_playing
             database[info.file_type][info.id][u'is_playing'] = is_playing
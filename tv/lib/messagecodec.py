@@ -0,0 +1,145 @@
+# Miro - an RSS based video player application
+# Copyright (C) 2005, 2006, 2007, 2008, 2009, 2010, 2011
+# Participatory Culture Foundation
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301 USA
+#
+# In addition, as a special exception, the copyright holders give
+# permission to link the code of portions of this program with the OpenSSL
+# library.
+#
+# You must obey the GNU General Public License in all respects for all of
+# the code used other than OpenSSL. If you modify file(s) with this
+# exception, you may extend this exception to your version of the file(s),
+# but you are not obligated to do so. If you do not wish to do so, delete
+# this exception statement from your version. If you delete this exception
+# statement from all source files in the program, then also delete it here.
+
+"""``miro.messagecodec`` -- Compact encoding for inter-process messages.
+
+Messages sent to the downloader daemon and to our worker subprocesses are
+normally pickled.  Pickle handles anything we throw at it, but it's fairly
+slow for the messages we send many times a second, like download status
+batches and worker task results.
+
+MessageCodec lets a channel register its high-frequency message classes.
+Those are converted to plain python values (tuples, dicts, strings,
+numbers, etc) and dumped with marshal, which is much quicker to both
+encode and decode.  Everything else is pickled, as before.
+
+Every encoded message starts with a 1 byte header.  Pickled messages use
+PICKLE_HEADER.  Compact messages use COMPACT_HEADER, followed by a byte
+for CODEC_VERSION and a byte for the message type code.
+"""
+
+import cPickle as pickle
+import marshal
+import struct
+
+# Bump this if the format of compact messages changes
+CODEC_VERSION = 1
+# marshal format 2 is the latest that python 2.x supports
+MARSHAL_VERSION = 2
+
+PICKLE_HEADER = 'P'
+COMPACT_HEADER = 'C'
+COMPACT_PREFIX_FORMAT = "cBB"
+COMPACT_PREFIX_SIZE = struct.calcsize(COMPACT_PREFIX_FORMAT)
+
+class DecodeError(ValueError):
+    """Data passed to MessageCodec.decode() couldn't be decoded."""
+    pass
+
+class MessageCodec(object):
+    """Encode/decode messages for one inter-process channel.
+
+    Message classes registered with register() must implement 2 methods:
+
+      - to_compact(self) returns the message state using only types that
+        marshal can handle.  If marshal can't handle the value after all,
+        for example because a task returned an exception, we fall back to
+        pickling the message.
+      - from_compact(cls, data) is a classmethod that rebuilds the message
+        from the value to_compact() returned.
+
+    Note that marshal converts subclasses of str and unicode to the base
+    type, so to_compact() shouldn't return values where the subclass
+    matters.
+    """
+
+    def __init__(self):
+        # maps message classes to type codes
+        self.type_codes = {}
+        # maps type codes to message classes
+        self.classes = {}
+
+    def register(self, cls, type_code):
+        """Encode messages of class cls with the compact encoding.
+
+        :param type_code: integer from 0-255 that identifies cls
+        """
+        if type_code in self.classes:
+            raise ValueError("type code %s already used by %s" %
+                             (type_code, self.classes[type_code]))
+        self.type_codes[cls] = type_code
+        self.classes[type_code] = cls
+
+    def encode(self, obj):
+        """Encode obj to a string."""
+        try:
+            type_code = self.type_codes[obj.__class__]
+        except KeyError:
+            pass
+        else:
+            try:
+                data = marshal.dumps(obj.to_compact(), MARSHAL_VERSION)
+            except ValueError:
+                # obj contained something that marshal can't handle.
+                pass
+            else:
+                return struct.pack(COMPACT_PREFIX_FORMAT, COMPACT_HEADER,
+                                   CODEC_VERSION, type_code) + data
+        return PICKLE_HEADER + pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, data):
+        """Decode a string created with encode().
+
+        :raises DecodeError: data couldn't be decoded
+        :raises pickle.UnpicklingError: pickled data was corrupt
+        """
+        header = data[:1]
+        if header == PICKLE_HEADER:
+            return pickle.loads(data[1:])
+        elif header == COMPACT_HEADER:
+            return self._decode_compact(data)
+        else:
+            raise DecodeError("Unknown message header: %r" % header)
+
+    def _decode_compact(self, data):
+        if len(data) < COMPACT_PREFIX_SIZE:
+            raise DecodeError("Compact message truncated")
+        (header, version, type_code) = struct.unpack(
+            COMPACT_PREFIX_FORMAT, data[:COMPACT_PREFIX_SIZE])
+        if version != CODEC_VERSION:
+            raise DecodeError("Unknown compact codec version: %s" % version)
+        try:
+            cls = self.classes[type_code]
+        except KeyError:
+            raise DecodeError("Unknown compact type code: %s" % type_code)
+        try:
+            compact_data = marshal.loads(data[COMPACT_PREFIX_SIZE:])
+        except (ValueError, EOFError, TypeError), e:
+            raise DecodeError("Compact message data corrupt: %s" % e)
+        return cls.from_compact(compact_data)
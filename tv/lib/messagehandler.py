@@ -44,6 +44,7 @@ from miro import downloader
 from miro import eventloop
 from miro import feed
 from miro import guide
+from miro import iconcache
 from miro import fileutil
 from miro import commandline
 from miro import item
@@ -71,6 +72,9 @@ class ViewTracker(object):
     """
     type = None
     info_factory = None
+    # Should we calculate which fields changed for each changed info?  If
+    # so, they're stored in sent_changed_fields for make_changed_message().
+    track_changed_fields = False
 
     def __init__(self):
         self.trackers = []
@@ -81,6 +85,11 @@ class ViewTracker(object):
 
     def reset_changes(self):
         self.changed = {}
+        # maps ids to the fields that the backend told us changed (see
+        # DDBObject.signal_info_change()).  None means any field could have
+        # changed.
+        self.changed_fields = {}
+        self.sent_changed_fields = {}
         self.removed = set()
         self.added =  {}
         self.added_order = []
@@ -89,9 +98,12 @@ class ViewTracker(object):
         self.changes_pending = False
 
     def send_messages(self):
+        added = self._get_added_objects()
+        changed = self.changed.values()
+        self.prepare_for_infos(added + changed)
         message = self.make_changed_message(
-                self._make_added_list(self._get_added_objects()),
-                self._make_changed_list(self.changed.values()),
+                self._make_added_list(added),
+                self._make_changed_list(changed),
                 self._make_removed_list(self.removed))
         if message.added or message.changed or message.removed:
             message.send_to_frontend()
@@ -104,6 +116,14 @@ class ViewTracker(object):
     def make_changed_message(self, added, changed, removed):
         raise NotImplementedError()
 
+    def prepare_for_infos(self, objects):
+        """Called before we call info_factory for a group of objects.
+
+        Subclasses can override this to do work for all the objects at once,
+        rather than letting info_factory do it for each object.
+        """
+        pass
+
     def _make_new_info(self, obj):
         info = self.info_factory(obj)
         self._last_sent_info[obj.id] = info
@@ -118,13 +138,44 @@ class ViewTracker(object):
     def _make_changed_list(self, changed):
         retval = []
         for obj in changed:
-            info = self.info_factory(obj)
-            if (obj.id not in self._last_sent_info or
-                info.__dict__ != self._last_sent_info[obj.id].__dict__):
-                retval.append(info)
-                self._last_sent_info[obj.id] = info
+            old_info = self._last_sent_info.get(obj.id)
+            info = self._make_changed_info(obj, old_info)
+            if old_info is None:
+                changed_fields = None
+            elif self.track_changed_fields:
+                changed_fields = self.info_diff(old_info, info)
+                if not changed_fields:
+                    continue
+            elif self.get_info_attrs(old_info) == self.get_info_attrs(info):
+                continue
+            retval.append(info)
+            self._last_sent_info[obj.id] = info
+            if self.track_changed_fields:
+                self.sent_changed_fields[obj.id] = changed_fields
         return retval
 
+    def _make_changed_info(self, obj, old_info):
+        fields = self.changed_fields.get(obj.id)
+        if (old_info is not None and fields is not None and
+                hasattr(old_info, 'copy_with_changes')):
+            # we know which fields changed, so only recalculate those
+            return old_info.copy_with_changes(obj, fields)
+        return self.info_factory(obj)
+
+    def get_info_attrs(self, info):
+        return info.__dict__
+
+    def info_diff(self, old_info, new_info):
+        """Get the names of the fields that differ between two infos."""
+        old_attrs = self.get_info_attrs(old_info)
+        new_attrs = self.get_info_attrs(new_info)
+        if old_attrs == new_attrs:
+            return frozenset()
+        return frozenset(name
+                for name in set(old_attrs).union(new_attrs)
+                if (name not in old_attrs or name not in new_attrs or
+                    old_attrs[name] != new_attrs[name]))
+
     def _make_removed_list(self, removed_set):
         for id_ in removed_set:
             del self._last_sent_info[id_]
@@ -178,6 +229,7 @@ class ViewTracker(object):
         elif id_ in self.changed:
             # object changed, then removed, just send the removeal
             del self.changed[id_]
+            self.changed_fields.pop(id_, None)
             self.removed.add(id_)
         else:
             self.removed.add(id_)
@@ -192,8 +244,18 @@ class ViewTracker(object):
             self.added[obj.id] = obj
         else:
             self.changed[obj.id] = obj
+            self._record_changed_fields(obj)
         self.schedule_send_messages()
 
+    def _record_changed_fields(self, obj):
+        fields = getattr(obj, 'changed_info_fields', None)
+        if fields is None or (obj.id in self.changed_fields and
+                self.changed_fields[obj.id] is None):
+            self.changed_fields[obj.id] = None
+        else:
+            self.changed_fields[obj.id] = self.changed_fields.get(obj.id,
+                    frozenset()).union(fields)
+
     def on_bulk_added(self, emitter, objects):
         for obj in objects:
             self.on_object_added(emitter, obj)
@@ -211,6 +273,8 @@ class ViewTracker(object):
             tracker.unlink()
 
 class TabTracker(ViewTracker):
+    track_changed_fields = True
+
     def __init__(self):
         ViewTracker.__init__(self)
         self.send_whole_list = False
@@ -219,7 +283,8 @@ class TabTracker(ViewTracker):
         raise NotImplementedError()
 
     def make_changed_message(self, added, changed, removed):
-        return messages.TabsChanged(self.type, added, changed, removed)
+        return messages.TabsChanged(self.type, added, changed, removed,
+                self.sent_changed_fields)
 
     def send_messages(self):
         if self.send_whole_list:
@@ -238,7 +303,9 @@ class TabTracker(ViewTracker):
             root = HideableTab(self.type)
         response.root_expanded = root.get_expanded()
         current_folder_id = None
-        for obj in self.get_tab_order().get_all_tabs():
+        all_tabs = self.get_tab_order().get_all_tabs()
+        self.prepare_for_infos(all_tabs)
+        for obj in all_tabs:
             info = self._make_new_info(obj)
             if obj.get_folder() is None:
                 response.append(info)
@@ -262,6 +329,17 @@ class ChannelTracker(TabTracker):
     def get_object_views(self):
         return feed.Feed.visible_view(), ChannelFolder.make_view()
 
+    def prepare_for_infos(self, objects):
+        # ChannelInfo needs the item counts for each feed, calculate them all
+        # with one query.
+        feeds = []
+        for obj in objects:
+            if isinstance(obj, ChannelFolder):
+                feeds.extend(obj.get_children_view())
+            else:
+                feeds.append(obj)
+        feed.Feed.cache_counts(feeds)
+
     def get_tab_order(self):
         return tabs.TabOrder.feed_order()
 
@@ -350,6 +428,10 @@ class SourceTrackerBase(ViewTracker):
     def get_sources(self):
         return [self.source]
 
+    def get_info_attrs(self, info):
+        # ItemInfo uses __slots__, so __dict__ doesn't have its attributes
+        return info.get_attrs()
+
     def add_callbacks(self):
         for source in self.get_sources():
             source.connect('added', self.on_object_added)
@@ -372,6 +454,10 @@ class SourceTrackerBase(ViewTracker):
     def send_messages(self):
         ViewTracker.send_messages(self)
 
+    def get_sent_ids(self):
+        """Get the ids of the items that we've sent to the frontend."""
+        return self._last_sent_info.keys()
+
 class DatabaseSourceTrackerBase(SourceTrackerBase):
 
     def get_sources(self):
@@ -1273,6 +1359,7 @@ New ids: %s""", playlist_item_ids, message.item_ids)
             logging.warn("AddVideosToPlaylist: Playlist not found -- %s",
                     message.playlist_id)
             return
+        item_ids = []
         for id_ in message.video_ids:
             try:
                 item_ = item.Item.get_by_id(id_)
@@ -1283,7 +1370,8 @@ New ids: %s""", playlist_item_ids, message.item_ids)
                 logging.warn("AddVideosToPlaylist: Item not downloaded (%s)",
                         item_)
             else:
-                playlist.add_item(item_)
+                item_ids.append(item_.id)
+        playlist.add_ids(item_ids)
 
     def handle_remove_videos_from_playlist(self, message):
         try:
@@ -1352,6 +1440,7 @@ New ids: %s""", playlist_item_ids, message.item_ids)
         else:
             item_tracker = self.item_trackers[key]
         item_tracker.send_initial_list()
+        self._update_visible_items()
 
     def handle_track_items_manually(self, message):
         # handle_track_items can handle this message too
@@ -1365,6 +1454,19 @@ New ids: %s""", playlist_item_ids, message.item_ids)
             logging.warn("Item tracker not found (id: %s)", message.id)
         else:
             item_tracker.unlink()
+            self._update_visible_items()
+
+    def _update_visible_items(self):
+        """Tell the icon cache updater and movie data updater which items
+        the frontend is displaying.
+        """
+        item_ids = set()
+        for item_tracker in self.item_trackers.values():
+            if isinstance(item_tracker, DatabaseSourceTrackerBase):
+                item_ids.update(item_tracker.get_sent_ids())
+        iconcache.icon_cache_updater.set_visible_items(item_ids)
+        if app.movie_data_updater is not None:
+            app.movie_data_updater.set_visible_items(item_ids)
 
     def handle_cancel_auto_download(self, message):
         try:
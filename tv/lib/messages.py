@@ -1002,6 +1002,11 @@ class StartupDatabaseFailure(FrontendMessage):
         self.summary = summary
         self.description = description
 
+def _num_downloaded(channel_obj):
+    if isinstance(channel_obj, ChannelFolder):
+        return None
+    return channel_obj.num_downloaded()
+
 class ChannelInfo(object):
     """Tracks the state of a channel
 
@@ -1071,6 +1076,30 @@ class ChannelInfo(object):
             self.max_old_items = None
             self.num_downloaded = None
 
+    # functions to recalculate fields for copy_with_changes()
+    _field_calculators = {
+        'unwatched': lambda obj: obj.num_unwatched(),
+        'available': lambda obj: obj.num_available(),
+        'has_downloading': lambda obj: obj.has_downloading_items(),
+        'num_downloaded': _num_downloaded,
+    }
+
+    def copy_with_changes(self, channel_obj, fields):
+        """Make a copy of this ChannelInfo with some fields recalculated.
+
+        :param channel_obj: Feed or ChannelFolder for this info
+        :param fields: names of the fields that changed
+
+        If we can't recalculate one of the fields on its own, this falls
+        back to creating a new ChannelInfo.
+        """
+        if not fields.issubset(self._field_calculators):
+            return ChannelInfo(channel_obj)
+        info = copy.copy(self)
+        for name in fields:
+            setattr(info, name, self._field_calculators[name](channel_obj))
+        return info
+
 class PlaylistInfo(object):
     """Tracks the state of a playlist
 
@@ -1114,6 +1143,20 @@ class GuideInfo(object):
     def __repr__(self):
         return '<miro.messages.GuideInfo(%i) "%s">' % (self.id, self.name)
 
+_shared_strings = {}
+
+def share_string(value):
+    """Get a shared copy of a string.
+
+    This works like intern(), but also handles unicode objects.  It should
+    only be used for values that have a small number of distinct values,
+    since the strings are never freed.
+    """
+    if isinstance(value, basestring):
+        return _shared_strings.setdefault(value, value)
+    else:
+        return value
+
 class ItemInfo(object):
     """Tracks the state of an item
 
@@ -1187,20 +1230,64 @@ class ItemInfo(object):
     :param has_drm: True/False if known; None if unknown (usually means no)
     """
 
+    # We keep ItemInfos for every item in the library in memory, so store
+    # the attributes in slots rather than a dict per object.  __dict__ is
+    # still included so that ItemSources can pass in extra attributes, but
+    # it only gets created if one of those is actually set.
+    __slots__ = (
+        # attributes sent from the ItemSources
+        'album', 'album_artist', 'album_tracks', 'artist', 'auto_rating',
+        'can_be_saved', 'children', 'commentslink', 'connections',
+        'cover_art', 'date_added', 'description', 'device', 'down_rate',
+        'down_total', 'download_info', 'downloaded', 'downloaded_time',
+        'downloading', 'duration', 'episode_id', 'episode_number',
+        'expiration_date', 'feed_id', 'feed_name', 'feed_url',
+        'file_format', 'file_type', 'file_url', 'genre', 'has_drm',
+        'has_shareable_url', 'host', 'id', 'is_container_item',
+        'is_external', 'is_file_item', 'is_playable', 'is_playing',
+        'item_source', 'item_viewed', 'kind', 'last_played', 'last_watched',
+        'leechers', 'license', 'mdp_state', 'media_type_checked',
+        'metadata_version', 'mime_type', 'name', 'payment_link',
+        'pending_auto_dl', 'pending_manual_dl', 'permalink', 'play_count',
+        'port', 'rating', 'release_date', 'remote', 'resume_time',
+        'season_number', 'seeders', 'seeding_status', 'show', 'size',
+        'skip_count', 'source_type', 'state', 'subtitle_encoding',
+        'thumbnail', 'thumbnail_url', 'title_tag', 'track', 'up_down_ratio',
+        'up_rate', 'up_total', 'video_path', 'video_watched', 'year',
+        # attributes that we calculate
+        'album_artist_sort_key', 'album_sort_key', 'artist_sort_key',
+        'description_oneline', 'description_stripped', 'display_date',
+        'display_date_added', 'display_drm', 'display_duration',
+        'display_duration_short', 'display_eta', 'display_kind',
+        'display_last_played', 'display_rate', 'display_size',
+        'display_torrent_details', 'display_track', 'display_year',
+        'name_sort_key', 'search_terms', 'sort_key_text',
+        '__dict__',
+    )
+
+    # string attributes that have a small number of distinct values.  We
+    # share a single string object for each value, rather than keeping a
+    # separate copy for every item.
+    shared_string_attrs = frozenset([
+        'album', 'album_artist', 'artist', 'feed_name', 'feed_url',
+        'file_format', 'file_type', 'genre', 'kind', 'license', 'mime_type',
+        'show', 'source_type', 'state',
+    ])
+
     html_stripper = util.HTMLStripper()
 
     def __repr__(self):
         return "<ItemInfo %r>" % self.id
 
     def __getstate__(self):
-        d = self.__dict__.copy()
+        d = self.get_attrs()
         d['device'] = None
         del d['description_stripped']
         del d['search_terms']
         return d
 
     def __setstate__(self, d):
-        self.__dict__.update(d)
+        self._set_attrs(d)
         self.description_stripped = ItemInfo.html_stripper.strip(
                 self.description)
         self.search_terms = search.calc_search_terms(self)
@@ -1208,8 +1295,7 @@ class ItemInfo(object):
     def __init__(self, id_, **kwargs):
         self.id = id_
 
-        self.__dict__.update(kwargs) # we're just a thin wrapper around some
-                                     # data
+        self._set_attrs(kwargs) # we're just a thin wrapper around some data
 
         # stuff we can calculate from other attributes
         if not hasattr(self, 'description_stripped'):
@@ -1217,13 +1303,15 @@ class ItemInfo(object):
                 self.description)
         if not hasattr(self, 'search_terms'):
             self.search_terms = search.calc_search_terms(self)
-        self.name_sort_key = util.name_sort_key(self.name)
-        self.album_sort_key = util.name_sort_key(self.album)
-        self.artist_sort_key = util.name_sort_key(self.artist)
-        if self.album_artist:
-            self.album_artist_sort_key = util.name_sort_key(self.album_artist)
-        else:
-            self.album_artist_sort_key = self.artist_sort_key
+        # name_sort_key() is slow, so we only calculate the sort keys if the
+        # text they come from changed.  sort_key_text stores the text that
+        # the current keys were calculated from.  It gets passed in when
+        # copying ItemInfos, or with sort_key_values() from an old ItemInfo.
+        sort_key_text = (self.name, self.album, self.artist,
+                         self.album_artist)
+        if kwargs.get('sort_key_text') != sort_key_text:
+            self.sort_key_text = sort_key_text
+            self.calc_sort_keys()
         # pre-calculate things that get displayed in list view
         self.description_oneline = (
                 self.description_stripped[0].replace('\n', '$'))
@@ -1260,6 +1348,54 @@ class ItemInfo(object):
         else:
             self.display_rate = self.display_eta = ''
 
+    def _set_attrs(self, attrs):
+        shared_string_attrs = self.shared_string_attrs
+        for name, value in attrs.iteritems():
+            if name in shared_string_attrs:
+                value = share_string(value)
+            setattr(self, name, value)
+
+    def get_attrs(self):
+        """Get a dict that maps attribute names to values for this ItemInfo.
+
+        This takes the place of __dict__, which only stores the extra
+        attributes not listed in __slots__.  Pass the dict as keyword
+        arguments to create a copy of the ItemInfo.
+        """
+        attrs = {}
+        for name in ItemInfo.__slots__[:-1]:
+            try:
+                attrs[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        attrs.update(self.__dict__)
+        return attrs
+
+    def calc_sort_keys(self):
+        self.name_sort_key = util.name_sort_key(self.name)
+        self.album_sort_key = util.name_sort_key(self.album)
+        self.artist_sort_key = util.name_sort_key(self.artist)
+        if self.album_artist:
+            self.album_artist_sort_key = util.name_sort_key(self.album_artist)
+        else:
+            self.album_artist_sort_key = self.artist_sort_key
+
+    def sort_key_values(self):
+        """Get the sort keys for this ItemInfo as a dict.
+
+        This can be passed in as keyword arguments when creating a new
+        ItemInfo for the same item.  If the name, album and artist didn't
+        change, the new ItemInfo will use these sort keys rather than
+        calculating them again.
+        """
+        return {
+            'sort_key_text': self.sort_key_text,
+            'name_sort_key': self.name_sort_key,
+            'album_sort_key': self.album_sort_key,
+            'artist_sort_key': self.artist_sort_key,
+            'album_artist_sort_key': self.album_artist_sort_key,
+        }
+
     def calc_torrent_details(self):
         if not self.download_info or not self.download_info.torrent:
             return ''
@@ -1434,12 +1570,28 @@ class TabsChanged(FrontendMessage):
                   list will be in the same order that the tabs were added.
     :param changed: list of ChannelInfo/PlaylistInfos for each changed tab.
     :param removed: list of ids for each tab that was removed
+    :param changed_fields: dict mapping the id of each changed tab to a
+                           frozenset of the info fields that changed, or
+                           None if we don't know.  The changed infos are
+                           still complete, this just lets handlers skip
+                           work for fields that didn't change.
     """
-    def __init__(self, typ, added, changed, removed):
+    def __init__(self, typ, added, changed, removed, changed_fields=None):
         self.type = typ
         self.added = added
         self.changed = changed
         self.removed = removed
+        if changed_fields is None:
+            changed_fields = {}
+        self.changed_fields = changed_fields
+
+    def fields_changed(self, id_):
+        """Get the fields that changed for a tab in changed.
+
+        :returns: frozenset of field names, or None if any field might
+                  have changed.
+        """
+        return self.changed_fields.get(id_)
 
     def __str__(self):
         return ('<miro.messages.TabsChanged %s '
@@ -123,6 +123,18 @@ class MetadataProgressUpdater(object):
         self.remaining[target] += 1
         self._schedule_update(target)
 
+    def path_queued(self, path):
+        """Call when the movie data updater queues a file.
+
+        This counts files that will_process_path() wasn't called for, for
+        example downloads and files left over from the last run, so that the
+        frontend sees how long the movie data queue is.
+
+        Only safe to be called from eventloop.
+        """
+        if path not in self.path_to_target:
+            self._will_process_path(path)
+
     def path_processed(self, path):
         """Call we've finished all processing for a file.
 
@@ -36,10 +36,12 @@ import time
 import traceback
 import threading
 import Queue
+import collections
 import logging
 from contextlib import contextmanager
 
 from miro import app
+from miro import eventloop
 from miro import prefs
 from miro import signals
 from miro import util
@@ -49,6 +51,11 @@ from miro import workerprocess
 # Time in seconds that we wait for the utility to execute.  If it goes
 # longer than this, we assume it's hung and kill it.
 MOVIE_DATA_UTIL_TIMEOUT = 30
+# Max number of files to send to the worker process in a single task.  We
+# send a new batch once there's this many files or less left in the worker
+# process, so at most 2 batches are in the worker at once.  Everything else
+# waits in our queues, where it can still be reprioritized.
+BATCH_SIZE = 50
 
 class State(object):
     """Enum for tracking what we've looked at.
@@ -93,9 +100,29 @@ class MovieDataInfo(object):
         return dir_
 
 class MovieDataUpdater(object):
+    """Schedules movie data updates.
+
+    Updates are run in priority order: items that the frontend is
+    displaying, then everything else.  Within each queue, items are handled
+    in the order they were requested.
+    """
+
+    # names of our queues, in priority order
+    QUEUE_NAMES = ('visible', 'idle')
+
     def __init__ (self):
         self.in_shutdown = False
+        # ids of items that we've sent to the worker process
         self.in_progress = set()
+        self.queues = dict((name, collections.deque())
+                for name in self.QUEUE_NAMES)
+        # maps ids of items waiting in a queue to the name of the queue
+        # they're in.  We don't remove items from the middle of the queues,
+        # instead we skip them if their entry here doesn't match.
+        self.queued = {}
+        # ids of the items that the frontend is displaying
+        self.visible_ids = set()
+        self.flush_scheduled = False
 
     def _path_processed(self, mdi):
         if hasattr(app, 'metadata_progress_updater'): # hack for unittests
@@ -139,6 +166,7 @@ class MovieDataUpdater(object):
 
     def update_failed(self, item):
         self.in_progress.remove(item.id)
+        self._schedule_send()
         if item.id_exists():
             item.mdp_state = State.FAILED
             if item.has_drm:
@@ -150,6 +178,7 @@ class MovieDataUpdater(object):
 
     def update_finished(self, item, duration, screenshot, mediatype):
         self.in_progress.remove(item.id)
+        self._schedule_send()
         if item.id_exists():
             item.mdp_state = State.RAN
             item.screenshot = screenshot
@@ -179,21 +208,99 @@ class MovieDataUpdater(object):
             return
         if self.in_shutdown:
             return
-        if item.id in self.in_progress:
+        if item.id in self.in_progress or item.id in self.queued:
             return
 
         if self._should_process_item(item):
-            self.in_progress.add(item.id)
-            info = MovieDataInfo(item)
-            workerprocess.run_media_metadata_extractor(
-              info.video_path,
-              info.thumbnail_path,
-              lambda result: self.callback(result, info),
-              lambda result: self.errback(result, info))
+            if item.id in self.visible_ids:
+                queue_name = 'visible'
+            else:
+                queue_name = 'idle'
+            self._enqueue(item, queue_name)
+            app.metadata_progress_updater.path_queued(item.get_filename())
+            self._schedule_send()
         else:
             self.update_skipped(item)
             app.metadata_progress_updater.path_processed(item.get_filename())
 
+    def cancel_update(self, item):
+        """Cancel a request_update() call for an item.
+
+        Call this when an item is removed.  If the item has already been
+        sent to the worker process, the results just get ignored.
+        """
+        if self.queued.pop(item.id, None) is not None:
+            app.metadata_progress_updater.path_processed(item.get_filename())
+
+    def set_visible_items(self, item_ids):
+        """Set the items that the frontend is displaying.
+
+        Updates for these items run before any other updates.
+        """
+        self.visible_ids = set(item_ids)
+        for item in self.queues['idle']:
+            if (self.queued.get(item.id) == 'idle' and
+                    item.id in self.visible_ids):
+                self._enqueue(item, 'visible')
+
+    def _enqueue(self, item, queue_name):
+        self.queued[item.id] = queue_name
+        self.queues[queue_name].append(item)
+
+    def _schedule_send(self):
+        # Requests tend to come in bunches (for example when a directory
+        # gets imported).  Wait until the current batch of work is done,
+        # then send things to the worker process in as few tasks as
+        # possible.
+        if not self.flush_scheduled and self.queued:
+            eventloop.add_idle(self.send_pending,
+                    'send movie data requests')
+            self.flush_scheduled = True
+
+    def send_pending(self):
+        """Send queued requests to the worker process."""
+        self.flush_scheduled = False
+        if self.in_shutdown:
+            return
+        while len(self.in_progress) <= BATCH_SIZE:
+            jobs = []
+            for item in self._pop_items(BATCH_SIZE):
+                self.in_progress.add(item.id)
+                jobs.append(self._make_job(MovieDataInfo(item)))
+            if not jobs:
+                break
+            workerprocess.run_media_metadata_extractor_batch(jobs)
+
+    def _pop_items(self, count):
+        """Remove up to count items from our queues."""
+        items = []
+        for queue_name in self.QUEUE_NAMES:
+            queue = self.queues[queue_name]
+            while queue and len(items) < count:
+                item = queue.popleft()
+                if self.queued.get(item.id) != queue_name:
+                    # item was moved to another queue or cancelled
+                    continue
+                del self.queued[item.id]
+                items.append(item)
+        return items
+
+    def get_stats(self):
+        """Get a dict with the number of queued and running updates."""
+        counts = dict((name, 0) for name in self.QUEUE_NAMES)
+        for queue_name in self.queued.itervalues():
+            counts[queue_name] += 1
+        return {
+            'queued_visible': counts['visible'],
+            'queued_idle': counts['idle'],
+            'running': len(self.in_progress),
+        }
+
+    def _make_job(self, mdi):
+        return (mdi.video_path, mdi.thumbnail_path,
+                lambda result: self.callback(result, mdi),
+                lambda result: self.errback(result, mdi))
+
     def _should_process_item(self, item):
         if item.has_drm:
             # mutagen can only identify files that *might* have drm, so we
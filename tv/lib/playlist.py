@@ -33,6 +33,7 @@
 import logging
 
 from miro.gtcache import gettext as _
+from miro import app
 from miro import dialogs
 from miro import database
 from miro import models
@@ -43,19 +44,31 @@ class PlaylistItemMap(database.DDBObject):
     child items.
     """
 
-    def setup_new(self, playlist_id, item_id):
+    def setup_new(self, playlist_id, item_id, position=None):
         self.playlist_id = playlist_id
         self.item_id = item_id
-        rows = self.select(['MAX(position+1)'], 'playlist_id=?',
+        if position is None:
+            position = self.next_position(playlist_id)
+        self.position = position
+
+    @classmethod
+    def next_position(cls, playlist_id):
+        rows = cls.select(['MAX(position+1)'], 'playlist_id=?',
                 (playlist_id,), convert=False)
-        self.position = rows[0][0]
-        if self.position is None:
-            self.position = 0
+        if rows[0][0] is None:
+            return 0
+        return rows[0][0]
 
     @classmethod
     def playlist_view(cls, playlist_id):
         return cls.make_view("playlist_id=?", (playlist_id,))
 
+    @classmethod
+    def playlist_maps(cls, playlist_id):
+        """Get a dict mapping item ids to the map objects for a playlist."""
+        return dict((map_.item_id, map_)
+                    for map_ in cls.playlist_view(playlist_id))
+
     @classmethod
     def remove_item_from_playlists(cls, item):
         cls.delete('item_id=?', (item.id,))
@@ -64,6 +77,37 @@ class PlaylistItemMap(database.DDBObject):
     def add_item_id(cls, playlist_id, item_id):
         cls(playlist_id, item_id)
 
+    @classmethod
+    def add_item_ids(cls, playlist_id, item_ids):
+        """Add several items to the end of a playlist.
+
+        Items that are already in the playlist are passed to
+        already_added().  This should be called with the BulkSQLManager
+        active, since it calculates the positions itself rather than
+        querying for each item.
+
+        :returns: list of item ids that were added
+        """
+        maps = cls.playlist_maps(playlist_id)
+        if maps:
+            position = max(map_.position for map_ in maps.itervalues()) + 1
+        else:
+            position = 0
+        added = []
+        for item_id in item_ids:
+            if item_id in maps:
+                cls.already_added(maps[item_id])
+                continue
+            maps[item_id] = cls(playlist_id, item_id, position)
+            position += 1
+            added.append(item_id)
+        return added
+
+    @classmethod
+    def already_added(cls, map_):
+        """Called by add_item_ids() for items already in the playlist."""
+        pass
+
     @classmethod
     def remove_item_id(cls, playlist_id, item_id):
         cls.delete('playlist_id=? AND item_id=?', (playlist_id, item_id))
@@ -88,6 +132,27 @@ class PlaylistMixin:
         if folder is not None:
             folder.add_id(item_id)
 
+    def add_ids(self, item_ids):
+        """Add several items to the end of the playlist.
+
+        This works like calling add_id() for each item, but loads the
+        playlist's map rows once and uses the BulkSQLManager to insert the
+        new rows and update the items.
+        """
+        started_bulk = not app.bulk_sql_manager.active
+        if started_bulk:
+            app.bulk_sql_manager.start(batch_updates=True)
+        try:
+            added = self.MapClass.add_item_ids(self.id, item_ids)
+            for item_id in added:
+                models.Item.get_by_id(item_id).save(always_signal=True)
+            folder = self.get_folder()
+            if folder is not None:
+                folder.add_ids(added)
+        finally:
+            if started_bulk:
+                app.bulk_sql_manager.finish()
+
     def remove_id(self, item_id, signal_change=True):
         """Remove an item from the playlist."""
         try:
@@ -120,11 +185,19 @@ class PlaylistMixin:
         """reorder items in the playlist.  new_order should contain a
         list of ids one for each item in the playlist.
         """
-        for i, item_id in enumerate(new_order):
-            map_ = self.MapClass.make_view('playlist_id=? AND item_id=?',
-                    (self.id, item_id)).get_singleton()
-            map_.position = i
-            map_.signal_change()
+        maps = self.MapClass.playlist_maps(self.id)
+        started_bulk = not app.bulk_sql_manager.active
+        if started_bulk:
+            app.bulk_sql_manager.start(batch_updates=True)
+        try:
+            for i, item_id in enumerate(new_order):
+                map_ = maps[item_id]
+                if map_.position != i:
+                    map_.position = i
+                    map_.signal_change()
+        finally:
+            if started_bulk:
+                app.bulk_sql_manager.finish()
 
 class SavedPlaylist(database.DDBObject, PlaylistMixin):
     """An ordered list of videos that the user has saved.
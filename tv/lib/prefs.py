@@ -66,6 +66,9 @@ MAIN_WINDOW_FRAME           = Pref(key='mainWindowFrame',       default=None,  p
 LEFT_VIEW_SIZE              = Pref(key='leftViewSize',          default=None,  platformSpecific=False)
 RIGHT_VIEW_SIZE             = Pref(key='rightViewSize',         default=None,  platformSpecific=False)
 CHECK_CHANNELS_EVERY_X_MN   = Pref(key='checkChannelsEveryXMn', default=60,    platformSpecific=False)
+MAX_CHANNEL_CHECK_INTERVAL_X_MN = Pref(key='maxChannelCheckIntervalXMn', default=1440, platformSpecific=False)
+ICON_CACHE_MAX_FETCHES      = Pref(key='iconCacheMaxFetches',   default=8,     platformSpecific=False)
+ICON_CACHE_MAX_FETCHES_PER_HOST = Pref(key='iconCacheMaxFetchesPerHost', default=2, platformSpecific=False)
 LIMIT_UPSTREAM              = Pref(key='limitUpstream',         default=False, platformSpecific=False)
 UPSTREAM_LIMIT_IN_KBS       = Pref(key='upstreamLimitInKBS',    default=12,    platformSpecific=False)
 UPSTREAM_TORRENT_LIMIT      = Pref(key='upstreamTorrentLimit',  default=10,    platformSpecific=False)
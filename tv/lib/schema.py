@@ -412,6 +412,10 @@ class IconCacheSchema (DDBObjectSchema):
         ('url', SchemaURL(noneOk=True)),
         ]
 
+    indexes = (
+        ('icon_cache_filename', ('filename',)),
+    )
+
 class ItemSchema(MultiClassObjectSchema):
     table_name = 'item'
 
@@ -501,6 +505,8 @@ class ItemSchema(MultiClassObjectSchema):
             ('item_downloader', ('downloader_id',)),
             ('item_feed_downloader', ('feed_id', 'downloader_id',)),
             ('item_file_type', ('file_type',)),
+            ('item_filename', ('filename',)),
+            ('item_downloader_url', ('downloader_id', 'url')),
     )
 
 class FeedSchema(DDBObjectSchema):
@@ -817,7 +823,7 @@ class ViewStateSchema(DDBObjectSchema):
         return None
 
 
-VERSION = 165
+VERSION = 167
 
 object_schemas = [
     IconCacheSchema, ItemSchema, FeedSchema,
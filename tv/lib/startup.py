@@ -92,8 +92,14 @@ from miro import workerprocess
 from miro.plat import devicetracker
 
 DEBUG_DB_MEM_USAGE = False
+# log query plans and flag slow full table scans (see QueryPlanLog)
+DEBUG_DB_QUERY_PLANS = False
 mem_usage_test_event = threading.Event()
 
+# (name, seconds, in_thread) for each startup phase we've run
+_phase_times = []
+_last_phase_end = None
+
 class StartupError(Exception):
     def __init__(self, summary, description):
         self.summary = summary
@@ -166,6 +172,91 @@ def startup_function(func):
                 m.send_to_frontend()
     return wrapped
 
+def get_phase_times():
+    """Get how long each phase of startup took.
+
+    :returns: list of (name, seconds, in_thread) tuples, in the order the
+        phases finished.  in_thread is True for BackgroundPhase objects,
+        which ran at the same time as the other phases.
+    """
+    return list(_phase_times)
+
+def _start_phase_timing():
+    del _phase_times[:]
+    _reset_phase_clock()
+
+def _reset_phase_clock():
+    """Start timing the next phase from now."""
+    global _last_phase_end
+    _last_phase_end = time.time()
+
+def _phase_done(name):
+    """Record that a startup phase finished.
+
+    The phase is timed from the end of the previous phase, so this should
+    be called after each chunk of startup work we want to measure.
+    """
+    global _last_phase_end
+    now = time.time()
+    _phase_times.append((name, now - _last_phase_end, False))
+    _last_phase_end = now
+
+def _log_phase_times():
+    total = sum(phase_time for name, phase_time, in_thread in _phase_times
+            if not in_thread)
+    logging.timing("Startup time: %.3f", total)
+    for name, phase_time, in_thread in _phase_times:
+        if in_thread:
+            logging.timing("  %s (in thread): %.3f", name, phase_time)
+        else:
+            logging.timing("  %s: %.3f", name, phase_time)
+
+class BackgroundPhase(object):
+    """Startup phase that runs in its own thread.
+
+    This is for phases that don't use the database, so they can run while
+    the event loop thread is busy loading it.  Call join() to get the
+    result.  If the phase raised an exception, join() re-raises it so that
+    startup_function handles it like any other startup error.
+    """
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.result = None
+        self.exc_info = None
+        self.run_time = None
+        self.thread = threading.Thread(target=self._run,
+                name="Startup - %s" % name)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def _run(self):
+        start = time.time()
+        try:
+            self.result = self.func()
+        except StandardError:
+            self.exc_info = sys.exc_info()
+        self.run_time = time.time() - start
+
+    def join(self):
+        self.thread.join()
+        _phase_times.append((self.name, self.run_time, True))
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.result
+
+def start_background_phases():
+    """Start the startup phases that don't depend on the database.
+
+    :returns: dict mapping names to BackgroundPhase objects
+    """
+    return {
+        'converters': BackgroundPhase("loading video converters",
+            conversions.conversion_manager.startup),
+        'devices': BackgroundPhase("loading device database",
+            devices.DeviceManager),
+    }
+
 def _movies_directory_gone_handler(callback):
     """Default _movies_directory_gone_handler.  The frontend should
     override this using the ``install_movies_directory_gone_handler``
@@ -266,12 +357,15 @@ def load_extensions():
 
 @startup_function
 def finish_startup(obj, thread):
+    _start_phase_timing()
     database.set_thread(thread)
+    background_phases = start_background_phases()
     logging.info("Installing deleted file checker...")
     item.setup_deleted_checker()
     logging.info("Restoring database...")
-    start = time.time()
     app.db = storedatabase.LiveStorage()
+    if DEBUG_DB_QUERY_PLANS:
+        app.db.enable_query_plan_log()
     try:
         app.db.upgrade_database()
     except databaseupgrade.DatabaseTooNewError:
@@ -289,8 +383,7 @@ def finish_startup(obj, thread):
     except storedatabase.UpgradeError:
         raise StartupError(None, None)
     database.initialize()
-    end = time.time()
-    logging.timing("Database upgrade time: %.3f", end - start)
+    _phase_done("database upgrade")
     if app.db.startup_version != app.db.current_version:
         databaselog.info("Upgraded database from version %s to %s",
                 app.db.startup_version, app.db.current_version)
@@ -306,32 +399,40 @@ def finish_startup(obj, thread):
     app.item_info_cache = iteminfocache.ItemInfoCache()
     app.item_info_cache.load()
     dbupgradeprogress.upgrade_end()
+    _phase_done("item info cache")
 
     logging.info("Loading video converters...")
-    conversions.conversion_manager.startup()
-    app.device_manager = devices.DeviceManager()
+    background_phases['converters'].join()
+    app.device_manager = background_phases['devices'].join()
+    _phase_done("waiting for converters and devices")
     app.device_tracker = devicetracker.DeviceTracker()
+    _phase_done("device tracker")
 
     searchengines.create_engines()
     setup_global_feeds()
     # call fix_database_inconsistencies() ASAP after the manual feed is set up
     fix_database_inconsistencies()
+    _phase_done("global feeds")
     logging.info("setup tabs...")
     setup_tabs()
     logging.info("setup theme...")
     setup_theme()
+    _phase_done("tabs and theme")
     install_message_handler()
     itemsource.setup_handlers()
+    _phase_done("message handlers")
 
     app.download_state_manager = downloader.DownloadStateManager()
     app.download_state_manager.init_controller()
 
     app.movie_data_updater = moviedata.MovieDataUpdater()
+    _phase_done("downloader state")
 
     # Call this late, after the message handlers have been installed.
     app.sharing_tracker = sharing.SharingTracker()
     app.sharing_manager = sharing.SharingManager()
     app.transcode_manager = transcode.TranscodeManager()
+    _phase_done("sharing")
 
     eventloop.add_urgent_call(check_firsttime, "check first time")
 
@@ -405,9 +506,15 @@ def finish_backend_startup():
     """Last bit of startup required before we load the frontend.  """
     # Uncomment the next line to test startup error handling
     # raise StartupError("Test Error", "Startup Failed")
+    # don't count the time we spent waiting for the user in the first time
+    # wizard or the movies directory gone dialog
+    _reset_phase_clock()
     reconnect_downloaders()
+    _phase_done("reconnect downloaders")
     guide.download_guides()
     feed.remove_orphaned_feed_impls()
+    _phase_done("guides and orphaned feeds")
+    _log_phase_times()
     messages.StartupSuccess().send_to_frontend()
 
 @eventloop.idle_iterator
@@ -557,13 +664,20 @@ def clear_icon_cache_orphans():
     yield None
 
     knownIcons = iconcache.IconCache.all_filenames()
+    # files that are being written haven't been saved to the DB yet
+    knownIcons.extend(iconcache.pending_filenames())
     yield None
 
-    knownIcons = [ os.path.normcase(fileutil.expand_filename(path)) for path in
-            knownIcons]
+    knownIcons = set(os.path.normcase(fileutil.expand_filename(path))
+            for path in knownIcons)
     yield None
 
     for filename in existingFiles:
+        # Writes can start while we're yielding, so check for temp files
+        # that are in use right before deleting things.
+        if iconcache.is_temp_file_in_use(filename):
+            yield None
+            continue
         if (os.path.exists(filename)
                 and os.path.basename(filename)[0] != '.'
                 and os.path.basename(filename) != 'extracted'
@@ -55,6 +55,7 @@ import datetime
 import traceback
 import time
 import os
+import re
 import sys
 from cStringIO import StringIO
 
@@ -108,6 +109,8 @@ _sqlite_type_map = {
 }
 
 VERSION_KEY = "Democracy Version"
+# identifies the database that an in-progress upgrade was copied from
+UPGRADE_SOURCE_KEY = "Upgrade Source"
 
 def split_values_for_sqlite(value_list):
     """Split a list of values into chunks that SQL can handle.
@@ -121,6 +124,127 @@ def split_values_for_sqlite(value_list):
         yield value_list[start:start+CHUNK_SIZE]
 
 
+class QueryPlanLog(object):
+    """Records query plans and timings for the SELECT statements we run.
+
+    This is a diagnostic tool for finding queries that need an index.
+    Statements are grouped by their shape, which is the SQL text with
+    whitespace normalized and runs of placeholders collapsed, so that
+    "id IN (?, ?)" and "id IN (?, ?, ?)" count as the same statement.
+
+    The first time we see a shape we run ``EXPLAIN QUERY PLAN`` on it.  If
+    the plan scans a whole table and a single run takes longer than
+    scan_threshold seconds, we log a warning about it.
+    """
+
+    _whitespace_re = re.compile(r'\s+')
+    _placeholders_re = re.compile(r'\?(\s*,\s*\?)+')
+
+    def __init__(self, scan_threshold=0.01):
+        self.scan_threshold = scan_threshold
+        self.stats = {}
+
+    def statement_shape(self, sql):
+        shape = self._whitespace_re.sub(' ', sql.strip())
+        return self._placeholders_re.sub('?, ...', shape)
+
+    def should_explain(self, sql):
+        """Check if sql is a SELECT statement whose plan we don't know yet.
+        """
+        if not sql.lstrip()[:6].upper() == 'SELECT':
+            return False
+        return self.statement_shape(sql) not in self.stats
+
+    def explain(self, connection, sql, values):
+        """Run EXPLAIN QUERY PLAN for sql and remember the plan.
+
+        We use a separate cursor so that we don't clobber the results of the
+        main one.
+        """
+        cursor = connection.cursor()
+        try:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, values)
+            # the detail text is always the last column, but the number of
+            # columns before it depends on the sqlite version.
+            plan = [row[-1] for row in cursor.fetchall()]
+        except sqlite3.DatabaseError, e:
+            plan = ['error explaining query: %s' % e]
+        finally:
+            cursor.close()
+        self.stats[self.statement_shape(sql)] = QueryStats(plan)
+
+    def record(self, sql, query_time):
+        """Record how long a statement took to run."""
+        try:
+            stats = self.stats[self.statement_shape(sql)]
+        except KeyError:
+            # not a statement we explained
+            return
+        stats.add_time(query_time)
+        if (stats.full_scans and not stats.flagged and
+                query_time > self.scan_threshold):
+            stats.flagged = True
+            logging.timing("full table scan of %s (%0.3f seconds): %s",
+                    ', '.join(stats.full_scans), query_time,
+                    self.statement_shape(sql))
+
+    def flagged_statements(self):
+        return [shape for shape, stats in self.stats.items()
+                if stats.flagged]
+
+    def log_report(self):
+        """Log the statements we've seen, slowest first."""
+        by_time = sorted(self.stats.items(), key=lambda i: -i[1].total_time)
+        logging.timing("query plan report (%d statements)", len(by_time))
+        for shape, stats in by_time:
+            if stats.flagged:
+                flag = "FULL SCAN "
+            else:
+                flag = ""
+            logging.timing("%s%d runs, %0.3f total, %0.3f max: %s\n  %s",
+                    flag, stats.count, stats.total_time, stats.max_time,
+                    shape, '\n  '.join(stats.plan))
+
+class QueryStats(object):
+    """Query plan and timings for a statement shape in QueryPlanLog."""
+    def __init__(self, plan):
+        self.plan = plan
+        self.full_scans = [self._scanned_table(detail) for detail in plan
+                if self._scanned_table(detail)]
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.flagged = False
+
+    def add_time(self, query_time):
+        self.count += 1
+        self.total_time += query_time
+        self.max_time = max(self.max_time, query_time)
+
+    @staticmethod
+    def _scanned_table(detail):
+        """Get the table that a query plan line scans completely.
+
+        Older versions of sqlite say "SCAN TABLE foo" or "TABLE foo", newer
+        ones say "SCAN foo".  Scans that use an index aren't counted.
+
+        :returns: table name, or None if detail isn't a full table scan
+        """
+        words = detail.split()
+        if len(words) < 2 or 'USING' in words or 'WITH' in words:
+            return None
+        if words[0] == 'SCAN':
+            if words[1] in ('SUBQUERY', 'CONSTANT'):
+                return None
+            elif words[1] == 'TABLE' and len(words) > 2:
+                return words[2]
+            else:
+                return words[1]
+        elif words[0] == 'TABLE':
+            return words[1]
+        return None
+
+
 class LiveStorage:
     """Handles the storage of DDBObjects.
 
@@ -153,6 +277,7 @@ class LiveStorage:
         self.raise_load_errors = False # only gets set in unittests
         self._dc = None
         self._query_times = {}
+        self._query_plan_log = None
         self.path = path
         self._quitting_from_operational_error = False
         self._object_schemas = object_schemas
@@ -202,6 +327,8 @@ class LiveStorage:
             self._dc.cancel()
             self._dc = None
         self.finish_transaction()
+        if self._query_plan_log is not None:
+            self._query_plan_log.log_report()
 
         # the unittests run in memory and vacuum causes a segfault if
         # the db is in memory.
@@ -289,7 +416,7 @@ class LiveStorage:
         else:
             raise UpgradeError()
 
-    def _change_database_file(self, ver):
+    def _change_database_file(self, ver, resumable=False):
         """Switches the sqlitedb file that we have open
 
         This is called before doing a database upgrade.  This allows
@@ -299,12 +426,33 @@ class LiveStorage:
         It also creates a backup in the backups/ directory of the
         database.
 
+        If resumable is True and an earlier upgrade of this database got
+        interrupted, we switch to the file it was using instead, so the
+        upgrade can continue where it left off.
+
         :param ver: the current version (as string)
+        :param resumable: can we resume an interrupted upgrade?
         """
         logging.info("database path: %s", self.path)
+        if resumable:
+            source = (ver, databaseupgrade.get_next_id(self.cursor))
         # close database
         self.close(ignore_vacuum_error=False)
 
+        if resumable:
+            source += (os.path.getsize(self.path),)
+            resume_path = os.path.join(os.path.dirname(self.path),
+                    "upgrading_database_%s" % ver)
+            if self._can_resume_upgrade(resume_path, source):
+                logging.info("resuming database upgrade in %s", resume_path)
+                self._changed_db_path = resume_path
+                self.open_connection(resume_path)
+                return
+            elif os.path.exists(resume_path):
+                logging.info("removing stale upgrade database %s",
+                        resume_path)
+                os.remove(resume_path)
+
         # copy the db to a backup file for posterity
         target_path = self.get_backup_directory()
         save_name = self._find_unused_db_name(
@@ -319,6 +467,27 @@ class LiveStorage:
 
         self._changed_db_path = os.path.join(target_path, save_name)
         self.open_connection(self._changed_db_path)
+        if resumable:
+            self.set_variable(UPGRADE_SOURCE_KEY, source)
+
+    def _can_resume_upgrade(self, path, source):
+        """Check if path holds an interrupted upgrade of our database.
+
+        :param source: the upgrade source info for our database
+        """
+        if not os.path.exists(path):
+            return False
+        try:
+            connection = sqlite3.connect(path)
+            try:
+                row = connection.execute("SELECT serialized_value "
+                        "FROM dtv_variables WHERE name=?",
+                        (UPGRADE_SOURCE_KEY,)).fetchone()
+            finally:
+                connection.close()
+        except sqlite3.DatabaseError:
+            return False
+        return row is not None and cPickle.loads(str(row[0])) == source
 
     def _change_database_file_back(self):
         """Switches the sqlitedb file back to our regular one.
@@ -349,10 +518,15 @@ class LiveStorage:
             # _upgrade_20_database will have done an upgrade
             dbupgradeprogress.doing_new_style_upgrade()
             current_version = self._get_version()
-            self._change_database_file(current_version)
+            self._change_database_file(current_version, resumable=True)
+            # if we're resuming an upgrade, the database we switched to is
+            # already partway there
             databaseupgrade.new_style_upgrade(self.cursor,
-                                              current_version,
-                                              self._schema_version)
+                                              self._get_version(),
+                                              self._schema_version,
+                                              step_finished=self._set_version)
+            self.cursor.execute("DELETE FROM dtv_variables WHERE name=?",
+                    (UPGRADE_SOURCE_KEY,))
             self._set_version()
             self._change_database_file_back()
         self.current_version = self._schema_version
@@ -565,7 +739,8 @@ class LiveStorage:
     def object_from_class_table(self, obj, klass):
         return self._schema_map[klass] is self._schema_map[obj.__class__]
 
-    def _get_query_bottom(self, table_name, where, joins, order_by, limit):
+    def _get_query_bottom(self, table_name, where, joins, order_by, limit,
+            group_by=None):
         sql = StringIO()
         sql.write("FROM %s\n" % table_name)
         if joins is not None:
@@ -573,6 +748,8 @@ class LiveStorage:
                 sql.write('LEFT JOIN %s ON %s\n' % (join_table, join_where))
         if where is not None:
             sql.write("WHERE %s" % where)
+        if group_by is not None:
+            sql.write(" GROUP BY %s" % group_by)
         if order_by is not None:
             sql.write(" ORDER BY %s" % order_by)
         if limit is not None:
@@ -613,7 +790,7 @@ class LiveStorage:
         sql.write("SELECT %s.id " % table_name)
         sql.write(self._get_query_bottom(table_name, where, joins,
             order_by, limit))
-        self.cursor.execute(sql.getvalue(), values)
+        self._time_execute(sql.getvalue(), values, False)
         return (row[0] for row in self.cursor.fetchall())
 
     def _restore_objects(self, schema, id_set):
@@ -629,7 +806,7 @@ class LiveStorage:
             sql.write("FROM %s WHERE id IN (%s)" % (schema.table_name, 
                 ', '.join('?' for i in xrange(len(id_list_chunk)))))
 
-            self.cursor.execute(sql.getvalue(), id_list_chunk)
+            self._time_execute(sql.getvalue(), id_list_chunk, False)
             for row in self.cursor.fetchall():
                 self._restore_object_from_row(schema, row)
 
@@ -690,26 +867,51 @@ class LiveStorage:
         self._execute(sql.getvalue(), values, is_update=True)
 
     def select(self, klass, columns, where, values, joins=None, limit=None,
-            convert=True):
+            convert=True, group_by=None, order_by=None):
         schema = self._schema_map[klass]
         sql = StringIO()
         sql.write('SELECT %s ' % ', '.join(columns))
-        sql.write(self._get_query_bottom(schema.table_name, where, joins, None,
-            limit))
+        sql.write(self._get_query_bottom(schema.table_name, where, joins,
+            order_by, limit, group_by))
         results = self._execute(sql.getvalue(), values)
         if not convert:
             return results
-        schema_items = [self._schema_column_map[schema, c] for c in columns]
+        # columns can be qualified with our table name, to avoid ambiguity
+        # when there are joins
+        prefix = schema.table_name + '.'
+        column_names = [c[len(prefix):] if c.startswith(prefix) else c
+                for c in columns]
+        schema_items = [self._schema_column_map[schema, c]
+                for c in column_names]
         rows = []
         for row in results:
             converted_row = []
-            for name, schema_item, value in itertools.izip(columns,
+            for name, schema_item, value in itertools.izip(column_names,
                     schema_items, row):
-                converted_row.append(self._converter.from_sql(schema, name,
+                converted_row.append(self._select_from_sql(schema, name,
                     schema_item, value))
             rows.append(converted_row)
         return rows
 
+    def _select_from_sql(self, schema, name, schema_item, value):
+        """Convert a value for select().
+
+        Like _restore_object_from_row(), we fall back on the schema's
+        handle_malformed_* method if the conversion fails.  We don't know
+        which row the value came from, so we can't fix the value in the
+        database.  That happens when the object gets restored.
+        """
+        try:
+            return self._converter.from_sql(schema, name, schema_item, value)
+        except StandardError:
+            handler = self._converter.get_malformed_data_handler(schema,
+                    name, schema_item, value)
+            if handler is None:
+                raise
+            logging.warn("error converting %s (%r), using %s", name, value,
+                    handler.__name__)
+            return handler(value)
+
     def on_event_finished(self, eventloop, success):
         self.finish_transaction(commit=success)
 
@@ -767,6 +969,9 @@ class LiveStorage:
             return self.cursor.fetchall()
 
     def _time_execute(self, sql, values, many):
+        plan_log = self._query_plan_log
+        if plan_log is not None and not many and plan_log.should_explain(sql):
+            plan_log.explain(self.connection, sql, values)
         start = time.time()
         if many:
             self.cursor.executemany(sql, values)
@@ -774,6 +979,16 @@ class LiveStorage:
             self.cursor.execute(sql, values)
         end = time.time()
         self._check_time(sql, end-start)
+        if plan_log is not None and not many:
+            plan_log.record(sql, end-start)
+
+    def enable_query_plan_log(self, scan_threshold=0.01):
+        """Start recording query plans and timings for SELECT statements.
+
+        See QueryPlanLog for details.  The report gets logged when the
+        database is closed.
+        """
+        self._query_plan_log = QueryPlanLog(scan_threshold)
 
     def _log_error(self, sql, values, many):
             # printing the traceback here in whole rather than doing
@@ -54,6 +54,7 @@ from miro import prefs
 from miro import crashreport
 from miro import eventloop
 from miro import gtcache
+from miro import messagecodec
 from miro import messagetools
 from miro import trapcall
 from miro import util
@@ -70,7 +71,9 @@ def _on_windows():
 #
 # We spawn a child process and communicate to it by sending messages through
 # it's stdin and stdout.  Each message contains a length (a unsigned long)
-# followed by a pickled object.
+# followed by an object encoded with message_codec.  Messages classes that get
+# sent often can register with message_codec to use a compact encoding,
+# everything else gets pickled.
 #
 # The communication goes like this:
 #
@@ -210,6 +213,8 @@ class SubprocessResponder(messagetools.MessageHandler):
         else:
             logging.warn("Error in subprocess: %s", msg.report)
 
+message_codec = messagecodec.MessageCodec()
+
 class LoadError(StandardError):
     """Exception for corrupt data when reading from a pipe."""
 
@@ -249,20 +254,22 @@ def _load_obj(pipe):
         raise LoadError("EOF reached while reading size field "
                 "(read %s bytes)" % len(size_data))
     size = struct.unpack("L", size_data)[0]
-    pickle_data = _read_bytes_from_pipe(pipe, size)
-    if len(pickle_data) < size:
-        raise LoadError("EOF reached while reading pickle data "
-                "(read %s bytes)" % len(pickle_data))
+    data = _read_bytes_from_pipe(pipe, size)
+    if len(data) < size:
+        raise LoadError("EOF reached while reading message data "
+                "(read %s bytes)" % len(data))
     try:
-        return pickle.loads(pickle_data)
+        return message_codec.decode(data)
     except pickle.PickleError:
         raise LoadError("Pickle data corrupt")
+    except messagecodec.DecodeError, e:
+        raise LoadError("Message data corrupt: %s" % e)
     except ImportError:
         raise LoadError("Pickle data references unimportable module")
     except StandardError, e:
         # log this exception for easier debugging.
         _send_subprocess_error_for_exception()
-        raise LoadError("Unknown error in pickle.loads: %s" % e)
+        raise LoadError("Unknown error decoding message: %s" % e)
 
 def _dump_obj(obj, pipe):
     """Dump an object to the other side of the pipe.
@@ -271,8 +278,8 @@ def _dump_obj(obj, pipe):
     :raises pickle.PickleError: obj could not be pickled
     """
 
-    pickle_data = pickle.dumps(obj)
-    size_data = struct.pack("L", len(pickle_data))
+    data = message_codec.encode(obj)
+    size_data = struct.pack("L", len(data))
     # NOTE: We do a blocking write here.  This should be fine, since on both
     # sides we have a thread dedicated to just reading from the pipe and
     # pushing the data into a Queue.  However, there's some chance that the
@@ -280,7 +287,7 @@ def _dump_obj(obj, pipe):
     # is hung.  I (BDK) can't really see a way for this to realistically
     # happen, so we stick with blocking writes.
     pipe.write(size_data)
-    pipe.write(pickle_data)
+    pipe.write(data)
     pipe.flush()
 
 class SubprocessManager(object):
@@ -47,11 +47,13 @@ import logging
 import urllib2
 import urlparse
 
+from miro import app
 from miro import httpclient
 from miro import singleclick
 from miro import feed
 from miro import folder
 from miro import guide
+from miro import feedupdate
 
 
 SUBSCRIBE_HOSTS = ('subscribe.getdemocracy.com', 'subscribe.getmiro.com')
@@ -130,6 +132,16 @@ class Subscriber(object):
     handlers (OPML import, one-click links in the Guide, and
     command-line additions).
     """
+    # subscription types that we create inside a BulkSQLManager batch
+    BULK_TYPES = ('folder', 'feed')
+
+    def __init__(self):
+        # (url, search_term) for each feed that we already have
+        self.feed_keys = None
+        # are we creating feeds inside our own BulkSQLManager batch?
+        self.bulk_import = False
+        # feeds that we created in the current batch
+        self.new_feeds = []
 
     def add_subscriptions(self, subscriptions_list, parent_folder=None):
         """
@@ -148,7 +160,47 @@ class Subscriber(object):
         Returns a tuple of dictionaries (added, ignored).  Each
         dictionary maps a subscription type (feed, site, download) to
         the number of added/ignored items in this subscription.
+
+        Folders and feeds get created first, inside a BulkSQLManager batch,
+        with their final settings.  Then the new feeds are handed to the
+        feed update queue as a group, which limits how many load at once.
         """
+        bulk_subscriptions = []
+        other_subscriptions = []
+        for subscription in subscriptions_list:
+            if subscription['type'] in self.BULK_TYPES:
+                bulk_subscriptions.append(subscription)
+            else:
+                other_subscriptions.append(subscription)
+
+        self.feed_keys = feed.all_feed_keys()
+        self.new_feeds = []
+        if app.bulk_sql_manager.active:
+            # someone else is handling bulk mode, so let the feeds load as
+            # they get inserted
+            added, ignored = self._add_subscriptions(bulk_subscriptions,
+                    parent_folder)
+        else:
+            app.bulk_sql_manager.start()
+            self.bulk_import = True
+            try:
+                added, ignored = self._add_subscriptions(bulk_subscriptions,
+                        parent_folder)
+            finally:
+                self.bulk_import = False
+                app.bulk_sql_manager.finish()
+                feedupdate.load_feeds(self.new_feeds)
+                self.new_feeds = []
+
+        other_added, other_ignored = self._add_subscriptions(
+                other_subscriptions, parent_folder)
+        for key, value in other_added.items():
+            added.setdefault(key, []).extend(value)
+        for key, value in other_ignored.items():
+            ignored.setdefault(key, []).extend(value)
+        return added, ignored
+
+    def _add_subscriptions(self, subscriptions_list, parent_folder):
         added = {}
         ignored = {}
         for subscription in subscriptions_list:
@@ -192,7 +244,7 @@ class Subscriber(object):
         assert parent_folder is None, "no nested folders"
         title = folder_dict['title']
         obj = folder.ChannelFolder(title)
-        return self.add_subscriptions(folder_dict['children'], obj)
+        return self._add_subscriptions(folder_dict['children'], obj)
 
     def handle_feed(self, feed_dict, parent_folder):
         """
@@ -211,29 +263,37 @@ class Subscriber(object):
         url = feed_dict['url']
 
         search_term = feed_dict.get('search_term')
-        f = feed.lookup_feed(url, search_term)
-        if f is None:
-            f = feed.Feed(url, search_term=search_term)
-            title = feed_dict.get('title')
-            if title is not None and title != '':
-                f.set_title(title)
-            auto_download_mode = feed_dict.get('auto_download_mode')
-            if ((auto_download_mode is not None
-                 and auto_download_mode in ['all', 'new', 'off'])):
-                f.set_auto_download_mode(auto_download_mode)
-            expiry_time = feed_dict.get('expiry_time')
-            if expiry_time is not None and expiry_time != '':
-                if expiry_time == 'system':
-                    f.set_expiration(u'system', 0)
-                elif expiry_time == 'never':
-                    f.set_expiration(u'never', 0)
-                else:
-                    f.set_expiration(u'feed', expiry_time)
-            if parent_folder is not None:
-                f.set_folder(parent_folder)
-            return True
-        else:
+        if self.feed_keys is None:
+            self.feed_keys = feed.all_feed_keys()
+        if (url, search_term) in self.feed_keys:
             return False
+        self.feed_keys.add((url, search_term))
+
+        f = feed.Feed(url, search_term=search_term)
+        title = feed_dict.get('title')
+        if title == '':
+            title = None
+        auto_download_mode = feed_dict.get('auto_download_mode')
+        if auto_download_mode not in ['all', 'new', 'off']:
+            auto_download_mode = None
+        expiry_time = feed_dict.get('expiry_time')
+        if expiry_time is None or expiry_time == '':
+            expiration = None
+        elif expiry_time == 'system':
+            expiration = (u'system', 0)
+        elif expiry_time == 'never':
+            expiration = (u'never', 0)
+        else:
+            expiration = (u'feed', expiry_time)
+        f.set_initial_settings(title=title,
+                auto_download_mode=auto_download_mode,
+                expiration=expiration, folder=parent_folder)
+        if self.bulk_import:
+            # load the feed through the update queue once the batch is
+            # done, rather than as soon as it gets inserted
+            f.load_on_insert = False
+            self.new_feeds.append(f)
+        return True
 
     def handle_site(self, site_dict, parent_folder):
         """
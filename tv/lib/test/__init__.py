@@ -60,6 +60,7 @@ from miro.test.httpclienttest import *
 from miro.test.httpdownloadertest import *
 from miro.test.httpauthtoolstest import *
 from miro.test.feedtest import *
+from miro.test.feedupdatetest import *
 from miro.test.feedparsertest import *
 from miro.test.parseurltest import *
 from miro.test.utiltest import *
@@ -75,6 +76,7 @@ from miro.test.filetypestest import *
 from miro.test.cellpacktest import *
 from miro.test.searchtest import *
 from miro.test.infolisttest import *
+from miro.test.imagepooltest import *
 from miro.test.fileobjecttest import *
 from miro.test.fastresumetest import *
 from miro.test.widgetstateconstantstest import *
@@ -86,6 +88,8 @@ from miro.test.subprocesstest import *
 from miro.test.itemfiltertest import *
 from miro.test.extensiontest import *
 from miro.test.idleiteratetest import *
+from miro.test.messagecodectest import *
+from miro.test.startuptest import *
 
 # platform specific tests
 
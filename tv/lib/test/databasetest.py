@@ -37,6 +37,27 @@ class ViewTest(DatabaseTestCase):
         self.assertSameSet(view, [self.i2, self.i1])
         self.assertEquals(view.count(), 2)
 
+    def test_select(self):
+        view = item.Item.make_view(order_by='id')
+        self.assertEquals(view.select('id', 'feed_id'),
+                [(self.i1.id, self.feed.id), (self.i2.id, self.feed.id),
+                    (self.i3.id, self.feed2.id)])
+
+    def test_select_join(self):
+        # columns should come from our table, even if the joined table has
+        # columns with the same name
+        self.feed.set_title(u'booya')
+        view = item.Item.make_view("feed.userTitle='booya'",
+                joins={'feed': 'feed.id=item.feed_id'})
+        self.assertSameSet(view.select('id'), [(self.i1.id,), (self.i2.id,)])
+
+    def test_select_doesnt_restore(self):
+        # select() shouldn't load objects into memory
+        self.clear_ddb_object_cache()
+        view = item.Item.make_view()
+        self.assertEquals(len(view.select('id')), 3)
+        self.assertEquals(app.db.persistent_object_count(), 0)
+
 class ViewTrackerTest(DatabaseTestCase):
     def setUp(self):
         DatabaseTestCase.setUp(self)
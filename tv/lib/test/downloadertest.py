@@ -1,11 +1,14 @@
 import os
+import time
 
 from miro import app
 from miro import downloader
 from miro import eventloop
+from miro import item
 from miro import models
 from miro import prefs
-from miro.test.framework import EventLoopTest, uses_httpclient
+from miro.dl_daemon import command, download
+from miro.test.framework import EventLoopTest, MiroTestCase, uses_httpclient
 
 class DownloaderTest(EventLoopTest):
     """Test feeds that download things.
@@ -75,3 +78,289 @@ class DownloaderTest(EventLoopTest):
     ## def test_resume_fail(self):
     ##     # FIXME - implement this
     ##     pass
+
+def make_downloader(feed, url, state, auto_downloaded=False, **status):
+    """Create a RemoteDownloader for a new item in feed.
+
+    The downloader gets its state from its status dict, so we set state
+    there, along with any other status values given as keyword arguments.
+    """
+    item_ = models.Item(item.FeedParserValues({'title': url}),
+            feed_id=feed.id)
+    item_.autoDownloaded = auto_downloaded
+    dler = downloader.RemoteDownloader(url, item_)
+    dler.status['state'] = state
+    dler.status.update(status)
+    dler.signal_change()
+    item_.set_downloader(dler)
+    return dler
+
+class CleanupIncompleteDownloadsTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.download_dir = os.path.join(self.tempdir, 'Incomplete Downloads')
+        os.makedirs(self.download_dir)
+        self.feed = models.Feed(u'http://example.com/feed')
+
+    def make_file(self, name):
+        path = os.path.join(self.download_dir, name)
+        open(path, 'w').write('data')
+        return path
+
+    def make_downloader(self, filename, state):
+        url = u'http://example.com/%s' % self.feed.items.count()
+        return make_downloader(self.feed, url, state, filename=filename)
+
+    def test_files_in_use(self):
+        path = self.make_file('downloading.avi')
+        self.make_downloader(path, u'downloading')
+        self.make_downloader('paused.avi', u'paused')
+        self.make_downloader(self.make_file('failed.avi'), u'failed')
+        self.make_downloader('', u'finished')
+        self.assertEquals(
+            downloader._incomplete_files_in_use(self.download_dir),
+            set([path, os.path.join(self.download_dir, 'paused.avi')]))
+
+    def test_malformed_status(self):
+        # A corrupt status column shouldn't stop us from finding the other
+        # files, or the downloader daemon from starting up.
+        path = self.make_file('downloading.avi')
+        self.make_downloader(path, u'downloading')
+        corrupt = self.make_downloader(self.make_file('corrupt.avi'),
+                u'downloading')
+        app.db.cursor.execute("UPDATE remote_downloader "
+                "SET status='{baddata' WHERE id=?", (corrupt.id,))
+        self.assertEquals(
+            downloader._incomplete_files_in_use(self.download_dir),
+            set([path]))
+
+    def test_remove_unused(self):
+        in_use = self.make_file('in-use.avi')
+        unused = self.make_file('unused.avi')
+        unused_dir = os.path.join(self.download_dir, 'unused-dir')
+        os.makedirs(unused_dir)
+        # files changed after we started shouldn't be touched, the
+        # downloader daemon might have just created them
+        new = self.make_file('new.avi')
+        cutoff = time.time() - 60
+        os.utime(unused, (cutoff - 60, cutoff - 60))
+        os.utime(unused_dir, (cutoff - 60, cutoff - 60))
+        os.utime(in_use, (cutoff - 60, cutoff - 60))
+        downloader._remove_unused_incomplete_files(self.download_dir,
+                set([in_use]), cutoff)
+        self.assert_(os.path.exists(in_use))
+        self.assert_(os.path.exists(new))
+        self.assert_(not os.path.exists(unused))
+        self.assert_(not os.path.exists(unused_dir))
+
+class DownloadRestarterTest(EventLoopTest):
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.feed = models.Feed(u'http://example.com/feed')
+        app.config.set(prefs.MAX_MANUAL_DOWNLOADS, 1)
+        app.config.set(prefs.DOWNLOADS_TARGET, 1)
+        app.config.set(prefs.LIMIT_DOWNSTREAM_BT, False)
+        self.restarted = []
+        self.orig_restart = downloader.RemoteDownloader.restart
+        def restart(dler):
+            self.restarted.append(dler)
+            app.download_state_manager.add_download(dler.dlid, dler)
+        downloader.RemoteDownloader.restart = restart
+
+    def tearDown(self):
+        downloader.RemoteDownloader.restart = self.orig_restart
+        EventLoopTest.tearDown(self)
+
+    def make_downloader(self, state, auto_downloaded=False):
+        # use magnet links, so that RemoteDownloader doesn't try to fetch
+        # the content type
+        url = u'magnet:?xt=urn:btih:%040d' % self.feed.items.count()
+        dler = make_downloader(self.feed, url, state,
+                auto_downloaded=auto_downloaded)
+        # restart_on_startup_if_needed() only restarts uploads that the
+        # user started
+        dler.manualUpload = True
+        dler.signal_change()
+        return dler
+
+    def test_priority(self):
+        upload = self.make_downloader(u'uploading')
+        auto1 = self.make_downloader(u'downloading', auto_downloaded=True)
+        manual1 = self.make_downloader(u'downloading')
+        finished = self.make_downloader(u'finished')
+        auto2 = self.make_downloader(u'offline', auto_downloaded=True)
+        manual2 = self.make_downloader(u'downloading')
+        restarter = downloader.DownloadRestarter([upload, auto1, manual1,
+            finished, auto2, manual2])
+        # we should restart 2 downloads at once (MAX_MANUAL_DOWNLOADS +
+        # DOWNLOADS_TARGET), manual downloads first
+        restarter.start()
+        self.assertEquals(self.restarted, [manual1, manual2])
+        restarter._restart_batch()
+        self.assertEquals(self.restarted, [manual1, manual2, auto1, auto2])
+        restarter._restart_batch()
+        self.assertEquals(self.restarted, [manual1, manual2, auto1, auto2,
+            upload])
+        self.assertEquals(len(restarter.queue), 0)
+        self.assertEquals(restarter.timeout, None)
+
+    def test_bandwidth_limit(self):
+        # if we're using most of our bandwidth, we should only restart 1
+        # download at a time
+        dlers = [self.make_downloader(u'downloading') for i in xrange(3)]
+        app.config.set(prefs.LIMIT_DOWNSTREAM_BT, True)
+        app.config.set(prefs.DOWNSTREAM_BT_LIMIT_IN_KBS, 100)
+        app.download_state_manager.total_down_rate = 95 * 1024
+        restarter = downloader.DownloadRestarter(dlers)
+        restarter.start()
+        self.assertEquals(self.restarted, dlers[:1])
+        app.download_state_manager.total_down_rate = 10 * 1024
+        restarter._restart_batch()
+        self.assertEquals(self.restarted, dlers)
+
+    def test_already_restarted(self):
+        # downloads that something else already restarted shouldn't be
+        # restarted again, or count against the batch
+        dlers = [self.make_downloader(u'downloading') for i in xrange(3)]
+        app.download_state_manager.add_download(dlers[0].dlid, dlers[0])
+        restarter = downloader.DownloadRestarter(dlers)
+        restarter.start()
+        self.assertEquals(self.restarted, dlers[1:])
+
+    def test_cancel(self):
+        dlers = [self.make_downloader(u'downloading') for i in xrange(3)]
+        restarter = downloader.DownloadRestarter(dlers)
+        restarter.start()
+        self.assertNotEquals(restarter.timeout, None)
+        restarter.cancel()
+        self.assertEquals(restarter.timeout, None)
+        self.assertEquals(len(restarter.queue), 0)
+
+class FakeDaemonDownloader(object):
+    """Stands in for a BGDownloader in the downloader daemon."""
+    def __init__(self, status):
+        self.status = status
+
+    def get_status(self):
+        return self.status.copy()
+
+class StatusPatchTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.feed = models.Feed(u'http://example.com/feed')
+        self.updater = download.DownloadStatusUpdater()
+        self.sent = []
+        self.orig_send = command.BatchUpdateDownloadStatus.send
+        def send(cmd, callback=None):
+            self.sent.append(cmd)
+        command.BatchUpdateDownloadStatus.send = send
+
+    def tearDown(self):
+        command.BatchUpdateDownloadStatus.send = self.orig_send
+        MiroTestCase.tearDown(self)
+
+    def make_pair(self, **status):
+        """Make a RemoteDownloader and a daemon downloader for it."""
+        dler = make_downloader(self.feed, u'http://example.com/%d' %
+                self.feed.items.count(), u'downloading')
+        status['dlid'] = dler.dlid
+        status.setdefault('state', u'downloading')
+        return dler, FakeDaemonDownloader(status)
+
+    def send_update(self, *daemon_dlers):
+        """Send a status update and run it in the main process.
+
+        :returns: the BatchUpdateDownloadStatus command that we sent
+        """
+        for daemon_dler in daemon_dlers:
+            self.updater.queue_update(daemon_dler)
+        self.updater.do_update(periodic=False)
+        cmd = self.sent.pop()
+        # go through the same encoding that we use to send the command
+        cmd = command.BatchUpdateDownloadStatus.from_compact(
+                cmd.to_compact())
+        cmd.action()
+        return cmd
+
+    def check_status(self, dler, daemon_dler):
+        expected = daemon_dler.get_status()
+        self.assertEquals(dler.status, expected)
+
+    def test_patch(self):
+        dler, daemon_dler = self.make_pair(currentSize=0, totalSize=100,
+                rate=0)
+        cmd = self.send_update(daemon_dler)
+        # the first update has to send the full status
+        statuses, cmd_done, patches = cmd.args
+        self.assertEquals(len(statuses), 1)
+        self.assertEquals(patches, [])
+        self.check_status(dler, daemon_dler)
+        daemon_dler.status['currentSize'] = 50
+        daemon_dler.status['rate'] = 10
+        cmd = self.send_update(daemon_dler)
+        statuses, cmd_done, patches = cmd.args
+        self.assertEquals(statuses, [])
+        self.assertEquals(patches, [{'dlid': dler.dlid, 'currentSize': 50,
+            'rate': 10}])
+        self.check_status(dler, daemon_dler)
+
+    def test_unchanged(self):
+        # downloaders with nothing new shouldn't be sent at all
+        dler, daemon_dler = self.make_pair(currentSize=0)
+        self.send_update(daemon_dler)
+        self.updater.queue_update(daemon_dler)
+        self.updater.do_update(periodic=False)
+        self.assertEquals(self.sent, [])
+
+    def test_removed_keys(self):
+        dler, daemon_dler = self.make_pair(currentSize=0, upRate=5,
+                seeders=3)
+        self.send_update(daemon_dler)
+        del daemon_dler.status['upRate']
+        del daemon_dler.status['seeders']
+        cmd = self.send_update(daemon_dler)
+        patches = cmd.args[2]
+        self.assertEquals(len(patches), 1)
+        self.assertSameSet(patches[0][command.PATCH_REMOVED_KEYS],
+                ['seeders', 'upRate'])
+        self.check_status(dler, daemon_dler)
+
+    def test_resync(self):
+        dler, daemon_dler = self.make_pair(currentSize=0)
+        self.send_update(daemon_dler)
+        # pretend that the main process missed some changes.  After
+        # FULL_RESYNC_INTERVAL updates, we should send the full status.
+        dler._daemon_status['totalSize'] = 1000
+        dler._daemon_status['bogus'] = 1
+        daemon_dler.status['currentSize'] = 10
+        self.updater.updates_since_resync = (
+                self.updater.FULL_RESYNC_INTERVAL - 1)
+        cmd = self.send_update(daemon_dler)
+        statuses, cmd_done, patches = cmd.args
+        self.assertEquals(len(statuses), 1)
+        self.assertEquals(patches, [])
+        self.check_status(dler, daemon_dler)
+        self.assertEquals(self.updater.updates_since_resync, 0)
+
+    def test_resync_forgets_removed_downloaders(self):
+        dler, daemon_dler = self.make_pair(currentSize=0)
+        self.send_update(daemon_dler)
+        self.assert_(dler.dlid in self.updater.last_sent)
+        self.updater.updates_since_resync = (
+                self.updater.FULL_RESYNC_INTERVAL - 1)
+        self.updater.do_update(periodic=False)
+        # the fake downloader isn't in download._downloads
+        self.assertEquals(self.updater.last_sent, {})
+
+    def test_patch_without_saved_status(self):
+        # If we never got a full status, for example because the daemon sent
+        # one before we restarted, patches get applied to our own status.
+        dler, daemon_dler = self.make_pair(currentSize=0, totalSize=100)
+        dler.status = daemon_dler.get_status()
+        dler.signal_change()
+        self.assertEquals(dler._daemon_status, None)
+        self.updater._remember_status(daemon_dler.get_status())
+        daemon_dler.status['currentSize'] = 50
+        cmd = self.send_update(daemon_dler)
+        self.assertEquals(cmd.args[0], [])
+        self.check_status(dler, daemon_dler)
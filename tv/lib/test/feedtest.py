@@ -313,6 +313,79 @@ jalabel_nov28.jpg" />
         self.assertEqual(len(items), 4)
         my_feed.remove()
 
+class NoGUIDMatchingTest(FeedTestCase):
+    # Test matching entries without guids to existing items.  These get
+    # matched by their enclosures.
+    def write_feed(self, entries):
+        xml_entries = []
+        for title, url, description in entries:
+            xml_entries.append("""\
+      <item>
+         <title>%s</title>
+         <enclosure url="%s" type="video/mpeg" length="100"/>
+         <description>%s</description>
+      </item>""" % (title, url, description))
+        self.write_file("""<?xml version="1.0"?>
+<rss version="2.0">
+   <channel>
+      <title>Feed without guids</title>
+      <link>http://example.com/</link>
+      <description>Feed without guids</description>
+%s
+   </channel>
+</rss>""" % '\n'.join(xml_entries))
+
+    def make_entries(self, count, title_prefix='Item'):
+        return [('%s %d' % (title_prefix, i),
+            'http://example.com/video-%d.mpeg' % i,
+            'Description %d' % i) for i in xrange(count)]
+
+    def test_reupdate(self):
+        self.write_feed(self.make_entries(20))
+        my_feed = self.make_feed()
+        self.assertEqual(Item.make_view().count(), 20)
+        self.update_feed(my_feed)
+        self.assertEqual(Item.make_view().count(), 20)
+
+    def test_changed_titles(self):
+        # entries with changed titles but the same enclosures should update
+        # the existing items rather than creating new ones.
+        self.write_feed(self.make_entries(20))
+        my_feed = self.make_feed()
+        items_by_url = dict((i.url, i.id) for i in Item.make_view())
+        self.write_feed(self.make_entries(20, title_prefix='Renamed'))
+        self.update_feed(my_feed)
+        items = list(Item.make_view())
+        self.assertEqual(len(items), 20)
+        for item in items:
+            self.assertEqual(item.id, items_by_url[item.url])
+            self.assert_(item.entry_title.startswith(u'Renamed'))
+
+    def test_changed_enclosure(self):
+        # entries with new enclosures should create new items
+        entries = self.make_entries(5)
+        self.write_feed(entries)
+        my_feed = self.make_feed()
+        entries[0] = ('Item 0', 'http://example.com/video-new.mpeg',
+                'Description 0')
+        self.write_feed(entries)
+        self.update_feed(my_feed)
+        urls = set(i.url for i in Item.make_view())
+        self.assertEqual(len(urls), 6)
+        self.assert_(u'http://example.com/video-new.mpeg' in urls)
+
+    def test_duplicate_enclosures(self):
+        # entries that share an enclosure should still match a single item
+        # each time we update.
+        entries = self.make_entries(3)
+        entries.append(('Another Item 0', 'http://example.com/video-0.mpeg',
+            'Description 0'))
+        self.write_feed(entries)
+        my_feed = self.make_feed()
+        count = Item.make_view().count()
+        self.update_feed(my_feed)
+        self.assertEqual(Item.make_view().count(), count)
+
 class OldItemExpireTest(FeedTestCase):
     # Test that old items expire when the feed gets too big
     def setUp(self):
@@ -0,0 +1,146 @@
+from miro import app
+from miro import feedupdate
+from miro import prefs
+from miro import signals
+from miro.test.framework import EventLoopTest, MiroTestCase
+
+class FakeFeed(signals.SignalEmitter):
+    def __init__(self, id, url):
+        signals.SignalEmitter.__init__(self, 'update-finished',
+                'load-finished', 'removed')
+        self.id = id
+        self.url = url
+        self.update_count = 0
+        self.load_count = 0
+
+    def get_title(self):
+        return self.url
+
+    def get_url(self):
+        return self.url
+
+    def update(self):
+        self.update_count += 1
+
+    def start_initial_load(self):
+        self.load_count += 1
+
+class UpdateIntervalTrackerTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.tracker = feedupdate.UpdateIntervalTracker()
+
+    def test_unchanged_feeds_back_off(self):
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 60)
+        self.tracker.record_update_result(1, False)
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 120)
+        self.tracker.record_update_result(1, False)
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 240)
+        # other feeds shouldn't be affected
+        self.assertEquals(self.tracker.calc_interval(2, 60, 600), 60)
+
+    def test_max_interval(self):
+        for i in xrange(20):
+            self.tracker.record_update_result(1, False)
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 600)
+        # the base interval wins over the max interval
+        self.assertEquals(self.tracker.calc_interval(1, 900, 600), 900)
+        # negative max interval disables backing off
+        self.assertEquals(self.tracker.calc_interval(1, 60, -1), 60)
+
+    def test_changed_feeds_reset(self):
+        for i in xrange(5):
+            self.tracker.record_update_result(1, False)
+        self.tracker.record_update_result(1, True)
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 60)
+
+    def test_forget_feed(self):
+        self.tracker.record_update_result(1, False)
+        self.tracker.forget_feed(1)
+        self.assertEquals(self.tracker.calc_interval(1, 60, 600), 60)
+
+class FeedUpdateQueueTest(EventLoopTest):
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.queue = feedupdate.FeedUpdateQueue()
+
+    def queue_feeds(self, feeds):
+        for feed in feeds:
+            self.queue.update_queue.append((feed, feed.update))
+        self.queue.run_update_queue()
+
+    def finish_update(self, feed):
+        feed.emit('update-finished')
+        self.runPendingIdles()
+
+    def test_max_updates(self):
+        feeds = [FakeFeed(i, u'http://host%d.example.com/' % i)
+                for i in xrange(feedupdate.MAX_UPDATES + 2)]
+        self.queue_feeds(feeds)
+        self.assertEquals(len(self.queue.currently_updating),
+                feedupdate.MAX_UPDATES)
+        self.finish_update(feeds[0])
+        self.assertEquals(len(self.queue.currently_updating),
+                feedupdate.MAX_UPDATES)
+        self.assertEquals(feeds[-2].update_count, 1)
+        self.assertEquals(feeds[-1].update_count, 0)
+
+    def test_max_updates_per_host(self):
+        same_host = [FakeFeed(i, u'http://example.com/feed%d' % i)
+                for i in xrange(feedupdate.MAX_UPDATES_PER_HOST + 1)]
+        other_host = FakeFeed(100, u'http://other.example.com/')
+        self.queue_feeds(same_host + [other_host])
+        # the last feed from example.com should wait, but the feed from the
+        # other host shouldn't wait behind it
+        self.assertEquals(same_host[-1].update_count, 0)
+        self.assertEquals(other_host.update_count, 1)
+        self.assertEquals(list(self.queue.update_queue),
+                [(same_host[-1], same_host[-1].update)])
+        self.finish_update(same_host[0])
+        self.assertEquals(same_host[-1].update_count, 1)
+        self.assertEquals(len(self.queue.update_queue), 0)
+
+    def test_load_feeds(self):
+        feeds = [FakeFeed(i, u'http://host%d.example.com/' % i)
+                for i in xrange(feedupdate.MAX_UPDATES + 2)]
+        self.queue.load_feeds(feeds)
+        self.assertEquals([f.load_count for f in feeds],
+                [1] * feedupdate.MAX_UPDATES + [0, 0])
+        # loads finish with load-finished, not update-finished
+        feeds[0].emit('update-finished')
+        self.runPendingIdles()
+        self.assertEquals(feeds[-2].load_count, 0)
+        feeds[0].emit('load-finished')
+        self.runPendingIdles()
+        self.assertEquals(feeds[-2].load_count, 1)
+        self.assertEquals(feeds[-1].load_count, 0)
+        # regular updates for the feeds use update-finished again
+        feeds[0].update_count = 0
+        self.queue_feeds([feeds[0]])
+        self.assertEquals(feeds[0].update_count, 0)
+        feeds[1].emit('load-finished')
+        self.runPendingIdles()
+        self.assertEquals(feeds[-1].load_count, 1)
+        feeds[2].emit('load-finished')
+        self.runPendingIdles()
+        self.assertEquals(feeds[0].update_count, 1)
+        feeds[0].emit('update-finished')
+        self.runPendingIdles()
+        self.assert_(feeds[0] not in self.queue.currently_updating)
+
+    def test_periodic_update_delay(self):
+        scheduled = []
+        def schedule_update(delay, feed, update_callback):
+            scheduled.append(delay)
+        self.queue.schedule_update = schedule_update
+        app.config.set(prefs.MAX_CHANNEL_CHECK_INTERVAL_X_MN, 10)
+        feed = FakeFeed(1, u'http://example.com/')
+        self.queue.schedule_periodic_update(60, feed, feed.update)
+        self.queue.record_update_result(feed, False)
+        self.queue.schedule_periodic_update(60, feed, feed.update)
+        for i in xrange(10):
+            self.queue.record_update_result(feed, False)
+        self.queue.schedule_periodic_update(60, feed, feed.update)
+        self.queue.record_update_result(feed, True)
+        self.queue.schedule_periodic_update(60, feed, feed.update)
+        self.assertEquals(scheduled, [60, 120, 600, 60])
@@ -258,6 +258,9 @@ class FakeMetadataProgressUpdater(object):
         # we should test this, but for now it's just a stub
         pass
 
+    def path_queued(self, path):
+        pass
+
 class MiroTestCase(unittest.TestCase):
     def setUp(self):
         self.setup_log_filter()
@@ -1,9 +1,15 @@
+import os
+
+from miro import app
 from miro import database
+from miro import httpclient
+from miro import prefs
 
 from miro import iconcache
 from miro import item
 from miro import feed
 from miro import guide
+from miro import startup
 
 from miro.test.framework import EventLoopTest, uses_httpclient
 
@@ -52,3 +58,239 @@ class IconCacheTest(EventLoopTest):
                 iconcache.IconCache.get_by_id, item_icon_cache_id)
         self.assertRaises(database.ObjectNotFoundError,
                 iconcache.IconCache.get_by_id, guide_icon_cache_id)
+
+class IconCacheFileTest(EventLoopTest):
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.cache_dir = self.make_temp_dir_path()
+        app.config.set(prefs.ICON_CACHE_DIRECTORY, self.cache_dir)
+        self.old_updater = iconcache.icon_cache_updater
+        iconcache.icon_cache_updater = iconcache.IconCacheUpdater()
+        self.feed = feed.Feed(u'http://example.com/')
+        self.items = [item.Item(item.FeedParserValues({}),
+            feed_id=self.feed.id) for i in xrange(3)]
+        self.process_idles()
+
+    def tearDown(self):
+        iconcache.icon_cache_updater = self.old_updater
+        EventLoopTest.tearDown(self)
+
+    def update_icon(self, obj, body, filename='icon.jpg'):
+        info = {'status': 200, 'body': body, 'filename': filename}
+        obj.icon_cache.updating = True
+        obj.icon_cache.update_icon_cache(u'http://example.com/icon', info)
+        self.processThreads()
+        self.process_idles()
+
+    def cache_files(self):
+        return [f for f in os.listdir(self.cache_dir)
+                if not f.startswith('.')]
+
+    def test_shared_file(self):
+        # icons with the same contents should share a file
+        for obj in self.items:
+            self.update_icon(obj, 'icon-data')
+        filenames = set(obj.icon_cache.filename for obj in self.items)
+        self.assertEquals(len(filenames), 1)
+        self.assertEquals(len(self.cache_files()), 1)
+        self.assertEquals(iconcache.IconCache.all_filenames(),
+                list(filenames))
+        # different contents should get a different file
+        self.update_icon(self.feed, 'other-icon-data')
+        self.assertNotEquals(self.feed.icon_cache.filename,
+                self.items[0].icon_cache.filename)
+        self.assertEquals(len(self.cache_files()), 2)
+
+    def test_remove_shared_file(self):
+        for obj in self.items:
+            self.update_icon(obj, 'icon-data')
+        filename = self.items[0].icon_cache.filename
+        self.items[0].remove()
+        self.items[1].remove()
+        # items[2] still uses the file
+        self.assert_(os.path.exists(filename))
+        self.items[2].remove()
+        self.assert_(not os.path.exists(filename))
+
+    def test_remove_shared_file_not_loaded(self):
+        # reference counts should include rows for objects that aren't
+        # loaded into memory
+        self.update_icon(self.items[0], 'icon-data')
+        self.update_icon(self.items[1], 'icon-data')
+        filename = self.items[0].icon_cache.filename
+        item_id = self.items[0].id
+        self.clear_ddb_object_cache()
+        item.Item.get_by_id(item_id).remove()
+        self.assert_(os.path.exists(filename))
+        self.assertEquals(iconcache.IconCache.filename_ref_count(filename),
+                1)
+
+    def test_update_releases_old_file(self):
+        self.update_icon(self.items[0], 'icon-data')
+        self.update_icon(self.items[1], 'icon-data')
+        old_filename = self.items[0].icon_cache.filename
+        self.update_icon(self.items[0], 'new-icon-data')
+        self.assert_(os.path.exists(old_filename))
+        self.update_icon(self.items[1], 'new-icon-data')
+        self.assert_(not os.path.exists(old_filename))
+        self.assertEquals(len(self.cache_files()), 1)
+
+    def test_orphan_sweep_skips_temp_files(self):
+        info = {'status': 200, 'body': 'icon-data', 'filename': 'icon.jpg'}
+        self.items[0].icon_cache.updating = True
+        self.items[0].icon_cache.update_icon_cache(u'http://example.com/icon',
+                info)
+        # pretend the write is in progress in the thread pool
+        filename = iconcache.pending_filenames()[0]
+        in_progress = [filename + '.part', filename + '.1.part']
+        stale = os.path.join(self.cache_dir, 'abcdef.jpg.part')
+        for path in in_progress + [stale]:
+            open(path, 'w').write('data')
+        startup.clear_icon_cache_orphans()
+        self.runPendingIdles()
+        for path in in_progress:
+            self.assert_(os.path.exists(path))
+        self.assert_(not os.path.exists(stale))
+        # once the write finishes we should have the icon
+        self.processThreads()
+        self.process_idles()
+        self.assertEquals(self.items[0].icon_cache.filename, filename)
+        self.assert_(os.path.exists(filename))
+
+    def test_extension(self):
+        self.update_icon(self.items[0], 'icon-data', filename='icon.PNG')
+        self.assert_(self.items[0].icon_cache.filename.endswith('.png'))
+        self.update_icon(self.items[1], 'icon-data2',
+                filename='icon?size=large&format=png')
+        self.assertEquals(os.path.splitext(
+            self.items[1].icon_cache.filename)[1], '')
+
+class FakeDBItem(object):
+    def __init__(self, id):
+        self.id = id
+
+    def confirm_db_thread(self):
+        pass
+
+    def get_thumbnail_url(self):
+        return None
+
+class FakeIconCache(object):
+    def __init__(self, id, url):
+        self.dbItem = FakeDBItem(id)
+        self.url = url
+        self.filename = None
+        self.updating = False
+        self.needsUpdate = False
+        self.started = False
+
+    def get_update_url(self):
+        return self.url
+
+    def request_icon(self):
+        self.started = True
+
+class IconCacheUpdaterTest(EventLoopTest):
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.updater = iconcache.IconCacheUpdater()
+        app.config.set(prefs.ICON_CACHE_MAX_FETCHES, 4)
+        app.config.set(prefs.ICON_CACHE_MAX_FETCHES_PER_HOST, 2)
+        self.id_counter = 0
+
+    def make_icon_cache(self, url):
+        self.id_counter += 1
+        return FakeIconCache(self.id_counter, url)
+
+    def request(self, icon_caches, is_vital=False):
+        for ic in icon_caches:
+            self.updater.request_update(ic, is_vital)
+        self.runPendingIdles()
+
+    def finish(self, icon_cache):
+        self.updater.update_finished(icon_cache)
+        self.runPendingIdles()
+
+    def test_global_limit(self):
+        icon_caches = [self.make_icon_cache(u'http://host%d.com/icon' % i)
+                for i in xrange(6)]
+        self.request(icon_caches)
+        self.assertEquals([ic.started for ic in icon_caches],
+                [True] * 4 + [False] * 2)
+        self.finish(icon_caches[0])
+        self.assertEquals([ic.started for ic in icon_caches],
+                [True] * 5 + [False])
+
+    def test_host_limit(self):
+        same_host = [self.make_icon_cache(u'http://example.com/icon%d' % i)
+                for i in xrange(3)]
+        other_host = self.make_icon_cache(u'http://other.com/icon')
+        self.request(same_host + [other_host])
+        # the 3rd icon from example.com should wait, but it shouldn't hold
+        # up the icon from other.com
+        self.assertEquals([ic.started for ic in same_host],
+                [True, True, False])
+        self.assert_(other_host.started)
+        self.finish(same_host[0])
+        self.assert_(same_host[2].started)
+
+    def test_shared_url(self):
+        # icon caches for the same URL share a download, so they shouldn't
+        # count against the limits.
+        icon_caches = [self.make_icon_cache(u'http://example.com/icon')
+                for i in xrange(10)]
+        self.request(icon_caches)
+        self.assert_(all(ic.started for ic in icon_caches))
+        self.assertEquals(self.updater.get_stats()['running'], 10)
+
+    def test_priority(self):
+        app.config.set(prefs.ICON_CACHE_MAX_FETCHES, 1)
+        running = self.make_icon_cache(u'http://example.com/running')
+        self.request([running])
+        idle = self.make_icon_cache(u'http://example.com/idle')
+        vital = self.make_icon_cache(u'http://example.com/vital')
+        visible = self.make_icon_cache(u'http://example.com/visible')
+        self.request([idle, visible])
+        self.request([vital], is_vital=True)
+        self.updater.set_visible_items([visible.dbItem.id])
+        stats = self.updater.get_stats()
+        self.assertEquals(stats['queued_visible'], 1)
+        self.assertEquals(stats['queued_vital'], 1)
+        self.assertEquals(stats['queued_idle'], 1)
+        started_order = []
+        current = running
+        for i in xrange(3):
+            self.finish(current)
+            current = [ic for ic in (idle, vital, visible)
+                    if ic.started and ic not in started_order][0]
+            started_order.append(current)
+        self.assertEquals(started_order, [visible, vital, idle])
+
+    def test_no_duplicates(self):
+        app.config.set(prefs.ICON_CACHE_MAX_FETCHES, 1)
+        running = self.make_icon_cache(u'http://example.com/running')
+        waiting = self.make_icon_cache(u'http://example.com/waiting')
+        self.request([running, waiting, waiting, waiting])
+        self.assertEquals(self.updater.get_stats()['queued_idle'], 1)
+        # requesting an update for a running icon cache shouldn't queue it
+        self.request([running])
+        self.assertEquals(self.updater.get_stats()['queued_idle'], 1)
+
+    def test_grab_url_shared(self):
+        calls = []
+        def fake_grab_url(url, callback, errback):
+            calls.append((url, callback, errback))
+        old_grab_url = httpclient.grab_url
+        httpclient.grab_url = fake_grab_url
+        try:
+            results = []
+            for i in xrange(3):
+                self.updater.grab_url(u'http://example.com/icon',
+                        results.append, None)
+        finally:
+            httpclient.grab_url = old_grab_url
+        self.assertEquals(len(calls), 1)
+        self.assertEquals(self.updater.get_stats()['downloading'], 1)
+        calls[0][1]('info')
+        self.assertEquals(results, ['info'] * 3)
+        self.assertEquals(self.updater.get_stats()['downloading'], 0)
@@ -0,0 +1,89 @@
+from miro.test.framework import MiroTestCase
+from miro.frontends.widgets import imagepool
+
+class FakeImage(object):
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def resize(self, width, height):
+        return FakeImage(width, height)
+
+    def crop_and_scale(self, src_x, src_y, src_width, src_height,
+            dest_width, dest_height):
+        return FakeImage(dest_width, dest_height)
+
+class ImagePoolTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.loaded = []
+        self.orig_load_image = imagepool.load_image
+        imagepool.load_image = self.load_image
+        # 100x100 images take up 40000 bytes, so we can hold 2 of them
+        self.pool = imagepool.ImagePool(100, 100000)
+
+    def tearDown(self):
+        imagepool.load_image = self.orig_load_image
+        MiroTestCase.tearDown(self)
+
+    def load_image(self, path):
+        self.loaded.append(path)
+        if path == 'broken':
+            return imagepool.broken_image
+        return FakeImage(100, 100)
+
+    def check_stats(self, hits, misses):
+        stats = self.pool.get_stats()
+        self.assertEquals((stats['hits'], stats['misses']), (hits, misses))
+
+    def test_weight(self):
+        self.pool.get(('a', None))
+        self.pool.get(('a', (50, 50)))
+        self.assertEquals(self.pool.total_weight, 40000 + 10000)
+        # the scaled image should be made from the cached image
+        self.assertEquals(self.loaded, ['a'])
+        self.check_stats(0, 2)
+        self.pool.get(('a', (50, 50)))
+        self.check_stats(1, 2)
+
+    def test_scaled_only(self):
+        # we shouldn't keep the full-sized image if only a scaled version
+        # was asked for
+        image = self.pool.get(('a', (50, 50)))
+        self.assertEquals((image.width, image.height), (50, 50))
+        self.assert_(('a', None) not in self.pool)
+        self.assertEquals(self.pool.total_weight, 10000)
+        self.assertEquals(self.pool.get(('a', (50, 50))), image)
+        self.check_stats(1, 1)
+
+    def test_unscaled_resize(self):
+        # resize_image() returns the image as-is if it would have to upsize
+        # it too much.  We shouldn't count it twice.
+        image = self.pool.get(('a', None))
+        self.assert_(self.pool.get(('a', (1000, 1000))) is image)
+        self.assertEquals(len(self.pool), 1)
+        self.assertEquals(self.pool.total_weight, 40000)
+        self.check_stats(1, 1)
+        self.pool.get(('a', (1000, 1000)))
+        self.check_stats(2, 1)
+
+    def test_eviction(self):
+        for path in ('a', 'b', 'c'):
+            self.pool.get((path, None))
+        self.assert_(('a', None) not in self.pool)
+        self.assertEquals(len(self.pool), 2)
+        self.assertEquals(self.pool.total_weight, 80000)
+        self.assertEquals(self.pool.get_stats()['evictions'], 1)
+        # using b should make c the least recently used
+        self.pool.get(('b', (50, 50)))
+        self.pool.get(('a', None))
+        self.assert_(('b', None) in self.pool)
+        self.assert_(('b', (50, 50)) in self.pool)
+        self.assert_(('c', None) not in self.pool)
+        self.assertEquals(self.pool.total_weight, 90000)
+
+    def test_broken_image(self):
+        # broken_image is always in memory, so it shouldn't count
+        self.assert_(self.pool.get(('broken', None)) is
+                imagepool.broken_image)
+        self.assertEquals(self.pool.total_weight, 0)
@@ -229,6 +229,18 @@ class InfoListDataTest(InfoListTestBase):
         self.check_update_sort(self.sorter, reverse=True)
         self.check_update(1, 'aaa', 2, 'ZZZ', resort=True)
 
+    def test_update_resort_many(self):
+        # move lots of nodes at once, including several that end up next to
+        # each other and at the start/end of the list
+        self.check_insert(self.make_infos(*['item-%02d' % i
+            for i in xrange(50)]))
+        self.check_update(3, 'a', 10, 'b', 40, 'item-20a', 41, 'item-20b',
+                42, 'item-20c', 0, 'zzz', 49, 'item-00a', 25, 'item-25',
+                resort=True)
+        self.check_update_sort(self.sorter, reverse=True)
+        self.check_update(5, 'a', 6, 'item-30a', 7, 'item-30b', 8, 'zz',
+                9, 'zzzz', resort=True)
+
     def test_non_integer_id(self):
         infos = self.make_infos('m', 'i', 'r', 'o', 'p', 'c', 'f')
         for i in infos:
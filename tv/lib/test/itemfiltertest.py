@@ -1,3 +1,4 @@
+from miro import app
 from miro.frontends.widgets import itemfilter
 
 from miro.test.framework import MiroTestCase
@@ -5,13 +6,26 @@ from miro.test.framework import MiroTestCase
 class FakeItemInfo(object):
     # really simple item info.  This is just enough to pass it to a couple
     # filters
-    def __init__(self, file_type, downloaded):
+    def __init__(self, file_type, downloaded, id=None, watched=False):
+        self.id = id
         self.file_type = file_type
+        self.video_watched = watched
         if downloaded:
             self.video_path = '/fake/filename'
         else:
             self.video_path = None
 
+class FakePlaybackManager(object):
+    def __init__(self):
+        self.playing_item = None
+
+    def get_playing_item(self):
+        return self.playing_item
+
+    def is_playing_item(self, item_info):
+        return (self.playing_item is not None and
+                self.playing_item.id == item_info.id)
+
 class ItemFilterTest(MiroTestCase):
     def check_active_filters(self, filter_set, *correct_filters):
         self.assertEquals(filter_set.active_filters,
@@ -79,3 +93,36 @@ class ItemFilterTest(MiroTestCase):
         self.assertEquals(filter_set.filter(audio_item), False)
         self.assertEquals(filter_set.filter(downloaded_video_item), True)
         self.assertEquals(filter_set.filter(downloaded_audio_item), False)
+
+    def check_matching_ids(self, filter_set, items):
+        member_sets = {}
+        for key in filter_set.active_filters:
+            filter_ = itemfilter.ItemFilter.get_filter(key)
+            member_sets[key] = set(i.id for i in items
+                                   if filter_.match_info(i))
+        correct_ids = set(i.id for i in items if filter_set.filter(i))
+        self.assertEquals(filter_set.matching_ids(member_sets), correct_ids)
+
+    def test_matching_ids(self):
+        app.playback_manager = FakePlaybackManager()
+        try:
+            items = []
+            for i in xrange(16):
+                items.append(FakeItemInfo(('audio', 'video')[i & 1],
+                    bool(i & 2), id=i, watched=bool(i & 4)))
+            filter_set = itemfilter.ItemFilterSet()
+            self.check_matching_ids(filter_set, items)
+            filter_set.select('downloaded')
+            self.check_matching_ids(filter_set, items)
+            filter_set.select('video')
+            self.check_matching_ids(filter_set, items)
+            filter_set.select('unplayed')
+            self.check_matching_ids(filter_set, items)
+            # a watched item that's playing should still pass the unplayed
+            # filter
+            app.playback_manager.playing_item = items[7]
+            self.check_matching_ids(filter_set, items)
+            filter_set.set_filters([])
+            self.assertEquals(filter_set.matching_ids({}), None)
+        finally:
+            app.playback_manager = None
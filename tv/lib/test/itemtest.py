@@ -6,7 +6,7 @@ import tempfile
 from miro import app
 from miro import prefs
 from miro.feed import Feed
-from miro.item import Item, FileItem, FeedParserValues
+from miro.item import Item, FileItem, FeedParserValues, DeletedFileChecker
 from miro.fileobject import FilenameType
 from miro.downloader import RemoteDownloader
 from miro.test.framework import MiroTestCase, EventLoopTest
@@ -191,6 +191,63 @@ class ItemRemoveTest(MiroTestCase):
         item.remove()
         self.assert_(not downloader.id_exists())
 
+class FeedCountsTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.feed = Feed(u'http://example.com/1')
+        self.other_feed = Feed(u'http://example.com/2')
+        self.empty_feed = Feed(u'http://example.com/3')
+        self.items = []
+        for i in xrange(6):
+            feed = (i % 2 == 0) and self.feed or self.other_feed
+            url = u'http://example.com/%d/item%d' % (feed.id, i)
+            self.items.append(Item(fp_values_for_url(url), feed_id=feed.id))
+        # make some items downloaded, and some of those watched
+        for i, item in enumerate(self.items[:4]):
+            item.set_downloader(RemoteDownloader(
+                u'http://example.com/movie%d.mpeg' % i, item))
+            item.downloader.status['state'] = u'finished'
+            item.downloader.signal_change()
+            item.file_type = u'video'
+            item.signal_change()
+        self.items[0].mark_item_seen()
+        FileItem(FilenameType('/tmp/fake-file.avi'), self.feed.id)
+
+    def check_counts(self, feed):
+        feed.invalidate_counts()
+        correct_counts = (feed.num_downloaded(), feed.num_downloading(),
+                feed.num_unwatched(), feed.num_available())
+        feed.invalidate_counts()
+        Feed.cache_counts([feed])
+        self.assert_(feed.has_cached_counts())
+        self.assertEquals((feed._num_downloaded, feed._num_downloading,
+            feed._num_unwatched, feed._num_available), correct_counts)
+
+    def test_counts(self):
+        self.check_counts(self.feed)
+        self.check_counts(self.other_feed)
+        self.check_counts(self.empty_feed)
+
+    def test_counts_match_views(self):
+        feeds = [self.feed, self.other_feed, self.empty_feed]
+        counts = Item.feed_counts([f.id for f in feeds])
+        self.assert_(self.empty_feed.id not in counts)
+        for feed in feeds[:2]:
+            self.assertEquals(counts[feed.id], (
+                feed.downloaded_items.count(),
+                feed.downloading_items.count(),
+                feed.unwatched_items.count(),
+                feed.available_items.count(),
+                feed.auto_pending_items.count()))
+
+    def test_only_missing_counts_calculated(self):
+        Feed.cache_counts([self.feed])
+        self.feed._num_unwatched = 100
+        self.other_feed.invalidate_counts()
+        Feed.cache_counts([self.feed, self.other_feed])
+        self.assertEquals(self.feed.num_unwatched(), 100)
+        self.assert_(self.other_feed.has_cached_counts())
+
 class SubtitleEncodingTest(MiroTestCase):
     def setUp(self):
         MiroTestCase.setUp(self)
@@ -266,3 +323,42 @@ class DeletedItemTest(MiroTestCase):
         app.controller.failed_soft_okay = True
         Item._allow_nonexistent_paths = False
         FileItem("/non/existent/path/", feed.id)
+
+class DeletedFileCheckerTest(EventLoopTest):
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.feed = Feed(u'dtv:manualFeed', initiallyAutoDownloadable=False)
+        self.path = os.path.join(self.tempdir, 'video.avi')
+        open(self.path, 'w').write('data')
+        self.item = FileItem(self.path, self.feed.id)
+        Item._allow_nonexistent_paths = False
+        self.checker = DeletedFileChecker()
+        self.checker.start_checks()
+
+    def run_checks(self):
+        self.checker.schedule_check(self.item)
+        self.runPendingIdles()
+        self.processThreads()
+        self.runPendingIdles()
+
+    def test_file_exists(self):
+        self.run_checks()
+        self.assert_(self.item.id_exists())
+        self.assert_(not self.checker.batch_running)
+
+    def test_file_deleted(self):
+        os.remove(self.path)
+        self.run_checks()
+        self.assert_(not self.item.id_exists())
+
+    def test_batch_size(self):
+        # slow stats should shrink the batch size
+        for x in xrange(20):
+            self.checker._update_batch_size(self.checker.batch_size, 10.0)
+        self.assertEquals(self.checker.batch_size,
+                          DeletedFileChecker.MIN_BATCH_SIZE)
+        # fast ones should grow it
+        for x in xrange(20):
+            self.checker._update_batch_size(self.checker.batch_size, 0.001)
+        self.assertEquals(self.checker.batch_size,
+                          DeletedFileChecker.MAX_BATCH_SIZE)
@@ -0,0 +1,98 @@
+import datetime
+
+from miro import messagecodec
+from miro import subprocessmanager
+from miro import workerprocess
+from miro.dl_daemon import command
+from miro.dl_daemon import daemon
+from miro.test.framework import MiroTestCase
+
+class UnregisteredMessage(object):
+    def __init__(self, value):
+        self.value = value
+
+class MessageCodecTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.codec = messagecodec.MessageCodec()
+        self.codec.register(command.BatchUpdateDownloadStatus, 1)
+        self.codec.register(workerprocess.TaskResult, 2)
+
+    def make_status(self, dlid):
+        return {'dlid': dlid,
+                'url': u'http://example.com/%s.torrent' % dlid,
+                'state': u'downloading',
+                'totalSize': 1000,
+                'currentSize': 500,
+                'eta': 10,
+                'rate': 50.5,
+                'filename': '/tmp/%s.part' % dlid,
+                'retryTime': datetime.datetime(2011, 3, 4, 5, 6, 7, 8),
+                'retryCount': -1,
+                'channelName': None}
+
+    def test_status_batch(self):
+        statuses = [self.make_status(u'dl%d' % i) for i in xrange(5)]
+        patches = [{'dlid': u'dl10', 'currentSize': 600}]
+        cmd = command.BatchUpdateDownloadStatus(None, statuses, True,
+                                                patches)
+        data = self.codec.encode(cmd)
+        self.assertEquals(data[0], messagecodec.COMPACT_HEADER)
+        decoded = self.codec.decode(data)
+        self.assertEquals(decoded.__class__,
+                          command.BatchUpdateDownloadStatus)
+        self.assertEquals(decoded.command_id, cmd.command_id)
+        self.assertEquals(decoded.args, (statuses, True, patches))
+        # encoding shouldn't change the original statuses
+        self.assert_(isinstance(statuses[0]['retryTime'],
+                                datetime.datetime))
+
+    def test_task_result(self):
+        result = ('video', 12345, '/tmp/thumbnail.png')
+        data = self.codec.encode(workerprocess.TaskResult(5, result))
+        self.assertEquals(data[0], messagecodec.COMPACT_HEADER)
+        decoded = self.codec.decode(data)
+        self.assertEquals(decoded.task_id, 5)
+        self.assertEquals(decoded.result, result)
+
+    def test_fallback_to_pickle(self):
+        # results that marshal can't handle should be pickled
+        data = self.codec.encode(workerprocess.TaskResult(5,
+                                                          ValueError("foo")))
+        self.assertEquals(data[0], messagecodec.PICKLE_HEADER)
+        decoded = self.codec.decode(data)
+        self.assert_(isinstance(decoded.result, ValueError))
+        # so should messages that aren't registered
+        data = self.codec.encode(UnregisteredMessage(u'foo'))
+        self.assertEquals(data[0], messagecodec.PICKLE_HEADER)
+        self.assertEquals(self.codec.decode(data).value, u'foo')
+        data = self.codec.encode(None)
+        self.assertEquals(self.codec.decode(data), None)
+
+    def test_decode_errors(self):
+        data = self.codec.encode(workerprocess.TaskResult(5, 10))
+        # unknown header
+        self.assertRaises(messagecodec.DecodeError, self.codec.decode,
+                          'X' + data[1:])
+        # unknown version
+        self.assertRaises(messagecodec.DecodeError, self.codec.decode,
+                          data[0] + chr(messagecodec.CODEC_VERSION + 1) +
+                          data[2:])
+        # unknown type code
+        self.assertRaises(messagecodec.DecodeError, self.codec.decode,
+                          data[:2] + chr(100) + data[3:])
+        # truncated header
+        self.assertRaises(messagecodec.DecodeError, self.codec.decode,
+                          data[:2])
+
+    def test_duplicate_type_code(self):
+        self.assertRaises(ValueError, self.codec.register,
+                          UnregisteredMessage, 1)
+
+    def test_channel_codecs(self):
+        # check that the codecs that we actually use have our messages
+        # registered
+        self.assert_(command.BatchUpdateDownloadStatus in
+                     daemon.message_codec.type_codes)
+        self.assert_(workerprocess.TaskResult in
+                     subprocessmanager.message_codec.type_codes)
@@ -4,6 +4,7 @@ import functools
 
 from miro import app
 from miro import prefs
+from miro import util
 
 from miro.feed import Feed
 from miro.guide import ChannelGuide
@@ -381,6 +382,46 @@ class FeedTrackTest(TrackerTest):
         self.runUrgentCalls()
         self.check_message_count(2)
         self.check_changed_message(1, changed=[self.feed1])
+        message = self.test_handler.messages[1]
+        self.assert_('name' in message.fields_changed(self.feed1.id))
+
+    def test_count_change(self):
+        # recalc_counts() should only recalculate the count fields, not
+        # create a new ChannelInfo
+        self.feed1.num_unwatched = lambda: 5
+        def get_thumbnail_path():
+            raise AssertionError("ChannelInfo created from scratch")
+        self.feed1.get_thumbnail_path = get_thumbnail_path
+        self.feed1.recalc_counts()
+        self.runUrgentCalls()
+        self.check_message_count(2)
+        self.check_changed_message(1, changed=[self.feed1])
+        message = self.test_handler.messages[1]
+        self.assertEquals(message.fields_changed(self.feed1.id),
+                          frozenset(['unwatched']))
+
+    def test_count_change_in_folder(self):
+        self.feed2.num_unwatched = lambda: 5
+        self.feed2.recalc_counts()
+        self.runUrgentCalls()
+        self.check_message_count(2)
+        self.check_changed_message(1, changed=[self.feed2, self.feed_folder])
+        message = self.test_handler.messages[1]
+        self.assertEquals(message.fields_changed(self.feed_folder.id),
+                          frozenset(['unwatched']))
+
+    def test_count_change_no_difference(self):
+        # if the counts don't change, we shouldn't send a message
+        self.feed1.recalc_counts()
+        self.runUrgentCalls()
+        self.check_message_count(1)
+
+    def test_count_change_then_full_change(self):
+        self.feed1.recalc_counts()
+        self.feed1.set_title(u"Booya")
+        self.runUrgentCalls()
+        self.check_message_count(2)
+        self.check_changed_message(1, changed=[self.feed1])
 
     @uses_httpclient
     def test_reduce_number_of_messages(self):
@@ -631,7 +672,7 @@ class ItemInfoCacheErrorTest(MiroTestCase):
         for item in self.items:
             cache_info = app.item_info_cache.id_to_info[item.id]
             real_info = itemsource.DatabaseItemSource._item_info_for(item)
-            self.assertEquals(cache_info.__dict__, real_info.__dict__)
+            self.assertEquals(cache_info.get_attrs(), real_info.get_attrs())
         # it should also delete all data from the item cache table
         app.db.cursor.execute("SELECT COUNT(*) FROM item_info_cache")
         self.assertEquals(app.db.cursor.fetchone()[0], 0)
@@ -645,7 +686,7 @@ class ItemInfoCacheErrorTest(MiroTestCase):
                     "WHERE id=%s" % item.id)
             db_info = cPickle.loads(str(app.db.cursor.fetchone()[0]))
             real_info = itemsource.DatabaseItemSource._item_info_for(item)
-            self.assertEquals(db_info.__dict__, real_info.__dict__)
+            self.assertEquals(db_info.get_attrs(), real_info.get_attrs())
 
     def test_failsafe_load_item_change(self):
         # Test Items calling signal_change() when we do a failsafe load
@@ -706,6 +747,43 @@ class ItemInfoCacheErrorTest(MiroTestCase):
         app.db.cursor.execute("SELECT COUNT(*) FROM item_info_cache")
         self.assertEquals(app.db.cursor.fetchone()[0], 0)
 
+class ItemInfoSortKeyTest(MiroTestCase):
+    # Test that we only re-calculate sort keys when the text changes
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.feed = Feed(u'dtv:manualFeed')
+        entry = _build_entry(u'http://example.com/', 'video/x-unknown')
+        self.item = Item(FeedParserValues(entry), feed_id=self.feed.id)
+
+    def get_info(self):
+        return app.item_info_cache.id_to_info[self.item.id]
+
+    def test_unrelated_change(self):
+        old_info = self.get_info()
+        self.item.resumeTime = 10
+        self.item.signal_change()
+        new_info = self.get_info()
+        self.assert_(new_info is not old_info)
+        self.assert_(new_info.name_sort_key is old_info.name_sort_key)
+        self.assert_(new_info.artist_sort_key is old_info.artist_sort_key)
+
+    def test_title_change(self):
+        self.item.title = u'The 10th Title'
+        self.item.signal_change()
+        info = self.get_info()
+        self.assertEquals(info.name_sort_key,
+                util.name_sort_key(u'The 10th Title'))
+
+    def test_copy(self):
+        info = self.get_info()
+        copy = messages.ItemInfo(info.id, **info.get_attrs())
+        self.assert_(copy.name_sort_key is info.name_sort_key)
+        # if the name gets changed before the copy, we should calculate a
+        # new key
+        info.name = u'New Name'
+        copy = messages.ItemInfo(info.id, **info.get_attrs())
+        self.assertEquals(copy.name_sort_key, util.name_sort_key(u'New Name'))
+
 class MetadataProgressUpdaterTest(EventLoopTest):
     def setUp(self):
         EventLoopTest.setUp(self)
@@ -798,6 +876,21 @@ class MetadataProgressUpdaterTest(EventLoopTest):
         self.updater.will_process_path(p1, None)
         self.run_timeouts_and_idles()
 
+    def test_path_queued(self):
+        # path_queued() should count paths that will_process_path() wasn't
+        # called for, and ignore the ones it was.
+        p1 = 'foo.mp3'
+        p2 = 'foo2.mp3'
+        self.updater.will_process_path(p1, None)
+        self.updater.path_queued(p1)
+        self.updater.path_queued(p2)
+        self.run_timeouts_and_idles()
+        self._check_message(0, ('library', 'audio'), 2, 2)
+        self.updater.path_processed(p1)
+        self.updater.path_processed(p2)
+        self.run_timeouts_and_idles()
+        self._check_message(1, ('library', 'audio'), 0, 0)
+
     def test_unexpected_path_added(self):
         # test that calling path_processed() for a path that wasn't set
         # with will_process_path() is a noop
@@ -5,6 +5,7 @@ miro.filetags and the moviedataprogram.
 from miro.test.framework import EventLoopTest, MiroTestCase
 
 import json
+import shutil
 from os import path
 
 from miro import moviedata
@@ -12,6 +13,7 @@ from miro import filetags
 from miro import metadata
 from miro import app
 from miro import models
+from miro import workerprocess
 from miro import filetypes
 from miro.feed import Feed
 from miro.plat import resources
@@ -172,6 +174,117 @@ class MovieDataRequestTest(MiroTestCase):
         self.check_will_run_moviedata(self.video_item, True)
         self.check_will_run_moviedata(self.audio_item, False)
 
+    def test_requests_batched(self):
+        # requests should be sent to the worker process together, once we
+        # get some idle time
+        batches = []
+        orig_run_batch = workerprocess.run_media_metadata_extractor_batch
+        workerprocess.run_media_metadata_extractor_batch = batches.append
+        try:
+            self.audio_item.duration = None
+            self.rerun_request_update()
+            self.assertEquals(batches, [])
+            app.movie_data_updater.send_pending()
+        finally:
+            workerprocess.run_media_metadata_extractor_batch = orig_run_batch
+        self.assertEquals(len(batches), 1)
+        paths = [job[0] for job in batches[0]]
+        self.assertSameSet(paths, [self.audio_item.get_filename(),
+            self.video_item.get_filename()])
+        # the callbacks for each job should update that item
+        for (path, thumbnail, callback, errback) in batches[0]:
+            callback(('video', 1234, False))
+        self.assertEquals(self.audio_item.duration, 1234)
+        self.assertEquals(self.video_item.duration, 1234)
+        self.assertEquals(self.video_item.mdp_state, moviedata.State.RAN)
+        self.assertEquals(app.movie_data_updater.in_progress, set())
+
+class MovieDataQueueTest(EventLoopTest):
+    """Test how we prioritize movie data requests."""
+    def setUp(self):
+        app.testing_mdp = True # hack to override moviedata's in_unit_tests hack
+        EventLoopTest.setUp(self)
+        self.feed = models.Feed(u'dtv:manualFeed')
+        self.mdu = app.movie_data_updater
+        webm_path = resources.path("testdata/metadata/webm-0.webm")
+        self.items = []
+        for i in xrange(5):
+            path = self.make_temp_path('.webm')
+            shutil.copyfile(webm_path, path)
+            self.items.append(models.FileItem(path, self.feed.id))
+        self.batches = []
+        self.orig_run_batch = workerprocess.run_media_metadata_extractor_batch
+        workerprocess.run_media_metadata_extractor_batch = self.batches.append
+        self.orig_batch_size = moviedata.BATCH_SIZE
+
+    def tearDown(self):
+        workerprocess.run_media_metadata_extractor_batch = self.orig_run_batch
+        moviedata.BATCH_SIZE = self.orig_batch_size
+        del app.testing_mdp
+        EventLoopTest.tearDown(self)
+
+    def sent_paths(self):
+        return [job[0] for batch in self.batches for job in batch]
+
+    def item_paths(self, items):
+        return [i.get_filename() for i in items]
+
+    def test_queue_order(self):
+        # items should be sent in the order they were requested
+        self.mdu.send_pending()
+        self.assertEquals(self.sent_paths(), self.item_paths(self.items))
+
+    def test_visible_items_first(self):
+        visible = [self.items[3], self.items[1]]
+        self.mdu.set_visible_items([i.id for i in visible])
+        self.assertEquals(self.mdu.get_stats()['queued_visible'], 2)
+        self.mdu.send_pending()
+        self.assertEquals(self.sent_paths(), self.item_paths(
+            [self.items[1], self.items[3], self.items[0], self.items[2],
+                self.items[4]]))
+
+    def test_duplicate_requests(self):
+        # requesting an update for a queued item shouldn't queue it again
+        for item in self.items:
+            self.mdu.request_update(item)
+        self.assertEquals(self.mdu.get_stats()['queued_idle'], 5)
+        self.mdu.send_pending()
+        self.assertEquals(self.sent_paths(), self.item_paths(self.items))
+        # or once it's been sent to the worker process
+        for item in self.items:
+            self.mdu.request_update(item)
+        self.mdu.send_pending()
+        self.assertEquals(len(self.batches), 1)
+
+    def test_cancel_on_remove(self):
+        removed = self.items.pop(2)
+        path = removed.get_filename()
+        removed.remove()
+        # removing the item should count it as processed, since we won't
+        # ever run movie data on it
+        self.assert_(path in self.metadata_progress_updater.paths_processed)
+        self.mdu.send_pending()
+        self.assertEquals(self.sent_paths(), self.item_paths(self.items))
+
+    def test_batch_limit(self):
+        # we should only send 2 batches at once, and send more as results
+        # come in
+        moviedata.BATCH_SIZE = 2
+        self.mdu.send_pending()
+        self.assertEquals(len(self.batches), 2)
+        self.assertEquals(self.mdu.get_stats(), {
+            'queued_visible': 0,
+            'queued_idle': 1,
+            'running': 4,
+        })
+        # finish the first batch.  That should schedule sending the last
+        # item
+        for path, thumbnail, callback, errback in self.batches[0]:
+            errback(ValueError())
+        self.runPendingIdles()
+        self.assertEquals(len(self.batches), 3)
+        self.assertEquals(self.sent_paths(), self.item_paths(self.items))
+
 # FIXME
 # theora_with_ogg_extension test case expected to have a screenshot")
 # mp4-0 test case expected to have a screenshot")
@@ -1,8 +1,12 @@
 import unittest
 
+from miro import app
 from miro import autodiscover
 from miro import feed
+from miro import feedupdate
+from miro import folder
 from miro import opml
+from miro import subscription
 
 from miro.fileobject import FilenameType
 
@@ -15,11 +19,7 @@ URL_4 = "http://www.domain-2.com/videos/atom.xml"
 
 # -----------------------------------------------------------------------------
 
-def _get_subs(entry):
-    """Removes most of the boilerplate for getting subscriptions given
-    some specific entry or entries in the <body> ... </body> section.
-    """
-    teststring = u"""\
+OPML_TEMPLATE = u"""\
 <?xml version="1.0" encoding="utf-8" ?>
 <!-- OPML generated by Miro v3.1-git on Thu Jul 22 15:23:10 2010 -->
 <opml version="2.0"
@@ -30,9 +30,13 @@ def _get_subs(entry):
 <body>
   %s
 </body>
-</opml>""" % entry
+</opml>"""
 
-    return autodiscover.parse_content(teststring)
+def _get_subs(entry):
+    """Removes most of the boilerplate for getting subscriptions given
+    some specific entry or entries in the <body> ... </body> section.
+    """
+    return autodiscover.parse_content(OPML_TEMPLATE % entry)
 
 class TestImporter(unittest.TestCase):
     def test_simple_flat(self):
@@ -271,3 +275,74 @@ class TestExporter(MiroTestCase):
     # FIXME - add more export tests
     # FIXME - test folders
     # FIXME - test sites
+
+class TestBulkImport(MiroTestCase):
+    FEED_COUNT = 1000
+    FOLDER_SIZE = 100
+
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.existing_feed = feed.Feed(u"http://example.com/feed0")
+        # don't actually load the feeds, just record what we were asked to
+        # load
+        self.loaded_feeds = []
+        self.orig_load_feeds = feedupdate.load_feeds
+        feedupdate.load_feeds = self.loaded_feeds.append
+        self.orig_generate_feed = feed.Feed.generate_feed
+        def generate_feed(feed_self, removeOnError=False):
+            raise AssertionError("feed loaded on insert: %s" %
+                    feed_self.get_url())
+        feed.Feed.generate_feed = generate_feed
+
+    def tearDown(self):
+        feedupdate.load_feeds = self.orig_load_feeds
+        feed.Feed.generate_feed = self.orig_generate_feed
+        MiroTestCase.tearDown(self)
+
+    def make_opml(self):
+        entries = []
+        for i in xrange(self.FEED_COUNT):
+            if i % self.FOLDER_SIZE == 0:
+                if i > 0:
+                    entries.append('</outline>')
+                entries.append('<outline text="Folder %d">' % i)
+            entries.append('<outline type="rss" text="Feed %d" '
+                    'xmlUrl="http://example.com/feed%d" '
+                    'miro:autoDownload="off" miro:expiryTime="12" />' %
+                    (i, i))
+        entries.append('</outline>')
+        # this one is in the OPML file twice
+        entries.append('<outline type="rss" text="Feed 1" '
+                'xmlUrl="http://example.com/feed1" />')
+        content = (OPML_TEMPLATE % '\n'.join(entries)).encode('utf-8')
+        return opml.Importer().import_content(content)
+
+    def test_import(self):
+        subscriptions = self.make_opml()
+        added, ignored = subscription.Subscriber().add_subscriptions(
+                subscriptions)
+        self.assertEquals(len(added['feed']), self.FEED_COUNT - 1)
+        self.assertEquals([s['url'] for s in ignored['feed']],
+                [u"http://example.com/feed0", u"http://example.com/feed1"])
+        self.assertFalse(app.bulk_sql_manager.active)
+
+        # all the new feeds should be loaded as one group
+        self.assertEquals(len(self.loaded_feeds), 1)
+        new_feeds = self.loaded_feeds[0]
+        self.assertEquals(len(new_feeds), self.FEED_COUNT - 1)
+        feeds = list(feed.Feed.make_view("origURL LIKE 'http://example%'"))
+        self.assertEquals(len(feeds), self.FEED_COUNT)
+        self.assertSameSet(new_feeds + [self.existing_feed], feeds)
+
+        # the feeds should have been created with their final settings
+        folders = dict((f.id, f) for f in folder.ChannelFolder.make_view())
+        self.assertEquals(len(folders), self.FEED_COUNT / self.FOLDER_SIZE)
+        for f in new_feeds:
+            self.assertEquals(f.get_autodownload_mode(), u'off')
+            self.assertEquals(f.get_expiration_type(), u'feed')
+            self.assertEquals(f.get_expiration_time(), 12)
+            number = int(f.origURL[len("http://example.com/feed"):])
+            self.assertEquals(f.get_title(), u"Feed %d" % number)
+            folder_number = number - (number % self.FOLDER_SIZE)
+            self.assertEquals(folders[f.folder_id].get_title(),
+                    u"Folder %d" % folder_number)
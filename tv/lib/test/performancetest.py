@@ -2,13 +2,27 @@ import shutil
 import os
 import pstats
 import cProfile
+import cPickle
+import sys
+import time
 
 from miro import app
+from miro import conversions
+from miro import database
+from miro import devices
+from miro import downloader
+from miro import item
 from miro import messagehandler
 from miro import messages
 from miro import models
+from miro import startup
+from miro import subprocessmanager
+from miro import util
+from miro import workerprocess
+from miro.dl_daemon import command
+from miro.dl_daemon import daemon
 from miro.fileobject import FilenameType
-from miro.test.framework import EventLoopTest
+from miro.test.framework import EventLoopTest, MiroTestCase
 from miro.test import messagetest
 
 class PerformanceTest(EventLoopTest):
@@ -66,3 +80,353 @@ class PerformanceTest(EventLoopTest):
     def track_item_count(self):
         messages.TrackNewVideoCount().send_to_backend()
         self.runUrgentCalls()
+
+class MessageCodecPerformanceTest(MiroTestCase):
+    """Compare the compact message codec with plain pickling."""
+
+    ITERATIONS = 500
+
+    def make_status_batch(self, count):
+        statuses = []
+        for i in xrange(count):
+            statuses.append({'dlid': u'download%08d' % i,
+                'url': u'http://example.com/torrents/%d.torrent' % i,
+                'state': u'downloading',
+                'totalSize': 700000000,
+                'currentSize': i * 1000,
+                'eta': 600,
+                'rate': 51200.0,
+                'upRate': 1024.0,
+                'uploaded': 0,
+                'filename': '/home/user/Incomplete Downloads/%d.avi' % i,
+                'startTime': 1300000000.0,
+                'endTime': 1300000000.0,
+                'shortFilename': '%d.avi' % i,
+                'reasonFailed': u'No Error',
+                'shortReasonFailed': u'No Error',
+                'dlerType': 'BitTorrent',
+                'retryTime': None,
+                'retryCount': -1,
+                'channelName': None,
+                'activity': u'downloading',
+                'seeders': 10,
+                'leechers': 20,
+                'connections': 30,
+                'info_hash': '0123456789abcdef0123456789abcdef01234567'})
+        return command.BatchUpdateDownloadStatus(None, statuses, False, [])
+
+    def _time_round_trip(self, encode, decode, obj):
+        start = time.time()
+        for i in xrange(self.ITERATIONS):
+            data = encode(obj)
+            decode(data)
+        return time.time() - start, len(data)
+
+    def _compare(self, name, codec, obj):
+        def pickle_encode(obj):
+            return cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+        pickle_time, pickle_size = self._time_round_trip(pickle_encode,
+                cPickle.loads, obj)
+        compact_time, compact_size = self._time_round_trip(codec.encode,
+                codec.decode, obj)
+        print '%s (%d round trips)' % (name, self.ITERATIONS)
+        print '  pickle:  %.3fs, %d bytes' % (pickle_time, pickle_size)
+        print '  compact: %.3fs, %d bytes' % (compact_time, compact_size)
+
+    def test_status_batch(self):
+        self._compare('200 download statuses', daemon.message_codec,
+                self.make_status_batch(200))
+
+    def test_task_result(self):
+        result = workerprocess.TaskResult(1, ('video', 1234567,
+            '/home/user/.miro/icon-cache/extracted/foo.avi.png'))
+        self._compare('metadata task result',
+                subprocessmanager.message_codec, result)
+
+class SortKeyInfo(object):
+    def __init__(self, name):
+        self.name = name
+        self.name_sort_key = util.name_sort_key(name)
+
+class SortKeyPerformanceTest(MiroTestCase):
+    """Compare sorting infos with name_sort_key() against using the cached
+    sort keys.
+    """
+
+    INFO_COUNT = 50000
+
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        self.infos = [SortKeyInfo(u'The Episode %d of Show %d' %
+                                  (i % 100, i % 997))
+                      for i in xrange(self.INFO_COUNT)]
+
+    def test_sort_infos(self):
+        start = time.time()
+        sorted(self.infos, key=lambda info: util.name_sort_key(info.name))
+        uncached = time.time() - start
+        start = time.time()
+        sorted(self.infos, key=lambda info: info.name_sort_key)
+        cached = time.time() - start
+        print 'sorting %d infos by name' % self.INFO_COUNT
+        print '  uncached: %.3fs' % uncached
+        print '  cached:   %.3fs' % cached
+
+class DictItemInfo(object):
+    """ItemInfo-like object that stores its attributes in __dict__, like
+    ItemInfo did before it used __slots__.
+    """
+    def __init__(self, attrs):
+        self.__dict__.update(attrs)
+
+    def get_attrs(self):
+        return self.__dict__
+
+class ItemInfoMemoryTest(MiroTestCase):
+    """Compare the memory used by ItemInfos with and without __slots__ and
+    shared strings.
+    """
+
+    INFO_COUNT = 100000
+
+    def make_attrs(self, i):
+        # make new string objects for each item, like we get when reading
+        # rows from the database.
+        def copy(s):
+            return u''.join([s[:1], s[1:]])
+        return {
+            'id': i,
+            'name': u'Episode %d' % i,
+            'description': u'Description for episode %d' % i,
+            'feed_id': i % 50,
+            'feed_name': copy(u'Feed %d' % (i % 50)),
+            'feed_url': copy(u'http://example.com/feed/%d' % (i % 50)),
+            'state': copy(u'saved'),
+            'source_type': copy(u'database'),
+            'file_type': copy(u'video'),
+            'file_format': copy(u'.mp4'),
+            'mime_type': copy(u'video/mp4'),
+            'license': copy(u'http://creativecommons.org/licenses/by/3.0/'),
+            'artist': copy(u'Artist %d' % (i % 200)),
+            'album': copy(u'Album %d' % (i % 400)),
+            'genre': copy(u'Podcast'),
+            'kind': None,
+            'size': 1000 * i,
+            'duration': i % 3600,
+            'video_watched': bool(i % 2),
+            'is_playing': False,
+        }
+
+    def measure(self, infos, has_dict):
+        # count the objects themselves, plus each attribute value once
+        total = 0
+        seen = set()
+        for info in infos:
+            total += sys.getsizeof(info)
+            if has_dict:
+                total += sys.getsizeof(info.__dict__)
+            for value in info.get_attrs().itervalues():
+                if id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        return total
+
+    def test_item_info_memory(self):
+        dict_infos = []
+        slot_infos = []
+        for i in xrange(self.INFO_COUNT):
+            dict_infos.append(DictItemInfo(self.make_attrs(i)))
+            info = messages.ItemInfo.__new__(messages.ItemInfo)
+            info._set_attrs(self.make_attrs(i))
+            slot_infos.append(info)
+        dict_size = self.measure(dict_infos, True)
+        slot_size = self.measure(slot_infos, False)
+        print 'memory used for %d ItemInfos' % self.INFO_COUNT
+        print '  __dict__:               %.1fMB (%d bytes per info)' % (
+            dict_size / 1048576.0, dict_size / self.INFO_COUNT)
+        print '  __slots__ and sharing:  %.1fMB (%d bytes per info)' % (
+            slot_size / 1048576.0, slot_size / self.INFO_COUNT)
+
+class DownloadRestartPerformanceTest(EventLoopTest):
+    """Compare restarting every download at startup with
+    DownloadRestarter.
+
+    For each, we measure how long the event loop is blocked restarting
+    downloads and the size of the first command batch that the downloader
+    daemon has to decode and act on.
+    """
+
+    DOWNLOAD_COUNT = 300
+
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        feed = models.Feed(u'http://example.com/feed')
+        self.downloaders = []
+        for i in xrange(self.DOWNLOAD_COUNT):
+            url = u'magnet:?xt=urn:btih:%040d' % i
+            item_ = models.Item(item.FeedParserValues({'title': url}),
+                    feed_id=feed.id)
+            dler = downloader.RemoteDownloader(url, item_)
+            dler.status = {
+                'dlerType': u'BitTorrent',
+                'state': u'downloading',
+                'filename': '/home/user/Incomplete Downloads/%d.avi' % i,
+                'currentSize': 350000000,
+                'totalSize': 700000000,
+            }
+            # fast resume data is usually tens of KB
+            dler.metainfo = 'd' * 30000
+            dler.signal_change()
+            self.downloaders.append(dler)
+
+    def measure(self, restart):
+        app.download_state_manager = downloader.DownloadStateManager()
+        start = time.time()
+        restart()
+        elapsed = time.time() - start
+        commands = app.download_state_manager.startup_commands
+        size = len(cPickle.dumps(commands, cPickle.HIGHEST_PROTOCOL))
+        return elapsed, len(commands), size
+
+    def test_restart_downloads(self):
+        def restart_all():
+            for dler in self.downloaders:
+                dler.restart_on_startup_if_needed()
+        restarter = downloader.DownloadRestarter(self.downloaders)
+        results = [
+            ('all at once', self.measure(restart_all)),
+            ('DownloadRestarter', self.measure(restarter.start)),
+        ]
+        restarter.cancel()
+        print 'restarting %d downloads' % self.DOWNLOAD_COUNT
+        for name, (elapsed, count, size) in results:
+            print '  %-18s %.3fs, %d restores, %.1fMB first batch' % (
+                    name + ':', elapsed, count, size / 1048576.0)
+
+class ViewSelectPerformanceTest(MiroTestCase):
+    """Compare iterating through a view with View.select() when we only
+    need a couple columns.
+    """
+
+    ITEM_COUNT = 100000
+
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        feed = models.Feed(u'http://example.com/feed')
+        template = models.Item(item.FeedParserValues({'title': u'item'}),
+                feed_id=feed.id)
+        # Copy the template row with SQL, creating 100k Item objects takes
+        # too long.
+        columns = [name for name, schema_item in
+                app.db._schema_map[models.Item].fields]
+        row = list(app.db.cursor.execute('SELECT %s FROM item WHERE id=?' %
+            ', '.join(columns), (template.id,)).fetchone())
+        id_index = columns.index('id')
+        def make_rows():
+            for i in xrange(self.ITEM_COUNT - 1):
+                row[id_index] = template.id + 1 + i
+                yield row
+        app.db.cursor.executemany('INSERT INTO item (%s) VALUES (%s)' % (
+            ', '.join(columns), ', '.join('?' for c in columns)),
+            make_rows())
+        database.update_last_id()
+        self.feed_id = feed.id
+
+    def time_query(self, func):
+        self.clear_ddb_object_cache()
+        start = time.time()
+        func()
+        return time.time() - start
+
+    def test_select_feed_ids(self):
+        view = models.Item.make_view('feed_id=?', (self.feed_id,))
+        iter_time = self.time_query(
+                lambda: [(i.id, i.feed_id) for i in view])
+        select_time = self.time_query(lambda: view.select('id', 'feed_id'))
+        print 'fetching ids and feed ids for %d items' % self.ITEM_COUNT
+        print '  iterating view: %.3fs' % iter_time
+        print '  View.select():  %.3fs' % select_time
+
+class StartupPerformanceTest(EventLoopTest):
+    """Time startup phases on a large profile.
+
+    We compare running the phases that don't need the database after
+    loading it with running them in BackgroundPhase threads while the
+    database loads.
+    """
+
+    FEED_COUNT = 100
+    ITEM_COUNT = 50000
+
+    def setUp(self):
+        EventLoopTest.setUp(self)
+        self.save_path = FilenameType(self.make_temp_path(extension=".db"))
+        if os.path.exists(self.save_path):
+            os.unlink(self.save_path)
+        self.reload_database(self.save_path)
+        feed_ids = [models.Feed(u'http://example.com/feed/%d' % i).id
+                for i in xrange(self.FEED_COUNT)]
+        template = models.Item(item.FeedParserValues({'title': u'item'}),
+                feed_id=feed_ids[0])
+        # Copy the template row with SQL, creating the Item objects takes
+        # too long.
+        columns = [name for name, schema_item in
+                app.db._schema_map[models.Item].fields]
+        row = list(app.db.cursor.execute('SELECT %s FROM item WHERE id=?' %
+            ', '.join(columns), (template.id,)).fetchone())
+        id_index = columns.index('id')
+        feed_id_index = columns.index('feed_id')
+        last_id = database.DDBObject.lastID
+        def make_rows():
+            for i in xrange(self.ITEM_COUNT - 1):
+                row[id_index] = last_id + 1 + i
+                row[feed_id_index] = feed_ids[i % self.FEED_COUNT]
+                yield row
+        app.db.cursor.executemany('INSERT INTO item (%s) VALUES (%s)' % (
+            ', '.join(columns), ', '.join('?' for c in columns)),
+            make_rows())
+        database.update_last_id()
+        # build the item info cache, so that we time the normal quick load
+        # when we restart.
+        self.setup_new_item_info_cache()
+        app.item_info_cache.save()
+
+    def background_phases(self):
+        return [
+            ('video converters', conversions.ConversionManager().startup),
+            ('device database', devices.DeviceManager),
+        ]
+
+    def load_database(self):
+        self.reload_database(self.save_path)
+        self.setup_new_item_info_cache()
+
+    def time_func(self, func):
+        start = time.time()
+        func()
+        return time.time() - start
+
+    def test_startup(self):
+        times = [('load database', self.time_func(self.load_database))]
+        for name, func in self.background_phases():
+            times.append((name, self.time_func(func)))
+        times.append(('fix inconsistencies',
+            self.time_func(startup.fix_database_inconsistencies)))
+        times.append(('setup tabs', self.time_func(startup.setup_tabs)))
+        sequential_time = sum(t for name, t in times[:3])
+
+        def concurrent():
+            phases = [startup.BackgroundPhase(name, func)
+                    for name, func in self.background_phases()]
+            self.load_database()
+            for phase in phases:
+                phase.join()
+        concurrent_time = self.time_func(concurrent)
+
+        print 'startup with %d feeds and %d items' % (self.FEED_COUNT,
+                self.ITEM_COUNT)
+        for name, phase_time in times:
+            print '  %-22s %.3fs' % (name + ':', phase_time)
+        print '  database and independent phases'
+        print '    in sequence:        %.3fs' % sequential_time
+        print '    concurrently:       %.3fs' % concurrent_time
@@ -84,6 +84,34 @@ class PlaylistTestCase(PlaylistTestBase):
         playlist.remove_item(self.i3)
         self.check_callbacks([self.i4], [self.i3])
 
+    def test_add_ids(self):
+        playlist = SavedPlaylist(u"rocketboom", [self.i2.id])
+        tracker = Item.playlist_view(playlist.id).make_tracker()
+        tracker.connect('added', self.add_callback)
+        playlist.add_ids([self.i4.id, self.i2.id, self.i1.id, self.i4.id])
+        self.check_list(playlist, [self.i2, self.i4, self.i1])
+        self.assertSameSet(self.add_callbacks, [self.i4, self.i1])
+        self.assert_(self.i1.keep)
+        self.assert_(self.i4.keep)
+
+    def test_reorder_updates_changed_rows(self):
+        playlist = SavedPlaylist(u"rocketboom", [self.i1.id, self.i2.id,
+                                                 self.i3.id, self.i4.id])
+        updated = []
+        real_update_obj = app.db.update_obj
+        def update_obj(obj):
+            updated.append(obj)
+            real_update_obj(obj)
+        app.db.update_obj = update_obj
+        try:
+            playlist.reorder([self.i2.id, self.i1.id, self.i3.id,
+                              self.i4.id])
+            self.assertEquals(sorted(map_.item_id for map_ in updated),
+                              sorted([self.i1.id, self.i2.id]))
+        finally:
+            app.db.update_obj = real_update_obj
+        self.check_list(playlist, [self.i2, self.i1, self.i3, self.i4])
+
     def test_expire_removes_item(self):
         check_list = [self.i1, self.i2, self.i3, self.i4]
         playlist = SavedPlaylist(u"rocketboom", [i.id for i in check_list])
@@ -153,6 +181,16 @@ class PlaylistFolderTestCase(PlaylistTestBase):
         self.folder.reorder([self.i4.id, self.i3.id, self.i2.id, self.i1.id])
         self.check_list([self.i4, self.i3, self.i2, self.i1])
 
+    def test_add_ids(self):
+        self.p1.add_ids([self.i2.id, self.i4.id])
+        self.check_list([self.i1, self.i3, self.i4, self.i2])
+        # i4 is in p1 now, so it should stay in the folder
+        self.p2.remove_item(self.i4)
+        self.p3.remove_item(self.i4)
+        self.check_list([self.i1, self.i3, self.i4, self.i2])
+        self.p1.remove_item(self.i4)
+        self.check_list([self.i1, self.i3, self.i2])
+
     def test_remove_folder_removes_playlist(self):
         self.folder.remove()
         self.assertEquals(SavedPlaylist.make_view().count(), 0)
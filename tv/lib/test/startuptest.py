@@ -0,0 +1,47 @@
+import threading
+
+from miro import startup
+from miro.test.framework import MiroTestCase
+
+class BackgroundPhaseTest(MiroTestCase):
+    def setUp(self):
+        MiroTestCase.setUp(self)
+        startup._start_phase_timing()
+
+    def test_result(self):
+        phase = startup.BackgroundPhase("test phase", lambda: 123)
+        self.assertEquals(phase.join(), 123)
+        name, phase_time, in_thread = startup.get_phase_times()[-1]
+        self.assertEquals(name, "test phase")
+        self.assert_(phase_time >= 0)
+        self.assert_(in_thread)
+
+    def test_error(self):
+        def fail():
+            raise ValueError("phase failed")
+        phase = startup.BackgroundPhase("test phase", fail)
+        self.assertRaises(ValueError, phase.join)
+
+    def test_concurrent(self):
+        # each phase waits for the other one to start, so this only works
+        # if they run at the same time.
+        started1 = threading.Event()
+        started2 = threading.Event()
+        def phase1():
+            started1.set()
+            started2.wait(5)
+            return started2.isSet()
+        def phase2():
+            started2.set()
+            started1.wait(5)
+            return started1.isSet()
+        phases = [startup.BackgroundPhase("phase 1", phase1),
+                startup.BackgroundPhase("phase 2", phase2)]
+        self.assertEquals([p.join() for p in phases], [True, True])
+
+    def test_phase_done(self):
+        startup._phase_done("one")
+        startup._phase_done("two")
+        self.assertEquals([(name, in_thread) for name, phase_time, in_thread
+            in startup.get_phase_times()],
+            [("one", False), ("two", False)])
@@ -220,6 +220,52 @@ class DBUpgradeTest(StoreDatabaseTest):
                 raise AssertionError("different column types for %s (%s)" %
                                      (table_name, diff))
 
+    def test_alter_table_columns(self):
+        self.reload_database()
+        cursor = app.db.cursor
+        cursor.execute("CREATE TABLE test_table (id integer PRIMARY KEY, "
+                "a integer, b text, c text)")
+        cursor.execute("CREATE INDEX test_table_a ON test_table (a)")
+        cursor.execute("CREATE INDEX test_table_b ON test_table (b)")
+        cursor.execute("CREATE INDEX test_table_c ON test_table (c, a)")
+        cursor.executemany("INSERT INTO test_table (id, a, b, c) "
+                "VALUES (?, ?, ?, ?)", [(1, 10, u'one', u'uno'),
+                    (2, 20, u'two', u'dos')])
+        databaseupgrade.alter_table_columns(cursor, 'test_table',
+                delete_columns=['b'], rename_columns={'c': 'd'},
+                new_types={'d': 'pythonrepr'})
+        cursor.execute("PRAGMA table_info('test_table')")
+        self.assertEquals([(r[1], r[2].lower()) for r in cursor.fetchall()],
+                [('id', 'integer'), ('a', 'integer'), ('d', 'pythonrepr')])
+        cursor.execute("SELECT id, a, d FROM test_table ORDER BY id")
+        self.assertEquals(cursor.fetchall(),
+                [(1, 10, u'uno'), (2, 20, u'dos')])
+        cursor.execute("SELECT name FROM sqlite_master "
+                "WHERE type='index' AND tbl_name='test_table'")
+        self.assertEquals(set(r[0] for r in cursor.fetchall()),
+                set(['test_table_a', 'test_table_c']))
+        cursor.execute("PRAGMA index_info('test_table_c')")
+        self.assertEquals([r[2] for r in cursor.fetchall()], ['d', 'a'])
+
+    def test_upgrade167(self):
+        self.reload_database()
+        app.db.cursor.execute("DROP INDEX item_filename")
+        app.db.cursor.execute("DROP INDEX item_downloader_url")
+        databaseupgrade.upgrade167(app.db.cursor)
+        app.db.cursor.execute("SELECT name FROM sqlite_master "
+                              "WHERE type='index' AND tbl_name='item'")
+        index_names = set(row[0] for row in app.db.cursor)
+        self.assert_('item_filename' in index_names)
+        self.assert_('item_downloader_url' in index_names)
+        # check that the item lookups that motivated the upgrade use them
+        app.db.enable_query_plan_log(scan_threshold=0)
+        list(item.Item.make_view('is_file_item AND filename=?',
+            (u'/tmp/foo.mp4',)))
+        list(item.Item.make_view('downloader_id IS NULL AND url=?',
+            (u'http://example.com/foo.mp4',)))
+        for stats in app.db._query_plan_log.stats.values():
+            self.assertEquals(stats.full_scans, [])
+
     def _get_column_types(self):
         app.db.cursor.execute("SELECT name FROM sqlite_master "
                               "WHERE type='table'")
@@ -229,6 +275,55 @@ class DBUpgradeTest(StoreDatabaseTest):
             rv[table_name] = set((r[1], r[2].lower()) for r in app.db.cursor)
         return rv
 
+class QueryPlanLogTest(StoreDatabaseTest):
+    def setUp(self):
+        StoreDatabaseTest.setUp(self)
+        self.feed = feed.Feed(u"http://example.com/feed.rss")
+        app.db.enable_query_plan_log(scan_threshold=0)
+        self.plan_log = app.db._query_plan_log
+
+    def test_statement_shape(self):
+        self.assertEquals(self.plan_log.statement_shape(
+            "SELECT id\n  FROM item WHERE id IN (?, ?,?)"),
+            "SELECT id FROM item WHERE id IN (?, ...)")
+        self.assertEquals(self.plan_log.statement_shape(
+            "SELECT id FROM item WHERE id=?"),
+            "SELECT id FROM item WHERE id=?")
+
+    def test_flags_full_scan(self):
+        list(item.Item.make_view('title=?', (u'foo',)))
+        shape = self.find_shape('title=?')
+        self.assert_(shape in self.plan_log.flagged_statements())
+        self.assertEquals(self.plan_log.stats[shape].full_scans, ['item'])
+
+    def test_index_not_flagged(self):
+        list(item.Item.make_view('feed_id=?', (self.feed.id,)))
+        shape = self.find_shape('feed_id=?')
+        self.assert_(shape not in self.plan_log.flagged_statements())
+        self.assertEquals(self.plan_log.stats[shape].full_scans, [])
+
+    def test_threshold(self):
+        self.plan_log.scan_threshold = 1000
+        list(item.Item.make_view('title=?', (u'foo',)))
+        self.assertEquals(self.plan_log.flagged_statements(), [])
+
+    def test_timings(self):
+        for i in range(3):
+            list(item.Item.make_view('feed_id=?', (self.feed.id,)))
+        shape = self.find_shape('feed_id=?')
+        self.assertEquals(self.plan_log.stats[shape].count, 3)
+
+    def find_shape(self, where):
+        shapes = [shape for shape in self.plan_log.stats if where in shape]
+        self.assertEquals(len(shapes), 1)
+        return shapes[0]
+
+    def test_only_selects(self):
+        self.feed.set_title(u'new title')
+        app.db.finish_transaction()
+        for shape in self.plan_log.stats:
+            self.assert_(shape.startswith('SELECT'))
+
 class FakeSchemaTest(StoreDatabaseTest):
     OBJECT_SCHEMAS = test_object_schemas
 
@@ -384,6 +479,51 @@ class DiskTest(FakeSchemaTest):
                         dialog)
         signals.system.connect('new-dialog', dialog_handler)
 
+    def test_resume_upgrade(self):
+        upgrades_run = []
+        def upgrade1(cursor):
+            upgrades_run.append(1)
+            cursor.execute("UPDATE human set name='new name'")
+        def interrupted_upgrade2(cursor):
+            # KeyError gets passed through by upgrade_database(), which
+            # simulates us quitting in the middle of the upgrade.
+            raise KeyError()
+        def upgrade2(cursor):
+            upgrades_run.append(2)
+        databaseupgrade._upgrade_overide[1] = upgrade1
+        databaseupgrade._upgrade_overide[2] = interrupted_upgrade2
+        self.assertRaises(KeyError, self.reload_test_database, version=2)
+        self.assertEquals(upgrades_run, [1])
+        # the next time through, we shouldn't need to re-run upgrade1
+        databaseupgrade._upgrade_overide[2] = upgrade2
+        self.reload_test_database(version=2)
+        self.assertEquals(upgrades_run, [1, 2])
+        new_lee = Human.get_by_id(self.lee.id)
+        self.assertEquals(new_lee.name, 'new name')
+        self.assertRaises(KeyError, app.db.get_variable,
+                storedatabase.UPGRADE_SOURCE_KEY)
+        resume_path = os.path.join(os.path.dirname(self.save_path),
+                "upgrading_database_0")
+        self.assert_(not os.path.exists(resume_path))
+
+    def test_stale_upgrade_not_resumed(self):
+        upgrades_run = []
+        def upgrade1(cursor):
+            upgrades_run.append(1)
+        def interrupted_upgrade2(cursor):
+            raise KeyError()
+        databaseupgrade._upgrade_overide[1] = upgrade1
+        databaseupgrade._upgrade_overide[2] = interrupted_upgrade2
+        self.assertRaises(KeyError, self.reload_test_database, version=2)
+        # change the database before re-running the upgrade.  We should
+        # start from scratch rather than use the interrupted upgrade.
+        self.reload_test_database(version=0)
+        Human(u"new guy", 30, 1.5, [])
+        app.db.finish_transaction()
+        databaseupgrade._upgrade_overide[2] = upgrade1
+        self.reload_test_database(version=2)
+        self.assertEquals(upgrades_run, [1, 1, 1])
+
     def test_upgrade_error(self):
         self.handle_corrupt_db_dialogs(upgrade=True, corruption=False)
         self.check_reload_error(version=2)
@@ -458,6 +598,23 @@ class DiskTest(FakeSchemaTest):
         lee2 = self.reload_object(lee2)
         self.assertEqual(lee2.name, u'lee2-changed')
 
+    def test_bulk_update(self):
+        new_humans = []
+        for x in range(10):
+            name = u"lee-clone-%s" % x
+            new_humans.append(Human(name, 25, 1.4, [], {}))
+        app.bulk_sql_manager.start(batch_updates=True)
+        for new_dude in new_humans:
+            new_dude.name = u'renamed'
+            new_dude.signal_change()
+        # the updates shouldn't happen until finish() is called
+        self.assertEquals(Human.make_view("name='renamed'").count(), 0)
+        # removing an object should cancel its update
+        new_humans[0].remove()
+        app.bulk_sql_manager.finish()
+        self.assertEquals(Human.make_view("name='renamed'").count(), 9)
+        self.assert_(not app.bulk_sql_manager.batch_updates)
+
     def test_bulk_insert_and_remove(self):
         # test inserting, then removing an object while in bulk mode
         app.bulk_sql_manager.start()
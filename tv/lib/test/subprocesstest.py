@@ -202,6 +202,13 @@ class UnittestWorkerProcessHandler(workerprocess.WorkerProcessHandler):
             return workerprocess.WorkerProcessHandler.handle_feedparser_task(
                     self, msg)
 
+    def run_media_metadata_extractor(self, filename, thumbnail):
+        # don't depend on the platform extractor, just return a result based
+        # on the filename
+        if filename == 'FORCE EXCEPTION':
+            raise ValueError("Simulated Exception")
+        return ('video', len(filename), False)
+
 class WorkerProcessTest(EventLoopTest):
     """Test our worker process."""
     def setUp(self):
@@ -209,8 +216,13 @@ class WorkerProcessTest(EventLoopTest):
         # override the normal handler class with our own
         workerprocess._subprocess_manager.handler_class = (
                 UnittestWorkerProcessHandler)
+        workerprocess._task_queue.reset()
         self.result = self.error = None
 
+    def tearDown(self):
+        workerprocess._task_queue.reset()
+        EventLoopTest.tearDown(self)
+
     def callback(self, result):
         self.result = result
         self.stopEventLoop(abnormal=False)
@@ -262,6 +274,76 @@ class WorkerProcessTest(EventLoopTest):
                 workerprocess._subprocess_manager.process.pid)
         self.check_successful_result()
 
+    def send_metadata_batch(self, filenames):
+        self.batch_results = []
+        self.batch_errors = []
+        jobs = []
+        for filename in filenames:
+            jobs.append((filename, filename + '.png',
+                self.make_batch_callback(filename),
+                self.make_batch_errback(filename)))
+        workerprocess.run_media_metadata_extractor_batch(jobs)
+        # Stop the event loop on the TaskResult for the whole batch.  That
+        # comes after the result for the last file, and it's what removes
+        # the task from batch_callbacks.
+        task_queue = workerprocess._task_queue
+        task_id = task_queue.batch_callbacks.keys()[0]
+        msg, callback, errback = task_queue.tasks_in_progress[task_id]
+        def batch_callback(result):
+            callback(result)
+            self.stopEventLoop(abnormal=False)
+        def batch_errback(error):
+            errback(error)
+            self.stopEventLoop(abnormal=False)
+        task_queue.tasks_in_progress[task_id] = (msg, batch_callback,
+                batch_errback)
+
+    def make_batch_callback(self, filename):
+        def callback(result):
+            self.batch_results.append((filename, result))
+        return callback
+
+    def make_batch_errback(self, filename):
+        def errback(error):
+            self.batch_errors.append((filename, error))
+        return errback
+
+    def test_metadata_batch(self):
+        workerprocess.startup()
+        self.send_metadata_batch(['a', 'bb', 'FORCE EXCEPTION', 'dddd'])
+        self.runEventLoop(4.0)
+        # each file should get its own result, in order, and an error for
+        # one file shouldn't stop the rest of the batch
+        self.assertEquals(self.batch_results, [
+            ('a', ('video', 1, False)),
+            ('bb', ('video', 2, False)),
+            ('dddd', ('video', 4, False)),
+        ])
+        self.assertEquals(len(self.batch_errors), 1)
+        self.assertEquals(self.batch_errors[0][0], 'FORCE EXCEPTION')
+        self.assert_(isinstance(self.batch_errors[0][1], ValueError))
+        self.assertEquals(workerprocess._task_queue.batch_callbacks, {})
+
+    def test_metadata_batch_restart(self):
+        # if the worker process restarts in the middle of a batch, we should
+        # only run the jobs that we haven't gotten results for
+        workerprocess.startup()
+        self.send_metadata_batch(['a', 'bb', 'ccc'])
+        task_id, job_callbacks = (
+                workerprocess._task_queue.batch_callbacks.items()[0])
+        # pretend that we already got the result for the first job
+        workerprocess._task_queue.process_partial_result(
+                workerprocess.TaskPartialResult(task_id, 0,
+                    ('audio', 10, False)))
+        workerprocess._subprocess_manager.process.terminate()
+        self.runEventLoop(4.0)
+        self.assertEquals(self.batch_results, [
+            ('a', ('audio', 10, False)),
+            ('bb', ('video', 2, False)),
+            ('ccc', ('video', 3, False)),
+        ])
+        self.assertEquals(self.batch_errors, [])
+
     def test_queue_before_start(self):
         # test sending tasks before we start the worker process
 
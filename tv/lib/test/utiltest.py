@@ -833,6 +833,117 @@ class TestNameSortKey(unittest.TestCase):
             self.assertEquals(inlist, outlist)
 
 
+class DoublingCache(util.Cache):
+    def __init__(self, size, max_weight=None):
+        util.Cache.__init__(self, size, max_weight)
+        self.created = []
+
+    def create_new_value(self, key):
+        self.created.append(key)
+        return key * 2
+
+class WeightedCache(DoublingCache):
+    def sizeof(self, key, value):
+        return value
+
+class CacheTest(unittest.TestCase):
+    def test_get(self):
+        cache = DoublingCache(10)
+        self.assertEquals(cache.get(1), 2)
+        self.assertEquals(cache.get(1), 2)
+        # create_new_value() should only be called once
+        self.assertEquals(cache.created, [1])
+        self.assertEquals(len(cache), 1)
+
+    def test_set(self):
+        cache = DoublingCache(10)
+        cache.set(1, 'one')
+        self.assertEquals(cache.get(1), 'one')
+        cache.set(1, 'uno')
+        self.assertEquals(cache.get(1), 'uno')
+        self.assertEquals(len(cache), 1)
+        self.assertEquals(cache.created, [])
+
+    def test_lru_eviction(self):
+        cache = DoublingCache(3)
+        for key in (1, 2, 3):
+            cache.get(key)
+        # access 1 so that 2 is the least recently used
+        cache.get(1)
+        cache.get(4)
+        self.assertEquals(len(cache), 3)
+        self.assert_(1 in cache)
+        self.assert_(2 not in cache)
+        self.assert_(3 in cache)
+        self.assert_(4 in cache)
+        # set() should also count as using a key
+        cache.set(3, 6)
+        cache.get(5)
+        self.assert_(1 not in cache)
+        self.assert_(3 in cache)
+
+    def test_weighted(self):
+        cache = WeightedCache(100, max_weight=10)
+        cache.get(1)
+        cache.get(3)
+        self.assertEquals(cache.total_weight, 8)
+        # access 1 so that 3 is the least recently used, then go over the
+        # limit
+        cache.get(1)
+        cache.get(2)
+        self.assertEquals(sorted(cache.dict.keys()), [1, 2])
+        self.assertEquals(cache.total_weight, 6)
+
+    def test_oversized_entry(self):
+        # entries larger than max_weight should still be stored, but
+        # everything else should get evicted
+        cache = WeightedCache(100, max_weight=10)
+        cache.get(1)
+        cache.get(20)
+        self.assertEquals(cache.dict.keys(), [20])
+        self.assertEquals(cache.get(20), 40)
+        self.assertEquals(cache.created, [1, 20])
+
+    def test_remove_and_clear(self):
+        cache = WeightedCache(100, max_weight=100)
+        for key in xrange(5):
+            cache.get(key)
+        cache.remove(2)
+        self.assert_(2 not in cache)
+        self.assertEquals(cache.total_weight, 16)
+        self.assertRaises(KeyError, cache.remove, 2)
+        cache.clear()
+        self.assertEquals(len(cache), 0)
+        self.assertEquals(cache.total_weight, 0)
+        cache.get(1)
+        self.assertEquals(len(cache), 1)
+
+    def test_stats(self):
+        cache = DoublingCache(2)
+        cache.get(1)
+        cache.get(1)
+        cache.get(2)
+        cache.get(3)
+        stats = cache.get_stats()
+        self.assertEquals(stats['hits'], 1)
+        self.assertEquals(stats['misses'], 3)
+        self.assertEquals(stats['evictions'], 1)
+        self.assertEquals(stats['entries'], 2)
+
+    def test_get_cached(self):
+        cache = DoublingCache(2)
+        cache.get(1)
+        cache.get(2)
+        self.assertEquals(cache.get_cached(1), 2)
+        self.assertRaises(KeyError, cache.get_cached, 3)
+        stats = cache.get_stats()
+        self.assertEquals(stats['hits'], 0)
+        self.assertEquals(stats['misses'], 2)
+        # get_cached() should count as using a key
+        cache.get(3)
+        self.assert_(1 in cache)
+        self.assert_(2 not in cache)
+
 class TestGatherMediaFiles(unittest.TestCase):
     def setUp(self):
         unittest.TestCase.setUp(self)
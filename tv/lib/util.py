@@ -35,7 +35,6 @@ any other Miro modules.
 
 from hashlib import sha1 as sha
 from StringIO import StringIO
-import itertools
 import logging
 import os
 import random
@@ -1075,44 +1074,142 @@ class DebuggingTimer:
     def log_total_time(self):
         logging.timing("total time: %0.3f", clock() - self.start_time)
 
+# indexes into the lists that Cache uses for its linked list nodes
+_PREV, _NEXT, _KEY, _VALUE, _WEIGHT = range(5)
+
 class Cache(object):
-    def __init__(self, size):
+    """Least recently used cache.
+
+    Subclasses must implement create_new_value(), which gets called by get()
+    to calculate values that aren't in the cache.
+
+    Entries are stored in a doubly linked list ordered by how recently they
+    were used, so get(), set() and evicting the least recently used entry
+    are all constant time.
+
+    The cache holds at most size entries.  If max_weight is given, the total
+    weight of the entries is also limited to max_weight.  Subclasses can
+    override sizeof() to weight entries, for example by their size in bytes.
+    The most recently added entry is never evicted, even if it weighs more
+    than max_weight by itself.
+    """
+    def __init__(self, size, max_weight=None):
         self.size = size
+        self.max_weight = max_weight
+        self.total_weight = 0
+        self.hits = self.misses = self.evictions = 0
+        # maps keys to linked list nodes
         self.dict = {}
-        self.counter = itertools.count()
-        self.access_times = {}
+        # The list is circular, starting and ending at this node.  The most
+        # recently used node is root[_NEXT].
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None, 0]
+
+    def __len__(self):
+        return len(self.dict)
+
+    def __contains__(self, key):
+        return key in self.dict
 
     def get(self, key):
-        if key in self.dict:
-            self.access_times[key] = self.counter.next()
-            return self.dict[key]
-        else:
+        try:
+            node = self.dict[key]
+        except KeyError:
+            self.misses += 1
             value = self.create_new_value(key)
             self.set(key, value)
             return value
+        else:
+            self.hits += 1
+            self._unlink(node)
+            self._link_front(node)
+            return node[_VALUE]
+
+    def get_cached(self, key):
+        """Get a value that's already in the cache.
+
+        Unlike get(), this doesn't count a hit or miss, or create missing
+        values.  The entry still gets marked as recently used.
+
+        :raises KeyError: key isn't in the cache
+        """
+        node = self.dict[key]
+        self._unlink(node)
+        self._link_front(node)
+        return node[_VALUE]
 
     def set(self, key, value):
-        if len(self.dict) == self.size:
-            self.shrink_size()
-        self.access_times[key] = self.counter.next()
-        self.dict[key] = value
-
-    def shrink_size(self):
-        # shrink by LRU
-        to_sort = self.access_times.items()
-        to_sort.sort(key=lambda m: m[1])
-        new_dict = {}
-        new_access_times = {}
-        latest_times = to_sort[len(self.dict) // 2:]
-        for (key, time) in latest_times:
-            new_dict[key] = self.dict[key]
-            new_access_times[key] = time
-        self.dict = new_dict
-        self.access_times = new_access_times
+        if key in self.dict:
+            self._remove_node(self.dict.pop(key))
+        if self.max_weight is not None:
+            weight = self.sizeof(key, value)
+        else:
+            weight = 1
+        node = [None, None, key, value, weight]
+        self._link_front(node)
+        self.dict[key] = node
+        self.total_weight += weight
+        self._shrink(node)
+
+    def remove(self, key):
+        """Remove an entry from the cache.
+
+        :raises KeyError: key isn't in the cache
+        """
+        self._remove_node(self.dict.pop(key))
+
+    def clear(self):
+        self.dict = {}
+        self.root[:] = [self.root, self.root, None, None, 0]
+        self.total_weight = 0
+
+    def get_stats(self):
+        """Get a dict of statistics about how well the cache is working."""
+        return {
+            'entries': len(self.dict),
+            'weight': self.total_weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def sizeof(self, key, value):
+        """Get the weight of an entry.
+
+        This is only used if max_weight is set.  Subclasses can override
+        this to calculate the size of values.
+        """
+        return 1
 
     def create_new_value(self, val):
         raise NotImplementedError()
 
+    def _shrink(self, newest_node):
+        while (len(self.dict) > self.size or
+                (self.max_weight is not None and
+                    self.total_weight > self.max_weight)):
+            oldest = self.root[_PREV]
+            if oldest is newest_node:
+                break
+            del self.dict[oldest[_KEY]]
+            self._remove_node(oldest)
+            self.evictions += 1
+
+    def _remove_node(self, node):
+        self._unlink(node)
+        self.total_weight -= node[_WEIGHT]
+
+    def _unlink(self, node):
+        node[_PREV][_NEXT] = node[_NEXT]
+        node[_NEXT][_PREV] = node[_PREV]
+
+    def _link_front(self, node):
+        first = self.root[_NEXT]
+        node[_PREV] = self.root
+        node[_NEXT] = first
+        first[_PREV] = node
+        self.root[_NEXT] = node
+
 def all_subclasses(cls):
     """Find all subclasses of a given new-style class.
 
@@ -62,11 +62,50 @@ class MediaMetadataExtractorTask(TaskMessage):
         self.filename = filename
         self.thumbnail = thumbnail
 
+class MediaMetadataExtractorBatchTask(TaskMessage):
+    """Run the media metadata extractor on several files.
+
+    :param jobs: list of (index, filename, thumbnail) tuples.  The worker
+        sends back a TaskPartialResult with the index for each file, then a
+        TaskResult once the batch is done.
+    """
+    def __init__(self, jobs):
+        TaskMessage.__init__(self)
+        self.jobs = jobs
+
 class TaskResult(subprocessmanager.SubprocessResponse):
     def __init__(self, task_id, result):
         self.task_id = task_id
         self.result = result
 
+    # Most results are simple values (for example metadata extractor
+    # results), send them using the compact encoding.  Results that marshal
+    # can't handle, like exceptions and parsed feeds, get pickled.
+    def to_compact(self):
+        return (self.task_id, self.result)
+
+    @classmethod
+    def from_compact(cls, data):
+        return cls(*data)
+
+subprocessmanager.message_codec.register(TaskResult, 1)
+
+class TaskPartialResult(subprocessmanager.SubprocessResponse):
+    """Result for one part of a batch task."""
+    def __init__(self, task_id, index, result):
+        self.task_id = task_id
+        self.index = index
+        self.result = result
+
+    def to_compact(self):
+        return (self.task_id, self.index, self.result)
+
+    @classmethod
+    def from_compact(cls, data):
+        return cls(*data)
+
+subprocessmanager.message_codec.register(TaskPartialResult, 2)
+
 class WorkerProcessHandler(subprocessmanager.SubprocessHandler):
     def call_handler(self, method, msg):
         try:
@@ -87,6 +126,20 @@ class WorkerProcessHandler(subprocessmanager.SubprocessHandler):
     def handle_media_metadata_extractor_task(self, msg):
         filename = msg.filename
         thumbnail = msg.thumbnail
+        return self.run_media_metadata_extractor(filename, thumbnail)
+
+    def handle_media_metadata_extractor_batch_task(self, msg):
+        # send back each result as soon as we have it, so that the main
+        # process doesn't have to wait for the entire batch.
+        for index, filename, thumbnail in msg.jobs:
+            try:
+                rv = self.run_media_metadata_extractor(filename, thumbnail)
+            except StandardError, e:
+                rv = e
+            TaskPartialResult(msg.task_id, index, rv).send_to_main_process()
+        return len(msg.jobs)
+
+    def run_media_metadata_extractor(self, filename, thumbnail):
         return utils.run_media_metadata_extractor(filename, thumbnail)
 
 class WorkerProcessResponder(subprocessmanager.SubprocessResponder):
@@ -96,15 +149,22 @@ class WorkerProcessResponder(subprocessmanager.SubprocessResponder):
     def handle_task_result(self, msg):
         _task_queue.process_result(msg)
 
+    def handle_task_partial_result(self, msg):
+        _task_queue.process_partial_result(msg)
+
 # Manage task queue
 
 class TaskQueue(object):
     def __init__(self):
         # maps task_ids to (msg, callback, errback) tuples
         self.tasks_in_progress = {}
+        # maps task_ids for batch tasks to dicts that map the index of each
+        # unfinished job to its (callback, errback) tuple
+        self.batch_callbacks = {}
 
     def reset(self):
         self.tasks_in_progress = {}
+        self.batch_callbacks = {}
 
     def add_task(self, msg, callback, errback):
         """Add a new task to the queue."""
@@ -112,6 +172,17 @@ class TaskQueue(object):
         if _subprocess_manager.is_running:
             msg.send_to_process()
 
+    def add_batch_task(self, msg, job_callbacks):
+        """Add a new batch task to the queue.
+
+        :param job_callbacks: dict mapping the index of each job in msg to
+            a (callback, errback) tuple for that job
+        """
+        self.batch_callbacks[msg.task_id] = job_callbacks
+        self.add_task(msg,
+                lambda result: self._batch_finished(msg.task_id, None),
+                lambda error: self._batch_finished(msg.task_id, error))
+
     def process_result(self, reply):
         """Process a TaskResult from our subprocess."""
         msg, callback, errback = self.tasks_in_progress.pop(reply.task_id)
@@ -120,9 +191,37 @@ class TaskQueue(object):
         else:
             callback(reply.result)
 
+    def process_partial_result(self, reply):
+        """Process a TaskPartialResult from our subprocess."""
+        job_callbacks = self.batch_callbacks.get(reply.task_id)
+        if job_callbacks is None or reply.index not in job_callbacks:
+            # we already handled this result before the subprocess
+            # restarted
+            return
+        callback, errback = job_callbacks.pop(reply.index)
+        if isinstance(reply.result, Exception):
+            errback(reply.result)
+        else:
+            callback(reply.result)
+
+    def _batch_finished(self, task_id, error):
+        job_callbacks = self.batch_callbacks.pop(task_id)
+        if job_callbacks:
+            # the batch failed part way through, or the subprocess didn't
+            # send us all the results.
+            if error is None:
+                error = ValueError("No result from batch task")
+            for index in sorted(job_callbacks):
+                callback, errback = job_callbacks[index]
+                errback(error)
+
     def run_pending_tasks(self):
         """Rerun all tasks in the queue."""
         for msg, callback, errback in self.tasks_in_progress.values():
+            if msg.task_id in self.batch_callbacks:
+                # only resend the jobs that we don't have results for yet
+                job_callbacks = self.batch_callbacks[msg.task_id]
+                msg.jobs = [job for job in msg.jobs if job[0] in job_callbacks]
             msg.send_to_process()
 
 _task_queue = TaskQueue()
@@ -145,6 +244,23 @@ def run_media_metadata_extractor(filename, thumbnail, callback, errback):
     msg = MediaMetadataExtractorTask(filename, thumbnail)
     _task_queue.add_task(msg, callback, errback)
 
+def run_media_metadata_extractor_batch(jobs):
+    """Run the media metadata extractor on a group of files.
+
+    The files are processed with a single task, which saves a round trip to
+    the worker process for each file.  Callbacks are still called for each
+    file as soon as it's done.
+
+    :param jobs: list of (filename, thumbnail, callback, errback) tuples
+    """
+    job_callbacks = {}
+    task_jobs = []
+    for index, (filename, thumbnail, callback, errback) in enumerate(jobs):
+        task_jobs.append((index, filename, thumbnail))
+        job_callbacks[index] = (callback, errback)
+    msg = MediaMetadataExtractorBatchTask(task_jobs)
+    _task_queue.add_batch_task(msg, job_callbacks)
+
 def run_feedparser(html, callback, errback):
     """Run feedparser on a chunk of html."""
     msg = FeedparserTask(html)
@@ -64,6 +64,27 @@ def scaled_size(from_size, to_size):
         return width, to_size[1]
 
 
+# playbin that we can reuse for the next file.  Setting up a playbin and its
+# sinks is a noticeable part of the time it takes to process a file, and the
+# worker process usually handles files in batches.
+_idle_playbin = None
+
+def _get_playbin():
+    global _idle_playbin
+    if _idle_playbin is not None:
+        playbin, _idle_playbin = _idle_playbin, None
+        return playbin
+    playbin = gst.element_factory_make('playbin')
+    videosink = gst.element_factory_make("fakesink", "videosink")
+    playbin.set_property("video-sink", videosink)
+    audiosink = gst.element_factory_make("fakesink", "audiosink")
+    playbin.set_property("audio-sink", audiosink)
+    return playbin
+
+def _release_playbin(playbin):
+    global _idle_playbin
+    _idle_playbin = playbin
+
 class Extractor:
     def __init__(self, filename, thumbnail_filename):
         self.thumbnail_filename = thumbnail_filename
@@ -77,14 +98,12 @@ class Extractor:
         self.buffer_probes = {}
         self.audio_only = False
         self.saw_video_tag = self.saw_audio_tag = False
+        self.error = False
 
-        self.pipeline = gst.element_factory_make('playbin')
-        self.videosink = gst.element_factory_make("fakesink", "videosink")
-        self.pipeline.set_property("video-sink", self.videosink)
-        self.audiosink = gst.element_factory_make("fakesink", "audiosink")
-        self.pipeline.set_property("audio-sink", self.audiosink)
+        self.pipeline = _get_playbin()
 
         self.thumbnail_pipeline = None
+        self.thumbnail_bus = None
 
         self.bus = self.pipeline.get_bus()
         self.bus.add_signal_watch()
@@ -211,6 +230,7 @@ class Extractor:
         return False
 
     def error_occurred(self):
+        self.error = True
         self.disconnect()
         self.done()
         return False
@@ -266,12 +286,26 @@ class Extractor:
                         pad = sink.get_pad("sink")
                         pad.remove_buffer_probe(self.buffer_probes[name])
                         del self.buffer_probes[name]
+            if not self.error:
+                # don't reuse a playbin that's had errors, it might be in a
+                # weird state
+                _release_playbin(self.pipeline)
             self.pipeline = None
 
         if self.bus is not None:
             self.bus.disconnect(self.watch_id)
+            self.bus.remove_signal_watch()
             self.bus = None
 
+        if self.thumbnail_pipeline is not None:
+            self.thumbnail_pipeline.set_state(gst.STATE_NULL)
+            self.thumbnail_pipeline = None
+
+        if self.thumbnail_bus is not None:
+            self.thumbnail_bus.disconnect(self.thumbnail_watch_id)
+            self.thumbnail_bus.remove_signal_watch()
+            self.thumbnail_bus = None
+
 def make_verbose():
     import logging
     logging.basicConfig(level=logging.DEBUG)